@@ -1,6 +1,13 @@
+import argparse
 import cv2
+import glob
+import multiprocessing
 import os
 import shutil
+import sys
+import time
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from math import ceil, pi
 from ultralytics import YOLO
@@ -10,6 +17,16 @@ from tkinter.filedialog import askopenfilename
 import matplotlib.pyplot as plt
 import numpy as np
 
+# Módulos compartidos entre aplicaciones (apps/common)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.detections import (CENTER_X, CENTER_Y, SEGMENT_ID, ELLIPSE_AREA, CONFIDENCE,
+                                BOX_WIDTH, BOX_HEIGHT, DETECTIONS_FILENAME, EXCEL_FILENAME,
+                                DEFAULT_DUPLICATE_THRESHOLD, empty_detections, detection_boxes,
+                                suppress_duplicate_detections, write_detections, read_detections,
+                                export_detections_excel)
+from common.slide_reader import open_slide, slide_dimensions
+from common.spatial_index import DetectionSpatialIndex
+
 # Rutas de directorios
 BASE_DIR = r"C:\Users\joanb\OneDrive\Escritorio\TFG\Workspace_tfg\histology_bone_analyzer\data\sample_results\detection_app"
 IMAGES_SEGMENTED_DIR = os.path.join(BASE_DIR, "images_segmented")
@@ -19,17 +36,50 @@ EXCEL_DIR = os.path.join(BASE_DIR, "excel")
 TECHNICAL_DIR = r"C:\Users\joanb\OneDrive\Escritorio\TFG\Workspace_tfg\histology_bone_analyzer\docs\technical"
 RECONSTRUCTED_IMAGES_DIR = r"C:\Users\joanb\OneDrive\Escritorio\TFG\Workspace_tfg\histology_bone_analyzer\data\sample_images"
 
+# Extensiones de imagen aceptadas al procesar carpetas completas
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.svs')
+
+# Modelo YOLO del proceso actual en el procesamiento por lotes (ver init_worker)
+_worker_model = None
+
 # Color corporativo
 BACKGROUND_COLOR = '#000000'  # Negro para el fondo
 BUTTON_COLOR = '#BD0000'      # Rojo para los botones
 BUTTON_HOVER_COLOR = '#333333'  # Gris para el hover de botones
 TEXT_COLOR = 'white'          # Blanco para todo el texto
 
+# Guardar los segmentos como PNG en IMAGES_SEGMENTED_DIR (solo para depuración).
+# Por defecto los segmentos se pasan al modelo como vistas NumPy en memoria.
+SAVE_SEGMENTS_TO_DISK = False
+
+# Número de segmentos que se envían juntos en cada llamada al modelo YOLO
+DEFAULT_BATCH_SIZE = 8
+
+# Segmentación: número de segmentos y solapamiento (en píxeles) entre segmentos vecinos
+DEFAULT_NUM_SEGMENTS = 150
+DEFAULT_TILE_OVERLAP = 0
+
+# Tamaño de bloque (en puntos) para calcular distancias entre pares sin crear la matriz n×n
+DISTANCE_CHUNK_SIZE = 1024
+
+# Lado mayor (en píxeles) de la miniatura usada como fondo en los gráficos
+PLOT_BACKGROUND_MAX_SIZE = 8192
+
 def initialize_directories():
     """Crea todas las carpetas necesarias si no existen."""
-    for directory in [BASE_DIR, IMAGES_SEGMENTED_DIR, OUTPUT_DIR, RESULTS_DIR, EXCEL_DIR, TECHNICAL_DIR, RECONSTRUCTED_IMAGES_DIR]:
+    for directory in [BASE_DIR, IMAGES_SEGMENTED_DIR, OUTPUT_DIR, RESULTS_DIR, EXCEL_DIR, RECONSTRUCTED_IMAGES_DIR]:
         os.makedirs(directory, exist_ok=True)
 
+def get_output_dirs(base_dir=BASE_DIR):
+    """Devuelve las carpetas de salida de un análisis con la misma estructura que BASE_DIR."""
+    return {
+        'base': base_dir,
+        'images_segmented': os.path.join(base_dir, "images_segmented"),
+        'segmented_results': os.path.join(base_dir, "segmented_results"),
+        'results': os.path.join(base_dir, "results"),
+        'excel': os.path.join(base_dir, "excel"),
+    }
+
 def configure_window(window, title):
     """Configura el aspecto visual y posición de la ventana."""
     window.title(title)
@@ -78,7 +128,7 @@ def select_image_in_window(window):
     image_path_var = StringVar()
     
     def on_button_click():
-        file_path = askopenfilename(filetypes=[("Image files", "*.jpg;*.jpeg;*.png")])
+        file_path = askopenfilename(filetypes=[("Image files", "*.jpg;*.jpeg;*.png;*.tif;*.tiff;*.svs")])
         if file_path:
             image_path_var.set(file_path)
             window.quit()  # Solo detiene el mainloop, no destruye la ventana
@@ -102,12 +152,38 @@ def show_processing_screen(window):
           fg="white", bg=BACKGROUND_COLOR).pack(expand=True)
     window.update()
 
-def resize_image_if_too_large(image_path, max_pixels=178956970):
-    """Redimensiona una imagen si es demasiado grande."""
+def resize_image_if_too_large(image_path, max_pixels=178956970, output_dir=None):
+    """
+    Redimensiona una imagen si es demasiado grande.
+    
+    El tamaño se lee de la cabecera; la imagen solo se decodifica aquí si hay que
+    redimensionarla.
+    
+    Los TIFF que se pueden leer por ventanas (ver common.slide_reader) no se redimensionan:
+    se analizan a resolución completa decodificando solo la región de cada segmento.
+    
+    La copia redimensionada (<nombre>_resized.<ext>) se guarda en output_dir, o junto a
+    la imagen original si no se indica. Las detecciones quedan en las coordenadas de la
+    imagen devuelta, que es la que hay que emparejar con ellas.
+    """
     print(f"Verificando tamaño de imagen: {image_path}")
-    img = cv2.imread(image_path)
-    if img is None:
-        return None
+    dimensions = slide_dimensions(image_path)
+    if dimensions is not None and dimensions[0] * dimensions[1] <= max_pixels:
+        # Tamaño leído de la cabecera: la imagen se decodifica una sola vez, en process_image
+        print(f"Tamaño original: {dimensions[0]}x{dimensions[1]} = "
+              f"{dimensions[0] * dimensions[1]} píxeles")
+        return image_path
+    
+    try:
+        with open_slide(image_path) as slide:
+            if slide.windowed:
+                print(f"Tamaño: {slide.width}x{slide.height} píxeles (lectura por ventanas, "
+                      f"sin redimensionar)")
+                return image_path
+            img = slide.image
+    except Exception as e:
+        print(f"Error al leer la imagen: {e}")
+        raise
     
     height, width = img.shape[:2]
     pixels = height * width
@@ -125,6 +201,8 @@ def resize_image_if_too_large(image_path, max_pixels=178956970):
         
         # Guardar versión redimensionada
         resized_path = image_path.rsplit('.', 1)[0] + '_resized.' + image_path.rsplit('.', 1)[1]
+        if output_dir is not None:
+            resized_path = os.path.join(output_dir, os.path.basename(resized_path))
         cv2.imwrite(resized_path, resized)
         print(f"Imagen redimensionada guardada en: {resized_path}")
         
@@ -132,8 +210,53 @@ def resize_image_if_too_large(image_path, max_pixels=178956970):
     
     return image_path
 
-def divide_and_save_image(image_path, output_dir, num_segments=150):
-    """Divide una imagen en segmentos más pequeños y los guarda."""
+def compute_segment_grid(image_shape, num_segments=DEFAULT_NUM_SEGMENTS, cols=15, overlap=DEFAULT_TILE_OVERLAP):
+    """
+    Calcula las ventanas (start_x, start_y, end_x, end_y, segment_id) de cada segmento.
+    
+    Con overlap > 0 cada ventana se amplía `overlap` píxeles por cada lado (sin salir
+    de la imagen), de modo que los canales que cruzan un borde aparecen completos en
+    al menos un segmento. Los duplicados resultantes se eliminan después con
+    suppress_duplicate_detections.
+    """
+    rows = ceil(num_segments / cols)
+    segment_height = image_shape[0] // rows
+    segment_width = image_shape[1] // cols
+    overlap = max(0, int(overlap))
+    
+    print(f"Dividiendo en {rows}x{cols} segmentos")
+    print(f"Tamaño de cada segmento: {segment_width}x{segment_height} (solapamiento: {overlap} px)")
+    
+    windows = []
+    for i in range(rows):
+        for j in range(cols):
+            start_y = i * segment_height
+            end_y = start_y + segment_height if i < rows - 1 else image_shape[0]
+            start_x = j * segment_width
+            end_x = start_x + segment_width if j < cols - 1 else image_shape[1]
+            
+            # Ampliar la ventana con el solapamiento, limitado a los bordes de la imagen
+            start_y = max(0, start_y - overlap)
+            end_y = min(image_shape[0], end_y + overlap)
+            start_x = max(0, start_x - overlap)
+            end_x = min(image_shape[1], end_x + overlap)
+            
+            windows.append((start_x, start_y, end_x, end_y, i * cols + j + 1))
+    
+    return windows, segment_width, segment_height
+
+def iter_image_segments(slide, windows):
+    """
+    Genera los segmentos de una imagen abierta con open_slide, sin escribirlos a disco.
+    
+    Con imágenes cargadas completas son vistas NumPy sin copia; con TIFF leídos por
+    ventanas solo se decodifica la región de cada segmento.
+    """
+    for start_x, start_y, end_x, end_y, segment_id in windows:
+        yield slide.read_region(start_x, start_y, end_x, end_y), start_x, start_y, segment_id
+
+def save_segments(slide, windows, output_dir):
+    """Guarda los segmentos como PNG (solo para depuración) y devuelve sus posiciones."""
     # Limpiar carpeta de segmentos
     if os.path.exists(output_dir):
         for file in os.listdir(output_dir):
@@ -141,55 +264,40 @@ def divide_and_save_image(image_path, output_dir, num_segments=150):
                 os.remove(os.path.join(output_dir, file))
     else:
         os.makedirs(output_dir, exist_ok=True)
+    
+    segment_positions = []
+    for segment, start_x, start_y, segment_id in iter_image_segments(slide, windows):
+        segment_path = os.path.join(output_dir, f"segment_{segment_id}.png")
+        cv2.imwrite(segment_path, segment)
+        segment_positions.append((start_x, start_y, segment_id))
+    
+    print(f"Se guardaron {len(segment_positions)} segmentos en {output_dir}")
+    return segment_positions
 
-    # Leer la imagen
-    print(f"Leyendo imagen desde: {image_path}")
+def divide_and_save_image(image_path, output_dir, num_segments=DEFAULT_NUM_SEGMENTS):
+    """Divide una imagen en segmentos más pequeños y los guarda."""
     try:
-        image = cv2.imread(image_path)
-        
-        # Si falla, intentar método alternativo
-        if image is None:
-            print("cv2.imread falló, intentando otro método...")
-            with open(image_path, 'rb') as f:
-                img_bytes = f.read()
-            image = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-            
-        if image is None:
-            print(f"Error: No se pudo cargar la imagen {image_path}")
-            return None, None, None
+        slide = open_slide(image_path)
     except Exception as e:
         print(f"Error al leer la imagen: {e}")
         return None, None, None
-
-    # Configurar la división
-    cols = 15
-    rows = ceil(num_segments / cols)
-    segment_height = image.shape[0] // rows
-    segment_width = image.shape[1] // cols
     
-    print(f"Dividiendo en {rows}x{cols} segmentos")
-    print(f"Tamaño de cada segmento: {segment_width}x{segment_height}")
-
-    # Dividir y guardar
-    segment_positions = []
-    for i in range(rows):
-        for j in range(cols):
-            start_y = i * segment_height
-            end_y = start_y + segment_height if i < rows - 1 else image.shape[0]
-            start_x = j * segment_width
-            end_x = start_x + segment_width if j < cols - 1 else image.shape[1]
-            
-            segment = image[start_y:end_y, start_x:end_x]
-            segment_filename = f"segment_{i * cols + j + 1}.png"
-            segment_path = os.path.join(output_dir, segment_filename)
-            
-            cv2.imwrite(segment_path, segment)
-            
-            segment_positions.append((start_x, start_y, i * cols + j + 1))
-
-    print(f"Se guardaron {len(segment_positions)} segmentos en {output_dir}")
+    with slide:
+        windows, segment_width, segment_height = compute_segment_grid(slide.shape, num_segments)
+        segment_positions = save_segments(slide, windows, output_dir)
     return segment_positions, segment_width, segment_height
 
+def iter_segment_files(segment_positions, segments_dir):
+    """Genera (ruta, start_x, start_y, segment_id) para segmentos guardados en disco."""
+    for start_x, start_y, segment_id in segment_positions:
+        segment_path = os.path.join(segments_dir, f"segment_{segment_id}.png")
+        
+        if not os.path.exists(segment_path):
+            print(f"Advertencia: Archivo de segmento no encontrado: {segment_path}")
+            continue
+        
+        yield segment_path, start_x, start_y, segment_id
+
 def find_model_path():
     """Busca la ruta del modelo YOLO en diferentes ubicaciones posibles."""
     # Ruta principal donde debería estar el modelo
@@ -214,83 +322,210 @@ def find_model_path():
     # Si no se encuentra, retornar None
     return None
 
+def load_model(model_path=None):
+    """Carga el modelo YOLO (por defecto desde find_model_path()); devuelve None si no se encuentra."""
+    print("Cargando modelo YOLO...")
+    model_path = model_path or find_model_path()
+    if not model_path or not os.path.exists(model_path):
+        print("ERROR: No se encontró el modelo en ninguna de las rutas verificadas.")
+        return None
+    
+    model = YOLO(model_path)
+    print(f"Modelo cargado desde: {model_path}")
+    return model
+
 def calculate_box_centers_and_areas(boxes, start_x, start_y, segment_id):
-    """Calcula los centros y áreas de las cajas de detección."""
-    centers = []
-    for box in boxes:
-        xyxy = box.xyxy.clone().detach().cpu().view(1, 4)
-        width = xyxy[0, 2] - xyxy[0, 0]
-        height = xyxy[0, 3] - xyxy[0, 1]
-        cx = start_x + (xyxy[0, 0] + xyxy[0, 2]) / 2
-        cy = start_y + (xyxy[0, 1] + xyxy[0, 3]) / 2
-        semi_major_axis = width / 2
-        semi_minor_axis = height / 2
-        ellipse_area = pi * semi_major_axis * semi_minor_axis
-        centers.append((cx, cy, segment_id, ellipse_area))
-    return centers
-
-def process_image_segments(segment_positions, model, confidence_threshold=0.4):
-    """Procesa cada segmento con el modelo YOLO."""
-    box_centers_and_areas = []
+    """
+    Calcula los centros y áreas de las cajas de detección de un segmento.
     
-    for start_x, start_y, segment_id in segment_positions:
-        segment_filename = f"segment_{segment_id}.png"
-        segment_path = os.path.join(IMAGES_SEGMENTED_DIR, segment_filename)
-        
-        if not os.path.exists(segment_path):
-            print(f"Advertencia: Archivo de segmento no encontrado: {segment_path}")
-            continue
-            
-        # Detectar con YOLO
-        results = model(segment_path, conf=confidence_threshold)
+    Las cajas del segmento se copian a la CPU de una sola vez como un array xyxy y
+    todas las métricas se calculan en float64, sin tensores por caja.
+    
+    Returns:
+        DataFrame con las columnas de DETECTION_COLUMNS, en coordenadas globales
+    """
+    xyxy = boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+    confidences = boxes.conf.cpu().numpy().astype(np.float64).ravel()
+    
+    width = xyxy[:, 2] - xyxy[:, 0]
+    height = xyxy[:, 3] - xyxy[:, 1]
+    semi_major_axis = width / 2
+    semi_minor_axis = height / 2
+    
+    return pd.DataFrame({
+        CENTER_X: start_x + (xyxy[:, 0] + xyxy[:, 2]) / 2,
+        CENTER_Y: start_y + (xyxy[:, 1] + xyxy[:, 3]) / 2,
+        SEGMENT_ID: np.full(len(xyxy), segment_id, dtype=np.int32),
+        ELLIPSE_AREA: pi * semi_major_axis * semi_minor_axis,
+        CONFIDENCE: confidences,
+        BOX_WIDTH: width,
+        BOX_HEIGHT: height,
+    })
+
+def iter_batches(items, batch_size):
+    """Agrupa los elementos de un iterable en listas de como máximo batch_size."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def process_image_segments(segments, model, confidence_threshold=0.4, batch_size=DEFAULT_BATCH_SIZE,
+                           duplicate_threshold=None, output_dir=OUTPUT_DIR,
+                           reconstructed_dir=RECONSTRUCTED_IMAGES_DIR):
+    """
+    Procesa los segmentos con el modelo YOLO, en lotes de batch_size segmentos por llamada.
+    
+    Cada elemento de `segments` es (fuente, start_x, start_y, segment_id), donde la
+    fuente puede ser una vista NumPy de la imagen (ver iter_image_segments) o la ruta
+    de un segmento guardado en disco (ver iter_segment_files).
+    
+    Si se indica duplicate_threshold (segmentos solapados), al final se aplica una
+    supresión de duplicados entre segmentos sobre las cajas en coordenadas globales.
+    
+    Devuelve un DataFrame con una fila por detección (ver calculate_box_centers_and_areas).
+    
+    Las imágenes anotadas de cada segmento se guardan en output_dir y reconstructed_dir;
+    si alguna de las carpetas es None, esa copia se omite.
+    """
+    segment_detections = []
+    batch_size = max(1, int(batch_size))
+    num_segments = 0
+    start_time = time.perf_counter()
+    
+    for batch in iter_batches(segments, batch_size):
+        # Detectar con YOLO; los resultados vuelven en el mismo orden que las fuentes
+        results = model([source for source, _, _, _ in batch], conf=confidence_threshold)
         
-        for result in results:
+        for (_, start_x, start_y, segment_id), result in zip(batch, results):
             boxes = result.boxes
             print(f"Segmento {segment_id}: Se detectaron {len(boxes)} canales de Havers")
-            centers = calculate_box_centers_and_areas(boxes, start_x, start_y, segment_id)
-            box_centers_and_areas.extend(centers)
+            segment_detections.append(calculate_box_centers_and_areas(boxes, start_x, start_y, segment_id))
 
             # Guardar imagen con anotaciones
+            if output_dir is None and reconstructed_dir is None:
+                continue
             annotated_img = result.plot()
-            output_path = os.path.join(OUTPUT_DIR, f"result_{segment_id}.png")
-            cv2.imwrite(output_path, annotated_img)
+            if output_dir is not None:
+                output_path = os.path.join(output_dir, f"result_{segment_id}.png")
+                cv2.imwrite(output_path, annotated_img)
 
             # También guardar una copia en la nueva ubicación para imágenes reconstruidas
-            reconstructed_path = os.path.join(RECONSTRUCTED_IMAGES_DIR, f"reconstructed_{segment_id}.png")
-            cv2.imwrite(reconstructed_path, annotated_img)
+            if reconstructed_dir is not None:
+                reconstructed_path = os.path.join(reconstructed_dir, f"reconstructed_{segment_id}.png")
+                cv2.imwrite(reconstructed_path, annotated_img)
+        
+        num_segments += len(batch)
+    
+    elapsed = time.perf_counter() - start_time
+    if num_segments and elapsed > 0:
+        print(f"Procesados {num_segments} segmentos en {elapsed:.2f} s "
+              f"({num_segments / elapsed:.2f} segmentos/s, batch_size={batch_size})")
     
-    return box_centers_and_areas
+    detections = pd.concat(segment_detections, ignore_index=True) if segment_detections else empty_detections()
+    
+    # Fusionar las detecciones duplicadas en las zonas de solapamiento
+    if duplicate_threshold is not None and len(detections):
+        keep = suppress_duplicate_detections(detection_boxes(detections), detections[CONFIDENCE].to_numpy(),
+                                             detections[SEGMENT_ID].to_numpy(), duplicate_threshold)
+        print(f"Supresión de duplicados: {len(detections) - len(keep)} detecciones eliminadas")
+        detections = detections.iloc[keep].reset_index(drop=True)
+    
+    return detections
 
-def calculate_distance_matrix(centers_df):
-    """Calcula la distancia media entre los centros de los canales de Havers."""
-    distances = []
-    points = centers_df[['Center X', 'Center Y']].values
+def calculate_distance_matrix(centers_df, chunk_size=DISTANCE_CHUNK_SIZE):
+    """
+    Calcula la distancia media exacta entre los centros de los canales de Havers.
+    
+    Los pares se evalúan por bloques de chunk_size × chunk_size puntos, de modo que la
+    memoria extra es constante aunque haya decenas de miles de canales. Con hasta
+    chunk_size puntos los pares se evalúan en el mismo orden que el bucle original,
+    por lo que el resultado es idéntico.
+    """
+    points = centers_df[[CENTER_X, CENTER_Y]].values.astype(np.float64)
+    n = len(points)
     
     # Si hay menos de 2 puntos, no se puede calcular distancias
-    if len(points) < 2:
+    if n < 2:
         return 0
-        
-    for i in range(len(points)):
-        for j in range(i + 1, len(points)):
-            # Cambio simple para evitar la advertencia de NumPy
-            diff = points[i] - points[j]
-            dist = np.sqrt(np.sum(diff * diff))
-            distances.append(dist)
     
-    return np.mean(distances) if distances else 0
+    if n <= chunk_size:
+        i, j = np.triu_indices(n, k=1)
+        diff = points[i] - points[j]
+        return np.mean(np.sqrt(np.sum(diff * diff, axis=1)))
+    
+    total = 0.0
+    for start_i in range(0, n, chunk_size):
+        block_i = points[start_i:start_i + chunk_size]
+        for start_j in range(start_i, n, chunk_size):
+            block_j = points[start_j:start_j + chunk_size]
+            dx = block_i[:, 0, None] - block_j[None, :, 0]
+            dy = block_i[:, 1, None] - block_j[None, :, 1]
+            distances = np.sqrt(dx * dx + dy * dy)
+            
+            # En los bloques de la diagonal solo cuentan los pares i < j
+            if start_j == start_i:
+                distances = np.triu(distances, k=1)
+            total += distances.sum()
+    
+    return np.float64(total / (n * (n - 1) / 2))
+
+def estimate_mean_distance(centers_df, num_samples=1_000_000, confidence=0.95, seed=None):
+    """
+    Estima la distancia media entre canales a partir de pares aleatorios.
+    
+    Pensado para imágenes con muchísimos canales, donde incluso el cálculo exacto por
+    bloques es lento. Los pares (i, j) con i != j se muestrean uniformemente y el
+    intervalo de confianza usa la aproximación normal de la media muestral.
+    
+    Returns:
+        Tupla (media, límite inferior, límite superior) del intervalo de confianza
+    """
+    points = centers_df[[CENTER_X, CENTER_Y]].values.astype(np.float64)
+    n = len(points)
+    if n < 2:
+        return 0, 0, 0
+    
+    rng = np.random.default_rng(seed)
+    i = rng.integers(0, n, num_samples)
+    j = rng.integers(0, n - 1, num_samples)
+    j += j >= i  # j uniforme entre los índices distintos de i
+    
+    diff = points[i] - points[j]
+    distances = np.sqrt(np.sum(diff * diff, axis=1))
+    mean = distances.mean()
+    margin = NormalDist().inv_cdf(0.5 + confidence / 2) * distances.std(ddof=1) / np.sqrt(num_samples)
+    return mean, mean - margin, mean + margin
+
+def load_plot_background(image_path, max_size=PLOT_BACKGROUND_MAX_SIZE):
+    """
+    Devuelve (miniatura RGB, ancho, alto) de la imagen para usarla como fondo de los gráficos.
+    
+    Ancho y alto son los de la resolución completa, de modo que las coordenadas de las
+    detecciones se dibujan sin reescalar.
+    """
+    with open_slide(image_path) as slide:
+        return load_slide_background(slide, max_size)
+
+def load_slide_background(slide, max_size=PLOT_BACKGROUND_MAX_SIZE):
+    """Igual que load_plot_background, para una imagen ya abierta con open_slide."""
+    thumbnail = cv2.cvtColor(slide.thumbnail(max_size), cv2.COLOR_BGR2RGB)
+    return thumbnail, slide.width, slide.height
 
-def plot_centers(df, image_path):
+def plot_centers(df, image_path, results_dir=RESULTS_DIR, background=None):
     """Genera un gráfico de dispersión con los centros de los canales de Havers."""
     plt.figure(figsize=(16, 16))
-    # Cargar la imagen inicial
-    image = plt.imread(image_path)
-    height, width = image.shape[:2]
+    # Cargar la imagen inicial (miniatura a escala, si no se ha recibido ya)
+    image, width, height = background or load_plot_background(image_path)
     
     # Mostrar la imagen con el sistema de coordenadas correcto
     plt.imshow(image, extent=[0, width, height, 0], alpha=0.6)
     
     # Las coordenadas Y necesitan ser invertidas para coincidir con la imagen
-    plt.scatter(df['Center X'], df['Center Y'], c=BUTTON_COLOR, marker='o', s=10)
+    plt.scatter(df[CENTER_X], df[CENTER_Y], c=BUTTON_COLOR, marker='o', s=10)
     
     plt.title('Mapa de coordenadas de canales de Havers')
     plt.xlabel('Center X')
@@ -302,20 +537,19 @@ def plot_centers(df, image_path):
     plt.ylim(height, 0)  # Y va de height a 0 para coincidir con la imagen
     
     # Guardar en archivo físico
-    plot_filename = os.path.join(RESULTS_DIR, "mapa_coordenadas.png")
+    plot_filename = os.path.join(results_dir, "mapa_coordenadas.png")
     plt.savefig(plot_filename, format='png', dpi=600, bbox_inches='tight')
     plt.close()
     return plot_filename
 
-def plot_heatmap(df, image_path):
+def plot_heatmap(df, image_path, results_dir=RESULTS_DIR, background=None):
     """Genera un mapa de calor para visualizar la densidad de canales de Havers."""
     plt.figure(figsize=(16, 16))
     # Cargar la imagen para obtener dimensiones
-    image = plt.imread(image_path)
-    height, width = image.shape[:2]
+    image, width, height = background or load_plot_background(image_path)
     
     # Generar el mapa de calor
-    heatmap, xedges, yedges = np.histogram2d(df['Center X'], df['Center Y'], bins=(100, 100))
+    heatmap, xedges, yedges = np.histogram2d(df[CENTER_X], df[CENTER_Y], bins=(100, 100))
     
     # Mostrar el mapa de calor con orientación correcta
     plt.imshow(heatmap.T, extent=[xedges[0], xedges[-1], yedges[-1], yedges[0]], 
@@ -335,43 +569,105 @@ def plot_heatmap(df, image_path):
     plt.ylim(height, 0)
     
     # Guardar en archivo físico
-    heatmap_filename = os.path.join(RESULTS_DIR, "mapa_calor.png")
+    heatmap_filename = os.path.join(results_dir, "mapa_calor.png")
     plt.savefig(heatmap_filename, format='png', dpi=600, bbox_inches='tight')
     plt.close()
     return heatmap_filename
 
-def generate_visualizations(df, image_path):
-    """Genera todas las visualizaciones y estadísticas."""
-    plot_filename = plot_centers(df, image_path)
-    heatmap_filename = plot_heatmap(df, image_path)
-    avg_area = df['Ellipse Area (pixels^2)'].mean()
+def plot_nearest_neighbor_histogram(nn_distances, results_dir=RESULTS_DIR):
+    """Genera un histograma de la distancia de cada canal a su vecino más cercano."""
+    plt.figure(figsize=(10, 6))
+    plt.hist(nn_distances[np.isfinite(nn_distances)], bins=50, color=BUTTON_COLOR, edgecolor='black')
+    
+    plt.title('Distancia al vecino más cercano de los canales de Havers')
+    plt.xlabel('Distancia (pixels)')
+    plt.ylabel('Número de canales')
+    plt.grid(True)
+    
+    # Guardar en archivo físico
+    histogram_filename = os.path.join(results_dir, "vecino_mas_cercano.png")
+    plt.savefig(histogram_filename, format='png', dpi=300, bbox_inches='tight')
+    plt.close()
+    return histogram_filename
+
+def generate_visualizations(df, image_path, results_dir=RESULTS_DIR, distance_samples=None,
+                            background=None):
+    """
+    Genera todas las visualizaciones y estadísticas.
+    
+    Si se indica distance_samples, la distancia media se estima con ese número de pares
+    aleatorios (ver estimate_mean_distance) en lugar de calcularse de forma exacta.
+    background es la miniatura de fondo (ver load_plot_background); si no se indica se
+    carga una sola vez desde image_path.
+    """
+    if background is None:
+        background = load_plot_background(image_path)
+    plot_filename = plot_centers(df, image_path, results_dir, background)
+    heatmap_filename = plot_heatmap(df, image_path, results_dir, background)
+    avg_area = df[ELLIPSE_AREA].mean()
     count_havers = df.shape[0]
-    avg_distance = calculate_distance_matrix(df)
+    # Estadísticas de vecindad con el índice espacial compartido con breaking_app
+    spatial_index = DetectionSpatialIndex.from_dataframe(df)
+    nn_distances = spatial_index.nearest_neighbor_distances()
+    nn_filename = plot_nearest_neighbor_histogram(nn_distances, results_dir)
+    avg_nn_distance = np.nanmean(nn_distances) if len(spatial_index) > 1 else 0
+    
+    avg_distance_ci = None
+    if distance_samples:
+        avg_distance, ci_low, ci_high = estimate_mean_distance(df, distance_samples)
+        avg_distance_ci = (ci_low, ci_high)
+    else:
+        avg_distance = calculate_distance_matrix(df)
     
     return {
         'plot_path': plot_filename,
         'heatmap_path': heatmap_filename,
         'avg_area': avg_area,
         'count': count_havers,
-        'avg_distance': avg_distance
+        'avg_distance': avg_distance,
+        'avg_distance_ci': avg_distance_ci,
+        'nn_path': nn_filename,
+        'avg_nn_distance': avg_nn_distance,
+        'spatial_index': spatial_index
     }
 
-def save_results_to_excel(box_centers_and_areas):
-    """Guarda los resultados en Excel y crea una copia de seguridad."""
-    # Crear DataFrame
-    df = pd.DataFrame(box_centers_and_areas, columns=['Center X', 'Center Y', 'Segment ID', 'Ellipse Area (pixels^2)'])
+def save_results_to_excel(detections, excel_dir=EXCEL_DIR, technical_dir=None, slide_id=None,
+                          export_excel=False):
+    """
+    Guarda las detecciones en Parquet y, opcionalmente, una exportación a Excel.
+    
+    El archivo Parquet (DETECTIONS_FILENAME) es el formato de intercambio con breaking_app;
+    el Excel solo se genera si export_excel es True. Si se indica technical_dir se guarda
+    además una copia de seguridad del archivo de detecciones.
+    
+    Returns:
+        detections_path, excel_path (None si no se exporta), df con el esquema tipado
+    """
+    detections_path = os.path.join(excel_dir, DETECTIONS_FILENAME)
+    df = write_detections(detections, detections_path, slide_id)
+    print(f"Detecciones guardadas en {detections_path}")
     
-    # Guardar en la ubicación principal
-    excel_path = os.path.join(EXCEL_DIR, 'bounding_box_centers.xlsx')
-    df.to_excel(excel_path, index=False)
-    print(f"Centros y áreas de las cajas delimitadoras guardados en {excel_path}")
+    excel_path = None
+    if export_excel:
+        excel_path = export_detections_excel(df, os.path.join(excel_dir, EXCEL_FILENAME))
+        print(f"Centros y áreas de las cajas delimitadoras exportados a {excel_path}")
     
-    # Crear copia en directorio técnico
-    excel_copy_path = os.path.join(TECHNICAL_DIR, 'bounding_box_centers_copy.xlsx')
-    shutil.copy2(excel_path, excel_copy_path)
-    print(f"Copia del archivo Excel guardada en {excel_copy_path}")
+    # Copia de seguridad en el directorio técnico (desactivada por defecto)
+    if technical_dir is not None:
+        os.makedirs(technical_dir, exist_ok=True)
+        copy_path = os.path.join(technical_dir, 'detections_copy.parquet')
+        shutil.copy2(detections_path, copy_path)
+        print(f"Copia del archivo de detecciones guardada en {copy_path}")
     
-    return excel_path, df
+    return detections_path, excel_path, df
+
+def export_results_to_excel(results):
+    """Exporta a Excel las detecciones de un análisis (si no existe ya) y devuelve la ruta."""
+    if not results.get('excel_path'):
+        excel_path = os.path.join(os.path.dirname(results['detections_path']), EXCEL_FILENAME)
+        export_detections_excel(read_detections(results['detections_path']), excel_path)
+        results['excel_path'] = excel_path
+    return results['excel_path']
 
 def open_file(file_path):
     """Abre un archivo con la aplicación predeterminada del sistema."""
@@ -404,6 +700,10 @@ def show_results(window, results):
     
     Distancia media entre canales: {results['avg_distance']:.2f} pixels
     """
+    if results.get('avg_distance_ci'):
+        ci_low, ci_high = results['avg_distance_ci']
+        stats_text += f"    (estimada por muestreo, IC 95%: {ci_low:.2f} - {ci_high:.2f} pixels)\n"
+    stats_text += f"\n    Distancia media al vecino más cercano: {results['avg_nn_distance']:.2f} pixels\n"
     
     stats_label = Label(stats_frame, text=stats_text, font=("Helvetica", 14), 
                        fg=TEXT_COLOR, bg=BACKGROUND_COLOR, justify="left")
@@ -413,9 +713,10 @@ def show_results(window, results):
     files_text = f"""
     Archivos generados:
     
-    Excel con coordenadas: {results['excel_path']}
+    Detecciones (Parquet): {results['detections_path']}
     Mapa de coordenadas: {results['plot_path']}
     Mapa de calor: {results['heatmap_path']}
+    Vecino más cercano: {results['nn_path']}
     """
     
     files_label = Label(stats_frame, text=files_text, font=("Helvetica", 12), 
@@ -426,9 +727,9 @@ def show_results(window, results):
     buttons_frame = Frame(window, bg=BACKGROUND_COLOR, padx=20, pady=20)
     buttons_frame.pack(fill="x")
     
-    # Botón para abrir Excel
+    # Botón para exportar las detecciones a Excel y abrirlo
     excel_button = Button(buttons_frame, text="Ver datos en Excel", 
-                         command=lambda: open_file(results['excel_path']))
+                         command=lambda: open_file(export_results_to_excel(results)))
     configure_button(excel_button)
     excel_button.pack(side="left", padx=10)
     
@@ -461,46 +762,108 @@ def handle_error(error, window=None):
     if window:
         window.destroy()
 
-def process_image(image_path, window):
-    """Procesa una imagen completa desde la división hasta el análisis."""
+def process_image(image_path, window=None, save_segments_to_disk=SAVE_SEGMENTS_TO_DISK,
+                  batch_size=DEFAULT_BATCH_SIZE, num_segments=DEFAULT_NUM_SEGMENTS,
+                  overlap=DEFAULT_TILE_OVERLAP, model=None, output_dirs=None,
+                  technical_dir=None, reconstructed_dir=RECONSTRUCTED_IMAGES_DIR,
+                  save_annotated=True, distance_samples=None, slide_id=None, export_excel=False,
+                  headless=False):
+    """
+    Procesa una imagen completa desde la división hasta el análisis.
+    
+    En la interfaz los errores se muestran y se devuelve None, igual que si no se detecta
+    ningún canal. En modo sin interfaz (headless) los errores se propagan al llamador y
+    una imagen sin canales devuelve un resultado con count 0 (y el archivo de detecciones
+    vacío), sin gráficos.
+    
+    Args:
+        image_path: Ruta de la imagen a analizar
+        window: Ventana Tk de la interfaz (None en modo sin interfaz)
+        model: Modelo YOLO ya cargado; si es None se carga con load_model()
+        output_dirs: Carpetas de salida (ver get_output_dirs); por defecto las de BASE_DIR
+        technical_dir: Carpeta para la copia de las detecciones (None para no copiarlas)
+        reconstructed_dir: Carpeta extra para los segmentos anotados (None para omitirla)
+        save_annotated: Si es False no se guardan los segmentos anotados
+        distance_samples: Pares aleatorios para estimar la distancia media (None = exacta)
+        slide_id: Identificador de la muestra en el archivo de detecciones (por defecto,
+            el nombre de la imagen)
+        export_excel: Si es True se exporta también un Excel con las detecciones
+        headless: Modo sin interfaz (ver arriba)
+    """
+    if output_dirs is None:
+        output_dirs = get_output_dirs(BASE_DIR)
+    if slide_id is None:
+        slide_id = os.path.splitext(os.path.basename(image_path))[0]
+    
     try:
-        # Dividir la imagen en segmentos
+        # Abrir la imagen una sola vez: los TIFF se leen por ventanas (solo la región de
+        # cada segmento) y el resto de formatos se decodifica completo y se recorre con vistas
         print(f"Dividiendo imagen {image_path} en segmentos...")
-        segment_positions, segment_width, segment_height = divide_and_save_image(image_path, IMAGES_SEGMENTED_DIR)
-        if segment_positions is None:
+        print(f"Leyendo imagen desde: {image_path}")
+        try:
+            slide = open_slide(image_path)
+        except Exception as e:
+            print(f"Error al leer la imagen: {e}")
             print("Error al dividir la imagen.")
+            if headless:
+                raise
             return None
         
-        # Cargar modelo YOLO
-        print("Cargando modelo YOLO...")
-        model_path = find_model_path()
-        if not model_path:
-            print("ERROR: No se encontró el modelo en ninguna de las rutas verificadas.")
-            return None
+        with slide:
+            windows, segment_width, segment_height = compute_segment_grid(
+                slide.shape, num_segments, overlap=overlap
+            )
             
-        model = YOLO(model_path)
-        print(f"Modelo cargado desde: {model_path}")
-        
-        # Procesar segmentos con el modelo
-        print("Analizando segmentos con el modelo YOLO...")
-        box_centers_and_areas = process_image_segments(segment_positions, model)
+            # Opcionalmente, volcar los segmentos a disco para depuración
+            if save_segments_to_disk:
+                save_segments(slide, windows, output_dirs['images_segmented'])
+            
+            # Cargar modelo YOLO (solo si no se ha recibido uno ya cargado)
+            if model is None:
+                model = load_model()
+                if model is None:
+                    if headless:
+                        raise RuntimeError("No se encontró el modelo YOLO")
+                    return None
+            
+            # Procesar segmentos con el modelo
+            print("Analizando segmentos con el modelo YOLO...")
+            detections = process_image_segments(
+                iter_image_segments(slide, windows), model, batch_size=batch_size,
+                duplicate_threshold=DEFAULT_DUPLICATE_THRESHOLD if overlap > 0 else None,
+                output_dir=output_dirs['segmented_results'] if save_annotated else None,
+                reconstructed_dir=reconstructed_dir if save_annotated else None
+            )
+            
+            # Miniatura para el fondo de los gráficos, sin volver a leer la imagen completa
+            background = load_slide_background(slide) if not detections.empty else None
         
         # Verificar si se detectaron canales
-        if not box_centers_and_areas:
+        if detections.empty:
             print("No se detectaron canales de Havers.")
-            return None
+            if not headless:
+                return None
+            detections_path, excel_path, _ = save_results_to_excel(
+                detections, output_dirs['excel'], technical_dir, slide_id, export_excel
+            )
+            return {'detections_path': detections_path, 'excel_path': excel_path, 'count': 0,
+                    'avg_area': None, 'avg_distance': None, 'avg_nn_distance': None}
         
-        print(f"Se detectaron un total de {len(box_centers_and_areas)} canales de Havers")
+        print(f"Se detectaron un total de {len(detections)} canales de Havers")
         
-        # Guardar resultados en Excel
-        excel_path, df = save_results_to_excel(box_centers_and_areas)
+        # Guardar las detecciones (Parquet y, opcionalmente, Excel)
+        detections_path, excel_path, df = save_results_to_excel(
+            detections, output_dirs['excel'], technical_dir, slide_id, export_excel
+        )
         
         # Generar visualizaciones
         print("Generando visualizaciones...")
-        visualization_results = generate_visualizations(df, image_path)
+        visualization_results = generate_visualizations(df, image_path, output_dirs['results'],
+                                                        distance_samples, background)
         
         # Combinar todos los resultados
         results = {
+            'detections_path': detections_path,
             'excel_path': excel_path,
             **visualization_results
         }
@@ -508,11 +871,244 @@ def process_image(image_path, window):
         return results
         
     except Exception as e:
+        if headless:
+            raise
         handle_error(e, window)
         return None
 
-def main():
+def collect_slide_paths(inputs):
+    """Expande carpetas, patrones glob y rutas sueltas en una lista ordenada de imágenes."""
+    slide_paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            candidates = sorted(os.path.join(entry, name) for name in os.listdir(entry))
+        elif glob.has_magic(entry):
+            candidates = sorted(glob.glob(entry))
+        else:
+            candidates = [entry]
+        
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS) and path not in slide_paths:
+                slide_paths.append(path)
+    
+    return slide_paths
+
+def slide_output_dir(output_root, slide_path, used_names):
+    """Carpeta de salida propia para cada imagen, derivada de su nombre de archivo."""
+    name = os.path.splitext(os.path.basename(slide_path))[0]
+    candidate = name
+    suffix = 2
+    while candidate in used_names:
+        candidate = f"{name}_{suffix}"
+        suffix += 1
+    used_names.add(candidate)
+    return os.path.join(output_root, candidate)
+
+def init_worker(torch_threads, model_path=None):
+    """
+    Inicializa un proceso trabajador: fija los hilos de torch/OpenCV y carga el modelo una vez.
+    
+    Limitar los hilos por trabajador evita que varios procesos compitan por los mismos
+    núcleos (cada proceso de torch usa por defecto todos los núcleos de la máquina).
+    """
+    global _worker_model
+    torch_threads = max(1, int(torch_threads))
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(torch_threads)
+    plt.switch_backend('Agg')
+    _worker_model = load_model(model_path)
+
+def detect_slide(slide_path, output_base, options):
+    """
+    Procesa una imagen con el modelo del proceso actual y devuelve su fila del manifiesto.
+    
+    Nunca lanza excepciones: un fallo queda registrado en la fila con status 'error',
+    de modo que una imagen defectuosa no interrumpe el lote.
+    
+    La columna slide es la imagen analizada, en cuyas coordenadas están las detecciones:
+    la original o, si era demasiado grande, su copia redimensionada en la carpeta de
+    salida. source_slide es siempre la imagen original. Una imagen sin canales detectados
+    es correcta (status 'ok' y count 0); error guarda el tipo y el mensaje de la excepción.
+    """
+    start_time = time.perf_counter()
+    row = {
+        'slide': slide_path,
+        'source_slide': slide_path,
+        'output_dir': output_base,
+        'status': 'error',
+        'count': 0,
+        'avg_area': None,
+        'avg_distance': None,
+        'avg_nn_distance': None,
+        'detections_path': None,
+        'excel_path': None,
+        'error': None,
+    }
+    
+    try:
+        if _worker_model is None:
+            raise RuntimeError("No se encontró el modelo YOLO")
+        
+        output_dirs = get_output_dirs(output_base)
+        for directory in output_dirs.values():
+            os.makedirs(directory, exist_ok=True)
+        
+        image_path = resize_image_if_too_large(slide_path, output_dir=output_base)
+        row['slide'] = image_path
+        
+        slide_id = os.path.splitext(os.path.basename(slide_path))[0]
+        results = process_image(image_path, model=_worker_model, output_dirs=output_dirs,
+                                technical_dir=None, reconstructed_dir=None, slide_id=slide_id,
+                                headless=True, **options)
+        
+        row.update(status='ok', count=results['count'], avg_area=results['avg_area'],
+                   avg_distance=results['avg_distance'], avg_nn_distance=results['avg_nn_distance'],
+                   detections_path=results['detections_path'], excel_path=results['excel_path'])
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    
+    row['seconds'] = round(time.perf_counter() - start_time, 2)
+    return row
+
+def write_manifest(rows, manifest_path):
+    """Guarda en un CSV el resultado de cada imagen del lote."""
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    pd.DataFrame(rows).to_csv(manifest_path, index=False)
+    print(f"Manifiesto del lote guardado en {manifest_path}")
+
+def run_detect(args):
+    """
+    Ejecuta la detección sin interfaz gráfica sobre todas las imágenes indicadas.
+    
+    Con --workers > 1 las imágenes se reparten en un pool de procesos; cada proceso
+    carga el modelo una sola vez y usa --torch-threads hilos.
+    """
+    # Backend sin ventana para generar los gráficos en nodos sin pantalla
+    plt.switch_backend('Agg')
+    
+    slide_paths = collect_slide_paths(args.inputs)
+    if not slide_paths:
+        print("No se encontraron imágenes para procesar.")
+        return 1
+    
+    workers = max(1, args.workers)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Se procesarán {len(slide_paths)} imágenes con {workers} proceso(s) "
+          f"de {torch_threads} hilo(s)")
+    
+    used_names = set()
+    tasks = [(slide_path, slide_output_dir(args.output_dir, slide_path, used_names))
+             for slide_path in slide_paths]
+    options = {
+        'save_segments_to_disk': args.save_segments,
+        'batch_size': args.batch_size,
+        'num_segments': args.segments,
+        'overlap': args.overlap,
+        'save_annotated': args.save_annotated,
+        'distance_samples': args.distance_samples,
+        'export_excel': args.excel,
+    }
+    
+    rows = []
+    if workers == 1:
+        # En un solo proceso, el modelo se carga una vez y se reutiliza para todas las imágenes
+        init_worker(torch_threads, args.model)
+        for index, (slide_path, output_base) in enumerate(tasks, start=1):
+            print(f"\n[{index}/{len(tasks)}] {slide_path}")
+            rows.append(detect_slide(slide_path, output_base, options))
+    else:
+        # 'spawn' evita heredar por fork el estado de torch del proceso principal
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_worker, initargs=(torch_threads, args.model)) as executor:
+            futures = {executor.submit(detect_slide, slide_path, output_base, options): (slide_path, output_base)
+                       for slide_path, output_base in tasks}
+            for index, future in enumerate(as_completed(futures), start=1):
+                slide_path, output_base = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    # El proceso trabajador murió (p. ej. sin memoria); se registra y se sigue
+                    row = {'slide': slide_path, 'source_slide': slide_path, 'output_dir': output_base,
+                           'status': 'error', 'count': 0, 'error': f"Fallo del proceso trabajador: {e}"}
+                rows.append(row)
+                print(f"[{index}/{len(tasks)}] {slide_path}: {row['status']}")
+    
+    # Mantener en el manifiesto el orden de entrada de las imágenes
+    order = {output_base: i for i, (_, output_base) in enumerate(tasks)}
+    rows.sort(key=lambda row: order[row['output_dir']])
+    write_manifest(rows, args.manifest or os.path.join(args.output_dir, "manifest.csv"))
+    
+    failed = [row for row in rows if row['status'] != 'ok']
+    for row in failed:
+        print(f"Error en {row['slide']}: {row['error']}")
+    print(f"\nProcesadas {len(rows) - len(failed)}/{len(rows)} imágenes correctamente")
+    return 1 if failed else 0
+
+def processing_options(suppress_defaults=False):
+    """
+    Opciones de procesamiento compartidas por la interfaz y el comando detect.
+    
+    La copia del subcomando se crea con suppress_defaults=True: sus opciones no tienen
+    valor por defecto (argparse.SUPPRESS), de modo que no sobrescriben las que se dieron
+    antes del subcomando (`--batch-size 4 detect x` usa 4).
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+    
+    processing = argparse.ArgumentParser(add_help=False)
+    processing.add_argument("--batch-size", type=int, default=default(DEFAULT_BATCH_SIZE),
+                            help=f"Segmentos por llamada al modelo YOLO (por defecto {DEFAULT_BATCH_SIZE})")
+    processing.add_argument("--segments", type=int, default=default(DEFAULT_NUM_SEGMENTS),
+                            help=f"Número aproximado de segmentos, en filas de 15 (por defecto {DEFAULT_NUM_SEGMENTS})")
+    processing.add_argument("--overlap", type=int, default=default(DEFAULT_TILE_OVERLAP),
+                            help="Solapamiento en píxeles entre segmentos vecinos; los duplicados "
+                                 "se fusionan con NMS entre segmentos (por defecto 0)")
+    processing.add_argument("--distance-samples", type=int, default=default(None),
+                            help="Estimar la distancia media con N pares aleatorios e intervalo de "
+                                 "confianza, en lugar del cálculo exacto (útil con muchos canales)")
+    processing.add_argument("--excel", action="store_true", default=default(False),
+                            help=f"Exportar también las detecciones a Excel ({EXCEL_FILENAME}); "
+                                 f"el formato de intercambio es {DETECTIONS_FILENAME}")
+    return processing
+
+def parse_args(argv=None):
+    """Lee los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Phygital Bone - Detección de canales de Havers",
+                                     parents=[processing_options()])
+    parser.add_argument("--technical-copy", action="store_true",
+                        help="Guardar una copia de seguridad de las detecciones en TECHNICAL_DIR")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    detect = subparsers.add_parser("detect", parents=[processing_options(suppress_defaults=True)],
+                                   help="Procesa carpetas o patrones de imágenes sin interfaz gráfica")
+    detect.add_argument("inputs", nargs="+",
+                        help="Carpetas, patrones glob (entre comillas) o rutas de imágenes")
+    detect.add_argument("--output-dir", default="detection_results",
+                        help="Carpeta raíz de resultados; cada imagen tiene su propia subcarpeta")
+    detect.add_argument("--save-segments", action="store_true",
+                        help="Guardar los segmentos como PNG (depuración)")
+    detect.add_argument("--save-annotated", action="store_true",
+                        help="Guardar los segmentos anotados por YOLO")
+    detect.add_argument("--model", default=None,
+                        help="Ruta de los pesos YOLO (por defecto, la encontrada por find_model_path)")
+    detect.add_argument("--workers", type=int, default=1,
+                        help="Procesos en paralelo; cada uno carga el modelo una vez (por defecto 1)")
+    detect.add_argument("--torch-threads", type=int, default=None,
+                        help="Hilos de torch por proceso (por defecto núcleos / workers)")
+    detect.add_argument("--manifest", default=None,
+                        help="CSV con el resultado de cada imagen (por defecto <output-dir>/manifest.csv)")
+    
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Función principal del programa."""
+    args = parse_args(argv)
+    
+    # Modo sin interfaz gráfica
+    if args.command == "detect":
+        return run_detect(args)
+    
     # Crear directorios necesarios
     initialize_directories()
     
@@ -534,7 +1130,8 @@ def main():
             return
         
         # Verificar y ajustar tamaño de imagen si es necesario
-        image_path = resize_image_if_too_large(image_path)
+        slide_id = os.path.splitext(os.path.basename(image_path))[0]
+        image_path = resize_image_if_too_large(image_path, output_dir=BASE_DIR)
         if not image_path:
             print("Error al procesar la imagen.")
             root.destroy()
@@ -544,7 +1141,11 @@ def main():
         show_processing_screen(root)
         
         # Procesar la imagen
-        results = process_image(image_path, root)
+        results = process_image(image_path, root, batch_size=args.batch_size,
+                                num_segments=args.segments, overlap=args.overlap,
+                                distance_samples=args.distance_samples, slide_id=slide_id,
+                                export_excel=args.excel,
+                                technical_dir=TECHNICAL_DIR if args.technical_copy else None)
         
         # Mostrar resultados
         if results:
@@ -558,4 +1159,4 @@ def main():
         handle_error(e, root)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,11 +1,74 @@
+import argparse
 import cv2
+import multiprocessing
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-from tkinter import Tk, Button, Text, Frame, Label, ttk, filedialog, Toplevel, messagebox, Scrollbar
+from tkinter import (Tk, Button, Text, Frame, Label, ttk, filedialog, Toplevel, messagebox, Scrollbar,
+                     Scale, IntVar, DoubleVar, Canvas)
 from PIL import Image, ImageTk
 import matplotlib.pyplot as plt
 import math
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Módulos compartidos entre aplicaciones (apps/common)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.detections import CENTER_X, CENTER_Y, ELLIPSE_AREA, DetectionCache, numeric_column, read_detections
+from common.image_pyramid import ImagePyramid, compose_view, pyramid_paths, write_pyramid
+from common.slide_reader import open_slide
+from common.spatial_index import DetectionSpatialIndex
+
+# Cuadrícula por defecto del análisis por cuadrantes
+FILAS_CUADRICULA = 6
+COLUMNAS_CUADRICULA = 6
+
+# Mínimo de canales para considerar un cuadrante válido
+MIN_CANALES = 6
+
+# Peso del factor de tamaño (canal más grande / área promedio) en la puntuación de fragilidad
+PESO_TAMANO = 0.5
+
+# Tamaños de cuadrícula n×n evaluados en el análisis multirresolución
+TAMANOS_MULTIRRESOLUCION = range(4, 65)
+
+# Celdas por lado de la cuadrícula fina sobre la que se busca el camino de propagación
+CELDAS_CAMINO = 64
+
+# Coste fijo por celda recorrida en el camino de propagación (relativo a la densidad
+# máxima, que cuesta 1): evita rodeos largos por zonas sin canales
+COSTE_BASE_PASO = 0.05
+
+# Ventana (en celdas) con la que se suaviza la densidad de la cuadrícula fina
+VENTANA_SUAVIZADO_CAMINO = 3
+
+# Carpeta de resultados de la interfaz gráfica (se puede cambiar con --results-dir)
+RESULTS_DIR = r"C:\Users\joanb\OneDrive\Escritorio\TFG\Workspace_tfg\histology_bone_analyzer\data\sample_results\breaking_app"
+
+# Columnas del manifiesto de pares (imagen, detecciones); coinciden con las del
+# manifest.csv que genera el comando detect de detection_app
+COLUMNA_IMAGEN = 'slide'
+COLUMNA_DETECCIONES = 'detections_path'
+
+# Tipos de cuadrante en la tabla de resultados y su etiqueta en la pestaña de datos
+TIPOS_CUADRANTE = ["Más frágil", "Contiguo menor densidad", "Central", "Normal", "Ignorado (pocos canales)"]
+ETIQUETAS_TIPO = {
+    "Más frágil": " (MÁS FRÁGIL)",
+    "Contiguo menor densidad": " (MENOR DENSIDAD CONTIGUO)",
+    "Central": " (CENTRAL)",
+}
+
+# Cuadrantes por página en la pestaña de datos (las cuadrículas mayores de 6×6 se paginan)
+CUADRANTES_POR_PAGINA = 36
+
+# Tamaño máximo del visor de imágenes de resultados y ampliación máxima (píxeles de
+# pantalla por píxel de imagen)
+ANCHO_VISOR = 800
+ALTO_MAXIMO_VISOR = 800
+ZOOM_MAXIMO = 4.0
 
 def configure_window(window, title):
     """Configura el aspecto visual de la ventana principal"""
@@ -28,203 +91,281 @@ def configure_button(button):
     button.bind("<Enter>", lambda e: button.configure(bg="#333333"))  # Cambia a gris al pasar el mouse
     button.bind("<Leave>", lambda e: button.configure(bg="#BD0000"))  # Vuelve a rojo al salir el mouse
 
-def reconstruir_imagen_con_detecciones(imagen_original, excel_path, output_path):
+def dibujar_circulos(imagen, centros, radios, color=(0, 255, 0), grosor=2):
+    """
+    Dibuja todos los círculos con una única llamada a cv2.polylines.
+    
+    Cada círculo se traza como el polígono que usa internamente cv2.circle (mismo paso
+    angular según el radio y coordenadas en punto fijo con 16 bits de fracción). Con
+    grosor >= 2 el resultado coincide píxel a píxel con llamar a cv2.circle para cada
+    canal; con grosor 1 OpenCV traza el círculo con un algoritmo de Bresenham propio, así
+    que el contorno puede diferir en algunos píxeles (solo se usa en las vistas previas
+    reducidas, donde no se busca esa equivalencia). Solo se calcula una plantilla por
+    radio distinto.
+    
+    Args:
+        imagen: Imagen BGR sobre la que se dibuja (se modifica en el sitio)
+        centros: Array (n, 2) de enteros con las coordenadas x, y
+        radios: Array (n,) de radios enteros
+    """
+    if len(centros) == 0:
+        return imagen
+    
+    centros = np.asarray(centros, dtype=np.int64)
+    radios = np.asarray(radios, dtype=np.int64)
+    
+    # Bits de fracción del punto fijo (16 como cv2.circle), menos si las coordenadas
+    # de imágenes muy grandes no cabrían en int32
+    limite = int(np.abs(centros).max() + radios.max() + 2)
+    bits = max(0, min(16, 30 - limite.bit_length()))
+    
+    orden = np.argsort(radios, kind='stable')
+    radios_unicos, inicios = np.unique(radios[orden], return_index=True)
+    
+    contornos = []
+    for radio, grupo in zip(radios_unicos, np.split(centros[orden], inicios[1:])):
+        paso = 90 if radio < 3 else 30 if radio < 10 else 18 if radio < 15 else 5
+        angulos = np.deg2rad(np.arange(0, 361, paso))
+        plantilla = np.rint(np.column_stack((np.cos(angulos), np.sin(angulos))) * (radio * (1 << bits)))
+        poligonos = (grupo[:, None, :] << bits) + plantilla.astype(np.int64)[None, :, :]
+        contornos.extend(poligonos.astype(np.int32))
+    
+    cv2.polylines(imagen, contornos, False, color, grosor, cv2.LINE_8, bits)
+    return imagen
+
+def reconstruir_imagen_con_detecciones(imagen_original, detecciones, output_path, max_lado=None):
     """
     Reconstruye la imagen original con las detecciones de canales marcadas.
     
     Args:
         imagen_original: Ruta a la imagen original
-        excel_path: Ruta al archivo Excel con las coordenadas de detecciones
-        output_path: Ruta donde guardar la imagen reconstruida
+        detecciones: TablaCanales, DataFrame de detecciones o ruta al archivo (Parquet o Excel antiguo)
+        output_path: Ruta donde guardar la imagen reconstruida (None para no guardarla)
+        max_lado: Si se indica y la imagen es mayor, se dibuja sobre una vista previa
+            reducida cuyo lado mayor mide max_lado píxeles en lugar de a resolución completa
     
     Returns:
-        imagen_reconstruida: Imagen con las detecciones marcadas
+        imagen_reconstruida: Imagen (o vista previa) con las detecciones marcadas
+        dimensiones_originales: (ancho, alto) de la imagen a resolución completa
     """
-    # Cargar la imagen original
-    imagen = cv2.imread(imagen_original)
+    # Cargar la imagen original (los TIFF grandes se reducen sin decodificarlos completos)
+    with open_slide(imagen_original) as slide:
+        width, height = slide.width, slide.height
+        if max_lado and max(width, height) > max_lado:
+            imagen = slide.thumbnail(max_lado).copy()
+        else:
+            imagen = slide.read_region(0, 0, width, height)
     
     # Si la imagen es muy grande, mostrar una advertencia pero continuar
-    height, width = imagen.shape[:2]
     pixels = height * width
-    if pixels > 89478485:  # Límite de PIL por defecto
+    if pixels > 89478485 and imagen.shape[:2] == (height, width):  # Límite de PIL por defecto
         print(f"Advertencia: Imagen grande ({pixels} píxeles), el procesamiento puede ser lento")
     
-    # Cargar datos de detecciones
-    df = pd.read_excel(excel_path)
+    # Coordenadas y radios de todos los canales (ya interpretados si se reciben como
+    # TablaCanales); el radio se aproxima a partir del área (A = πr²)
+    canales = preparar_canales(detecciones)
+    xs, ys, areas = canales.xs, canales.ys, canales.areas
+    radios = np.sqrt(areas / np.pi)
     
-    # Dibujar cada canal detectado como un círculo en la imagen
-    for i, row in df.iterrows():
-        # Procesar valores de centro que podrían ser tensores o strings
-        try:
-            # Si es string que contiene tensor, extraer el número
-            if isinstance(row['Center X'], str) and 'tensor' in row['Center X']:
-                # Extraer el número entre paréntesis
-                valor = row['Center X'].split('(')[1].split(')')[0]
-                centro_x = float(valor)
-            else:
-                centro_x = float(row['Center X'])
-            
-            if isinstance(row['Center Y'], str) and 'tensor' in row['Center Y']:
-                # Extraer el número entre paréntesis
-                valor = row['Center Y'].split('(')[1].split(')')[0]
-                centro_y = float(valor)
-            else:
-                centro_y = float(row['Center Y'])
-                
-            # Convertir a enteros para coordenadas de píxeles
-            centro_x = int(centro_x)
-            centro_y = int(centro_y)
-            
-            # Procesar el área de manera similar
-            if isinstance(row['Ellipse Area (pixels^2)'], str) and 'tensor' in row['Ellipse Area (pixels^2)']:
-                # Extraer el número entre paréntesis
-                valor = row['Ellipse Area (pixels^2)'].split('(')[1].split(')')[0]
-                area = float(valor)
-            else:
-                area = float(row['Ellipse Area (pixels^2)'])
-                
-            # Calcular radio aproximado del canal basado en el área (A = πr²)
-            radio = int(np.sqrt(area / np.pi))
-            
-            # Dibujar círculo en la posición del canal
-            cv2.circle(imagen, (centro_x, centro_y), radio, (0, 255, 0), 2)
-        except Exception as e:
-            print(f"Error procesando fila {i}: {e}")
-            continue  # Saltar esta detección si hay error
+    # Escala de la imagen de trabajo respecto a la original (1 a resolución completa)
+    escala_x = imagen.shape[1] / width
+    escala_y = imagen.shape[0] / height
+    if escala_x == 1 and escala_y == 1:
+        centros = np.column_stack((xs, ys))
+        grosor = 2
+    else:
+        centros = np.column_stack((xs * escala_x, ys * escala_y)).astype(np.int64)
+        radios = radios * escala_x
+        grosor = 1  # Trazo fino en la vista previa (no idéntico a cv2.circle, ver dibujar_circulos)
+    
+    # Dibujar todos los canales detectados de una vez
+    dibujar_circulos(imagen, centros, radios.astype(np.int64), (0, 255, 0), grosor)
     
     # Guardar imagen reconstruida
-    cv2.imwrite(output_path, imagen)
+    if output_path:
+        cv2.imwrite(output_path, imagen)
     
-    return imagen
+    return imagen, (width, height)
 
-def analizar_cuadrantes(imagen, df, output_path, min_canales=6):
+def leer_canales(df):
     """
-    Divide la imagen en 36 cuadrantes (matriz 6x6) y analiza la distribución de canales.
-    Implementa el nuevo enfoque de fragilidad que considera áreas con canales grandes
-    como más propensas a fractura. El cuadrante azul es el de menor densidad entre los contiguos.
+    Devuelve las coordenadas enteras (x, y) y el área de los canales con valores numéricos.
     
-    Args:
-        imagen: Imagen reconstruida con detecciones
-        df: DataFrame con coordenadas y áreas de canales
-        output_path: Ruta donde guardar la imagen final
-        min_canales: Número mínimo de canales para considerar un cuadrante válido
+    Las columnas se interpretan una sola vez (admite archivos antiguos con "tensor(...)")
+    y los canales con valores no numéricos se omiten.
+    """
+    centros_x = numeric_column(df[CENTER_X])
+    centros_y = numeric_column(df[CENTER_Y])
+    areas = numeric_column(df[ELLIPSE_AREA])
     
-    Returns:
-        imagen_con_cuadrantes: Imagen con cuadrantes marcados
-        areas_por_cuadrante: Array con áreas por cuadrante
-        canales_por_cuadrante: Lista de canales agrupados por cuadrante
-        cuad_baja_densidad_idx: Índice del cuadrante contiguo con menor densidad
-        puntuacion_fragilidad: Puntuaciones calculadas para cada cuadrante
-        densidad_por_cuadrante: Densidades calculadas para cada cuadrante
+    validos = np.isfinite(centros_x) & np.isfinite(centros_y) & ~np.isnan(areas)
+    if not validos.all():
+        print(f"Se omitieron {np.count_nonzero(~validos)} canales con valores no numéricos")
+    
+    xs = np.trunc(centros_x[validos]).astype(np.int64)
+    ys = np.trunc(centros_y[validos]).astype(np.int64)
+    return xs, ys, areas[validos]
+
+class TablaCanales:
     """
-    # Obtener dimensiones originales de la imagen
-    height, width = imagen.shape[:2]
+    Detecciones de una muestra interpretadas una sola vez.
     
-    # Calcular dimensiones de cuadrantes
-    cuad_height = height // 6
-    cuad_width = width // 6
+    Guarda la tabla tipada (df) y los arrays de canales válidos (xs, ys, areas) que
+    comparten la reconstrucción, el análisis por cuadrantes y el multirresolución, junto
+    con los resultados intermedios que no dependen de min_canales ni de peso_tamano
+    (agregados por cuadrante, distancias al vecino más cercano), de modo que al cambiar
+    esos parámetros solo se vuelve a puntuar.
+    """
     
-    # Crear estructuras para almacenar datos por cuadrante
-    areas_por_cuadrante = np.zeros(36)
-    canales_por_cuadrante = [[] for _ in range(36)]
-    canales_maximos = np.zeros(36)  # Para almacenar el área del canal más grande por cuadrante
-    puntuacion_fragilidad = np.zeros(36)  # Nueva métrica
-    densidad_por_cuadrante = np.zeros(36)  # Para calcular densidad (canales/área)
+    def __init__(self, df):
+        self.df = df
+        self.xs, self.ys, self.areas = leer_canales(df)
+        self._calculos = {}
     
-    # Clasificar cada canal en su cuadrante correspondiente
-    for i, row in df.iterrows():
-        try:
-            # Procesar coordenadas X e Y
-            if isinstance(row['Center X'], str) and 'tensor' in row['Center X']:
-                valor = row['Center X'].split('(')[1].split(')')[0]
-                x = float(valor)
-            else:
-                x = float(row['Center X'])
-                
-            if isinstance(row['Center Y'], str) and 'tensor' in row['Center Y']:
-                valor = row['Center Y'].split('(')[1].split(')')[0]
-                y = float(valor)
-            else:
-                y = float(row['Center Y'])
-                
-            x = int(x)
-            y = int(y)
-            
-            # Procesar el área
-            if isinstance(row['Ellipse Area (pixels^2)'], str) and 'tensor' in row['Ellipse Area (pixels^2)']:
-                valor = row['Ellipse Area (pixels^2)'].split('(')[1].split(')')[0]
-                area = float(valor)
-            else:
-                area = float(row['Ellipse Area (pixels^2)'])
-                
-            # Determinar a qué cuadrante pertenece
-            cuad_col = x // cuad_width
-            cuad_row = y // cuad_height
-            
-            cuad_col = min(5, max(0, cuad_col))
-            cuad_row = min(5, max(0, cuad_row))
-            
-            cuad_idx = cuad_row * 6 + cuad_col
-            
-            # Acumular área en este cuadrante
-            areas_por_cuadrante[cuad_idx] += area
-            
-            # Guardar referencia al canal
-            canales_por_cuadrante[cuad_idx].append((x, y, area))
-            
-            # Actualizar el área del canal más grande si corresponde
-            if area > canales_maximos[cuad_idx]:
-                canales_maximos[cuad_idx] = area
-                
-        except Exception as e:
-            print(f"Error procesando canal {i}: {e}")
-            continue
+    def __len__(self):
+        return len(self.xs)
     
-    # Calcular densidad (canales por área del cuadrante)
-    area_cuadrante = cuad_width * cuad_height
-    for i in range(36):
-        num_canales = len(canales_por_cuadrante[i])
-        if num_canales > 0:
-            densidad_por_cuadrante[i] = num_canales / area_cuadrante
+    def calculado(self, clave, calcular):
+        """Devuelve el resultado guardado para clave, calculándolo con calcular() la primera vez."""
+        if clave not in self._calculos:
+            self._calculos[clave] = calcular()
+        return self._calculos[clave]
+
+# Detecciones ya leídas, por archivo (se vuelven a leer solo si el archivo cambia)
+_cache_detecciones = DetectionCache(lambda path: TablaCanales(read_detections(path)))
+
+def cargar_detecciones(path):
+    """Lee un archivo de detecciones como TablaCanales, reutilizando la caché si no ha cambiado."""
+    return _cache_detecciones.load(path)
+
+def preparar_canales(detecciones):
+    """Convierte una TablaCanales, un DataFrame de detecciones o una ruta en TablaCanales."""
+    if isinstance(detecciones, TablaCanales):
+        return detecciones
+    if isinstance(detecciones, pd.DataFrame):
+        return TablaCanales(detecciones)
+    return cargar_detecciones(detecciones)
+
+def cuadrantes_centrales(filas, columnas):
+    """
+    Índices de los cuadrantes centrales de una cuadrícula filas×columnas.
     
-    # Calcular puntuación de fragilidad para cada cuadrante
-    for i in range(36):
-        num_canales = len(canales_por_cuadrante[i])
+    Se toman las 2 filas (o columnas) centrales si su número es par y la central si es
+    impar; en la matriz 6×6 son los cuadrantes (2,2), (2,3), (3,2) y (3,3).
+    """
+    def centrales(n):
+        return [n // 2 - 1, n // 2] if n % 2 == 0 else [n // 2]
+    
+    return [fila * columnas + columna for fila in centrales(filas) for columna in centrales(columnas)]
+
+def agregar_por_cuadrante(xs, ys, areas, ancho, alto, filas, columnas):
+    """
+    Clasifica los canales en una cuadrícula filas×columnas y agrega sus áreas.
+    
+    Returns:
+        cuadrante_de_canal: Índice (fila * columnas + columna) del cuadrante de cada canal
+        num_canales: Número de canales por cuadrante
+        areas_totales: Suma de las áreas por cuadrante
+        area_maxima: Área del canal más grande por cuadrante
+    """
+    cuad_width = ancho // columnas
+    cuad_height = alto // filas
+    num_cuadrantes = filas * columnas
+    
+    cuad_cols = np.clip(xs // cuad_width, 0, columnas - 1)
+    cuad_rows = np.clip(ys // cuad_height, 0, filas - 1)
+    cuadrante_de_canal = cuad_rows * columnas + cuad_cols
+    
+    num_canales = np.bincount(cuadrante_de_canal, minlength=num_cuadrantes)
+    areas_totales = np.bincount(cuadrante_de_canal, weights=areas, minlength=num_cuadrantes)
+    area_maxima = np.zeros(num_cuadrantes)
+    np.maximum.at(area_maxima, cuadrante_de_canal, areas)
+    return cuadrante_de_canal, num_canales, areas_totales, area_maxima
+
+def agregados_cuadrantes(canales, ancho, alto, filas, columnas):
+    """
+    Agregados por cuadrante de una cuadrícula filas×columnas que no dependen de los
+    parámetros de puntuación. Se guardan en la TablaCanales para reutilizarlos.
+    
+    Returns:
+        num_canales, areas_totales, area_maxima: Arrays por cuadrante (ver agregar_por_cuadrante)
+        canales_por_cuadrante: Lista de canales (x, y, área) de cada cuadrante, en el orden original
+        vecino_medio: Distancia media al vecino más cercano por cuadrante (NaN si no hay canales)
+    """
+    def calcular():
+        xs, ys, areas = canales.xs, canales.ys, canales.areas
+        num_cuadrantes = filas * columnas
+        cuadrante_de_canal, num_canales, areas_totales, area_maxima = \
+            agregar_por_cuadrante(xs, ys, areas, ancho, alto, filas, columnas)
         
-        # Solo considerar cuadrantes con suficientes canales
-        if num_canales >= min_canales:
-            # Área promedio por canal
-            area_promedio = areas_por_cuadrante[i] / num_canales
-            
-            # Normalizar por número de canales (uso de logaritmo para suavizar el efecto)
-            factor_num_canales = np.log10(1 + num_canales)
-            
-            # Factor de tamaño (relación entre el canal más grande y el promedio)
-            factor_tamaño = canales_maximos[i] / area_promedio if area_promedio > 0 else 1
-            
-            # Puntuación final de fragilidad: área promedio × factor de canales × factor de tamaño
-            puntuacion_fragilidad[i] = area_promedio * factor_num_canales * (1 + 0.5*(factor_tamaño - 1))
-        else:
-            # Si hay muy pocos canales, asignar puntuación cero
-            puntuacion_fragilidad[i] = 0
+        # Canales (x, y, área) agrupados por cuadrante, en el orden original
+        orden = np.argsort(cuadrante_de_canal, kind='stable')
+        limites = np.cumsum(num_canales)[:-1]
+        canales_por_cuadrante = [
+            list(zip(x.tolist(), y.tolist(), a.tolist()))
+            for x, y, a in zip(np.split(xs[orden], limites), np.split(ys[orden], limites),
+                               np.split(areas[orden], limites))
+        ]
+        
+        # Distancia media al vecino más cercano por cuadrante, con el índice espacial compartido
+        distancias_vecino = canales.calculado(
+            'distancias_vecino',
+            lambda: DetectionSpatialIndex(np.column_stack((xs, ys))).nearest_neighbor_distances()
+        )
+        vecino_medio = np.full(num_cuadrantes, np.nan)
+        if len(canales) > 1:
+            suma = np.bincount(cuadrante_de_canal, weights=distancias_vecino, minlength=num_cuadrantes)
+            np.divide(suma, num_canales, out=vecino_medio, where=num_canales > 0)
+        
+        return num_canales, areas_totales, area_maxima, canales_por_cuadrante, vecino_medio
     
-    # Definir los índices de los 4 cuadrantes centrales (en una matriz 6x6)
-    cuadrantes_centrales = [
-        2*6 + 2,  # (2,2)
-        2*6 + 3,  # (2,3)
-        3*6 + 2,  # (3,2)
-        3*6 + 3   # (3,3)
-    ]
+    return canales.calculado(('cuadrantes', ancho, alto, filas, columnas), calcular)
+
+def puntuar_fragilidad(num_canales, areas_totales, area_maxima, min_canales=MIN_CANALES,
+                       peso_tamano=PESO_TAMANO):
+    """
+    Puntuación de fragilidad de cada cuadrante.
+    
+    Área promedio × log10(1 + N° canales) × (1 + peso_tamano × (factor de tamaño - 1)),
+    donde el factor de tamaño es la relación entre el canal más grande y el promedio.
+    Los cuadrantes con menos de min_canales canales tienen puntuación cero.
+    """
+    puntuacion_fragilidad = np.zeros(len(num_canales))
+    validos = num_canales >= min_canales
+    
+    # Área promedio por canal
+    area_promedio = areas_totales[validos] / num_canales[validos]
+    
+    # Normalizar por número de canales (uso de logaritmo para suavizar el efecto)
+    factor_num_canales = np.log10(1 + num_canales[validos])
+    
+    # Factor de tamaño (relación entre el canal más grande y el promedio)
+    factor_tamaño = np.ones_like(area_promedio)
+    np.divide(area_maxima[validos], area_promedio, out=factor_tamaño, where=area_promedio > 0)
+    
+    puntuacion_fragilidad[validos] = area_promedio * factor_num_canales * (1 + peso_tamano*(factor_tamaño - 1))
+    return puntuacion_fragilidad
+
+def seleccionar_cuadrantes(puntuacion_fragilidad, num_canales, densidad_por_cuadrante, filas, columnas,
+                           min_canales=MIN_CANALES):
+    """
+    Selecciona el cuadrante más frágil y, entre sus contiguos, el de menor densidad.
+    
+    Se excluyen los cuadrantes centrales y los que tienen menos de min_canales canales.
+    
+    Returns:
+        cuad_max_fragil_idx: Índice del cuadrante más frágil
+        cuad_baja_densidad_idx: Índice del contiguo con menor densidad (None si no hay)
+    """
+    centrales = cuadrantes_centrales(filas, columnas)
     
     # Encontrar cuadrante con mayor fragilidad (excluyendo centrales y con pocos canales)
     puntuacion_mascara = puntuacion_fragilidad.copy()
-    for i in range(36):
-        if i in cuadrantes_centrales or len(canales_por_cuadrante[i]) < min_canales:
-            puntuacion_mascara[i] = -1
-            
-    cuad_max_fragil_idx = np.argmax(puntuacion_mascara)
-    max_row = cuad_max_fragil_idx // 6
-    max_col = cuad_max_fragil_idx % 6
+    puntuacion_mascara[centrales] = -1
+    puntuacion_mascara[num_canales < min_canales] = -1
+    
+    cuad_max_fragil_idx = int(np.argmax(puntuacion_mascara))
+    max_row, max_col = divmod(cuad_max_fragil_idx, columnas)
     
     # Encontrar cuadrantes contiguos al más frágil
     cuadrantes_contiguos = []
@@ -240,75 +381,290 @@ def analizar_cuadrantes(imagen, df, output_path, min_canales=6):
             contiguo_col = max_col + dc
             
             # Comprobar que está dentro de los límites
-            if 0 <= contiguo_row < 6 and 0 <= contiguo_col < 6:
-                # Calcular índice del cuadrante contiguo
-                contiguo_idx = contiguo_row * 6 + contiguo_col
+            if 0 <= contiguo_row < filas and 0 <= contiguo_col < columnas:
+                contiguo_idx = contiguo_row * columnas + contiguo_col
                 
-                # Verificar que no es uno de los 4 cuadrantes centrales
-                # y que tiene suficientes canales
-                if (contiguo_idx not in cuadrantes_centrales and 
-                    len(canales_por_cuadrante[contiguo_idx]) >= min_canales):
-                    
+                # Verificar que no es central y que tiene suficientes canales
+                if contiguo_idx not in centrales and num_canales[contiguo_idx] >= min_canales:
                     # Añadir a la lista con su DENSIDAD (no fragilidad)
                     # Ya que queremos el de MENOR densidad para la propagación
                     cuadrantes_contiguos.append((contiguo_idx, densidad_por_cuadrante[contiguo_idx]))
     
     # Encontrar el cuadrante contiguo con MENOR densidad
     if cuadrantes_contiguos:
-        # Ordenar por densidad (de menor a mayor)
         cuadrantes_contiguos.sort(key=lambda x: x[1])
         cuad_baja_densidad_idx = cuadrantes_contiguos[0][0]
     else:
         # En caso de que no haya cuadrantes contiguos válidos
         cuad_baja_densidad_idx = None
     
-    # Imagen para visualización
-    imagen_con_cuadrantes = imagen.copy()
+    return cuad_max_fragil_idx, cuad_baja_densidad_idx
+
+def grafo_cuadricula(coste_celda, filas, columnas):
+    """
+    Grafo disperso de una cuadrícula filas×columnas con conexiones a los 8 vecinos.
+    
+    El peso de cada arista es la longitud del paso (1 o √2) por el coste de la celda de
+    destino más COSTE_BASE_PASO. Se construye con operaciones vectorizadas por dirección.
+    """
+    indices = np.arange(filas * columnas).reshape(filas, columnas)
+    coste_celda = np.asarray(coste_celda, dtype=np.float64).ravel()
+    origenes, destinos, pesos = [], [], []
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            if dr == 0 and dc == 0:
+                continue
+            origen = indices[max(0, -dr):filas - max(0, dr), max(0, -dc):columnas - max(0, dc)].ravel()
+            destino = origen + dr * columnas + dc
+            origenes.append(origen)
+            destinos.append(destino)
+            pesos.append(math.hypot(dr, dc) * (COSTE_BASE_PASO + coste_celda[destino]))
+    
+    return csr_matrix((np.concatenate(pesos), (np.concatenate(origenes), np.concatenate(destinos))),
+                      shape=(filas * columnas, filas * columnas))
+
+def camino_propagacion(canales, ancho, alto, cuad_origen_idx, filas=FILAS_CUADRICULA,
+                       columnas=COLUMNAS_CUADRICULA, celdas=CELDAS_CAMINO):
+    """
+    Camino de propagación de la fractura desde el cuadrante más frágil hasta el borde.
+    
+    Se divide la imagen en una cuadrícula fina de celdas×celdas con la densidad de canales
+    (suavizada) de cada celda y se busca con Dijkstra el camino de menor resistencia, en
+    el que atravesar una celda cuesta más cuanto más densa es. El camino parte del centro
+    del cuadrante más frágil y termina en el borde de la sección: el borde exterior de la
+    imagen o los cuadrantes centrales. Si el cuadrante de origen ya está en el borde
+    exterior, el camino debe llegar a los centrales (la fractura atraviesa la sección).
+    El resultado se guarda en la TablaCanales.
+    
+    Args:
+        canales: TablaCanales con coordenadas y áreas de canales
+        ancho, alto: Dimensiones de la imagen a resolución completa
+        cuad_origen_idx: Índice del cuadrante de origen en la cuadrícula filas×columnas
+        celdas: Celdas por lado de la cuadrícula fina
+    
+    Returns:
+        DataFrame con una fila por celda del camino, en orden (posición en la cuadrícula
+        fina, centro en píxeles, cuadrante de la cuadrícula filas×columnas, densidad y
+        coste acumulado)
+    """
+    def calcular():
+        cuad_width, cuad_height = ancho // columnas, alto // filas
+        celda_width, celda_height = ancho // celdas, alto // celdas
+        
+        # Densidad suavizada por celda, normalizada a [0, 1] como coste
+        num_canales = canales.calculado(
+            ('canales_por_celda', ancho, alto, celdas),
+            lambda: agregar_por_cuadrante(canales.xs, canales.ys, canales.areas,
+                                          ancho, alto, celdas, celdas)[1]
+        )
+        densidad = cv2.blur(num_canales.reshape(celdas, celdas).astype(np.float64),
+                            (VENTANA_SUAVIZADO_CAMINO, VENTANA_SUAVIZADO_CAMINO)) / (celda_width * celda_height)
+        coste = densidad / densidad.max() if densidad.max() > 0 else densidad
+        
+        # Centro de cada celda y cuadrante de la cuadrícula filas×columnas que lo contiene
+        filas_celda, columnas_celda = np.divmod(np.arange(celdas * celdas), celdas)
+        centros_x = (columnas_celda + 0.5) * celda_width
+        centros_y = (filas_celda + 0.5) * celda_height
+        cuadrante_celda = (np.clip(centros_y // cuad_height, 0, filas - 1).astype(np.int64) * columnas
+                           + np.clip(centros_x // cuad_width, 0, columnas - 1).astype(np.int64))
+        
+        # Origen: celda en el centro del cuadrante; destinos: borde exterior y centrales
+        origen_row, origen_col = divmod(cuad_origen_idx, columnas)
+        origen = (min(celdas - 1, int((origen_row + 0.5) * cuad_height // celda_height)) * celdas
+                  + min(celdas - 1, int((origen_col + 0.5) * cuad_width // celda_width)))
+        destinos = np.isin(cuadrante_celda, cuadrantes_centrales(filas, columnas))
+        if origen_row not in (0, filas - 1) and origen_col not in (0, columnas - 1):
+            destinos |= ((filas_celda == 0) | (filas_celda == celdas - 1)
+                         | (columnas_celda == 0) | (columnas_celda == celdas - 1))
+        
+        distancias, predecesores = dijkstra(grafo_cuadricula(coste, celdas, celdas),
+                                            indices=origen, return_predecessors=True)
+        destino = int(np.flatnonzero(destinos)[np.argmin(distancias[destinos])])
+        
+        camino = [destino]
+        while camino[-1] != origen:
+            camino.append(int(predecesores[camino[-1]]))
+        camino = np.array(camino[::-1])
+        
+        return pd.DataFrame({
+            'Paso': np.arange(len(camino), dtype=np.int32),
+            'Fila Celda': (filas_celda[camino] + 1).astype(np.int32),
+            'Columna Celda': (columnas_celda[camino] + 1).astype(np.int32),
+            'Centro X': centros_x[camino],
+            'Centro Y': centros_y[camino],
+            'Cuadrante': (cuadrante_celda[camino] + 1).astype(np.int32),
+            'Densidad': densidad.ravel()[camino],
+            'Coste Acumulado': distancias[camino],
+        })
+    
+    return canales.calculado(('camino', ancho, alto, filas, columnas, cuad_origen_idx, celdas), calcular)
+
+def longitud_camino(camino):
+    """Longitud (en píxeles) de un camino de propagación."""
+    return np.hypot(np.diff(camino['Centro X']), np.diff(camino['Centro Y'])).sum()
+
+def validar_cuadricula(ancho, alto, filas, columnas):
+    """
+    Comprueba que la cuadrícula filas×columnas se puede trazar sobre una imagen de
+    ancho×alto píxeles: al menos una fila y una columna y cuadrantes de un píxel o más.
+    
+    Raises:
+        ValueError: Si la cuadrícula no es válida
+    """
+    if filas < 1 or columnas < 1:
+        raise ValueError(f"La cuadrícula debe tener al menos una fila y una columna "
+                         f"(filas={filas}, columnas={columnas})")
+    if filas > alto or columnas > ancho:
+        raise ValueError(f"La cuadrícula {filas}×{columnas} es más fina que la imagen "
+                         f"({ancho}×{alto} píxeles): cada cuadrante debe medir al menos un píxel")
+
+def puntuar_cuadrantes(canales, ancho, alto, filas, columnas, min_canales=MIN_CANALES,
+                       peso_tamano=PESO_TAMANO, celdas_camino=CELDAS_CAMINO):
+    """
+    Puntúa la cuadrícula filas×columnas a partir de sus agregados en caché.
+    
+    Returns:
+        Diccionario con los agregados de agregados_cuadrantes (num_canales, areas_totales,
+        area_maxima, canales_por_cuadrante, vecino_medio), la densidad, la puntuación de
+        fragilidad, los índices del cuadrante más frágil y del contiguo de menor densidad
+        y el camino de propagación desde el más frágil (ver camino_propagacion)
+    
+    Raises:
+        ValueError: Si la cuadrícula o la del camino no caben en la imagen (ver validar_cuadricula)
+    """
+    validar_cuadricula(ancho, alto, filas, columnas)
+    validar_cuadricula(ancho, alto, celdas_camino, celdas_camino)
+    
+    num_canales, areas_totales, area_maxima, canales_por_cuadrante, vecino_medio = \
+        agregados_cuadrantes(canales, ancho, alto, filas, columnas)
+    
+    # Densidad (canales por área del cuadrante)
+    densidad = num_canales / ((ancho // columnas) * (alto // filas))
+    
+    puntuacion = puntuar_fragilidad(num_canales, areas_totales, area_maxima, min_canales, peso_tamano)
+    cuad_max_fragil_idx, cuad_baja_densidad_idx = seleccionar_cuadrantes(
+        puntuacion, num_canales, densidad, filas, columnas, min_canales
+    )
+    return {
+        'num_canales': num_canales,
+        'areas_totales': areas_totales,
+        'area_maxima': area_maxima,
+        'canales_por_cuadrante': canales_por_cuadrante,
+        'vecino_medio': vecino_medio,
+        'densidad': densidad,
+        'puntuacion': puntuacion,
+        'cuad_max_fragil_idx': cuad_max_fragil_idx,
+        'cuad_baja_densidad_idx': cuad_baja_densidad_idx,
+        'camino': camino_propagacion(canales, ancho, alto, cuad_max_fragil_idx, filas, columnas,
+                                     celdas_camino),
+    }
+
+def sombrear_rectangulo(imagen, x1, y1, x2, y2, color, alpha):
+    """
+    Mezcla un rectángulo de color sólido sobre la imagen, en el sitio.
+    
+    Equivale a rellenar el rectángulo en una copia de la imagen y combinarla con
+    cv2.addWeighted, pero solo opera sobre la región afectada, de modo que la memoria
+    usada depende del tamaño del rectángulo y no del de la imagen.
+    """
+    alto, ancho = imagen.shape[:2]
+    # cv2.rectangle incluye los bordes x2, y2 en el relleno
+    roi = imagen[max(y1, 0):min(y2 + 1, alto), max(x1, 0):min(x2 + 1, ancho)]
+    if roi.size == 0:
+        return imagen
+    
+    relleno = np.empty_like(roi)
+    relleno[:] = color
+    cv2.addWeighted(relleno, alpha, roi, 1 - alpha, 0, roi)
+    return imagen
+
+
+def dibujar_cuadrantes(imagen, resultado, ancho, alto, filas=FILAS_CUADRICULA, columnas=COLUMNAS_CUADRICULA,
+                       min_canales=MIN_CANALES, origen=(0, 0), escala=(1, 1)):
+    """
+    Dibuja en el sitio la cuadrícula y los resultados de puntuar_cuadrantes sobre imagen.
+    
+    imagen puede ser la imagen completa o solo una vista de ella: un punto (x, y) en
+    coordenadas originales se dibuja en ((x - origen[0]) * escala[0], (y - origen[1]) * escala[1]),
+    de modo que el visor dibuja sobre la región visible a la resolución de la pantalla.
+    Los textos y el trazo del camino tienen un tamaño fijo respecto a imagen.
+    
+    Args:
+        imagen: Imagen BGR sobre la que se dibuja
+        resultado: Diccionario de puntuar_cuadrantes
+        ancho, alto: Dimensiones de la imagen a resolución completa
+        filas, columnas: Dimensiones de la cuadrícula puntuada
+        min_canales: Número mínimo de canales usado en la puntuación
+        origen: Punto (x, y) en coordenadas originales que corresponde a la esquina de imagen
+        escala: Píxeles de imagen por píxel original en x e y
+    """
+    num_cuadrantes = filas * columnas
+    cuad_height = alto // filas
+    cuad_width = ancho // columnas
+    
+    areas_por_cuadrante = resultado['areas_totales']
+    canales_por_cuadrante = resultado['canales_por_cuadrante']
+    vecino_medio_por_cuadrante = resultado['vecino_medio']
+    densidad_por_cuadrante = resultado['densidad']
+    puntuacion_fragilidad = resultado['puntuacion']
+    cuad_max_fragil_idx = resultado['cuad_max_fragil_idx']
+    cuad_baja_densidad_idx = resultado['cuad_baja_densidad_idx']
+    cuadrantes_centrales_idx = cuadrantes_centrales(filas, columnas)
+    max_row, max_col = divmod(cuad_max_fragil_idx, columnas)
+    
+    alto_dibujo, ancho_dibujo = imagen.shape[:2]
+    escala_x, escala_y = escala
+    origen_x, origen_y = origen
+    
+    # Bordes de la cuadrícula en la imagen de dibujo
+    def borde_x(col):
+        return math.floor((col * cuad_width - origen_x) * escala_x)
+    
+    def borde_y(row):
+        return math.floor((row * cuad_height - origen_y) * escala_y)
     
     # Dibujar líneas de cuadrantes
-    for i in range(1, 6):
+    for i in range(1, filas):
         # Líneas horizontales
-        cv2.line(imagen_con_cuadrantes, (0, i*cuad_height), 
-                 (width, i*cuad_height), (255, 255, 255), 1)
+        cv2.line(imagen, (0, borde_y(i)), 
+                 (ancho_dibujo, borde_y(i)), (255, 255, 255), 1)
+    for i in range(1, columnas):
         # Líneas verticales
-        cv2.line(imagen_con_cuadrantes, (i*cuad_width, 0), 
-                 (i*cuad_width, height), (255, 255, 255), 1)
+        cv2.line(imagen, (borde_x(i), 0), 
+                 (borde_x(i), alto_dibujo), (255, 255, 255), 1)
     
     # Marcar cuadrante más frágil
-    x1_max = max_col * cuad_width
-    y1_max = max_row * cuad_height
-    x2_max = (max_col + 1) * cuad_width
-    y2_max = (max_row + 1) * cuad_height
+    x1_max = borde_x(max_col)
+    y1_max = borde_y(max_row)
+    x2_max = borde_x(max_col + 1)
+    y2_max = borde_y(max_row + 1)
     
     # Dibujar rectángulo semitransparente en el cuadrante más frágil (ROJO)
-    overlay = imagen_con_cuadrantes.copy()
-    cv2.rectangle(overlay, (x1_max, y1_max), (x2_max, y2_max), (0, 0, 255), -1)
-    cv2.addWeighted(overlay, 0.3, imagen_con_cuadrantes, 0.7, 0, imagen_con_cuadrantes)
+    sombrear_rectangulo(imagen, x1_max, y1_max, x2_max, y2_max, (0, 0, 255), 0.3)
     
     # Marcar el cuadrante contiguo de menor densidad (camino de propagación)
     if cuad_baja_densidad_idx is not None:
-        min_row = cuad_baja_densidad_idx // 6
-        min_col = cuad_baja_densidad_idx % 6
-        x1_min = min_col * cuad_width
-        y1_min = min_row * cuad_height
-        x2_min = (min_col + 1) * cuad_width
-        y2_min = (min_row + 1) * cuad_height
+        min_row, min_col = divmod(cuad_baja_densidad_idx, columnas)
+        x1_min = borde_x(min_col)
+        y1_min = borde_y(min_row)
+        x2_min = borde_x(min_col + 1)
+        y2_min = borde_y(min_row + 1)
         
         # Dibujar rectángulo semitransparente en el cuadrante de menor densidad (AZUL)
-        overlay = imagen_con_cuadrantes.copy()
-        cv2.rectangle(overlay, (x1_min, y1_min), (x2_min, y2_min), (255, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.3, imagen_con_cuadrantes, 0.7, 0, imagen_con_cuadrantes)
+        sombrear_rectangulo(imagen, x1_min, y1_min, x2_min, y2_min, (255, 0, 0), 0.3)
+    
+    # Puntuación máxima para normalizar la fragilidad (0-100)
+    max_valid_score = np.max(puntuacion_fragilidad) if np.max(puntuacion_fragilidad) > 0 else 1
     
     # Añadir texto con información por cuadrante
     font_scale = 0.4
-    for i in range(36):
-        row = i // 6
-        col = i % 6
-        text_x = col * cuad_width + 5
-        text_y = row * cuad_height + 15
+    for i in range(num_cuadrantes):
+        row, col = divmod(i, columnas)
+        text_x = borde_x(col) + 5
+        text_y = borde_y(row) + 15
         
         # Verificar si es un cuadrante central
-        is_central = i in cuadrantes_centrales
+        is_central = i in cuadrantes_centrales_idx
         
         # Colorear el texto para diferentes tipos de cuadrantes
         if len(canales_por_cuadrante[i]) < min_canales:
@@ -326,75 +682,538 @@ def analizar_cuadrantes(imagen, df, output_path, min_canales=6):
         text1 = f"A:{area_total:.0f}"
         text2 = f"C:{num_canales}"
         
-        cv2.putText(imagen_con_cuadrantes, text1, (text_x, text_y),
+        cv2.putText(imagen, text1, (text_x, text_y),
                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
         
-        cv2.putText(imagen_con_cuadrantes, text2, (text_x, text_y + 15),
+        cv2.putText(imagen, text2, (text_x, text_y + 15),
                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
         
         # Añadir indicador de fragilidad y densidad para cuadrantes válidos
         if num_canales >= min_canales and not is_central:
-            # Normalizar la puntuación de fragilidad (0-100)
-            max_valid_score = np.max(puntuacion_fragilidad) if np.max(puntuacion_fragilidad) > 0 else 1
             normalized_score = int((puntuacion_fragilidad[i] / max_valid_score) * 100)
             
             # Mostrar puntuación de fragilidad
             text3 = f"F:{normalized_score}"
-            cv2.putText(imagen_con_cuadrantes, text3, (text_x, text_y + 30),
+            cv2.putText(imagen, text3, (text_x, text_y + 30),
                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
             
             # Mostrar densidad
             text4 = f"D:{densidad_por_cuadrante[i]:.4f}"
-            cv2.putText(imagen_con_cuadrantes, text4, (text_x, text_y + 45),
+            cv2.putText(imagen, text4, (text_x, text_y + 45),
                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
+            
+            # Mostrar distancia media al vecino más cercano
+            if not np.isnan(vecino_medio_por_cuadrante[i]):
+                text5 = f"V:{vecino_medio_por_cuadrante[i]:.0f}"
+                cv2.putText(imagen, text5, (text_x, text_y + 60),
+                           cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 1)
                        
         # Para cuadrantes centrales, añadir una marca especial
         if is_central:
-            x1 = col * cuad_width
-            y1 = row * cuad_height
-            x2 = (col + 1) * cuad_width
-            y2 = (row + 1) * cuad_height
-            overlay = imagen_con_cuadrantes.copy()
-            cv2.rectangle(overlay, (x1, y1), (x2, y2), (128, 128, 128), -1)
-            cv2.addWeighted(overlay, 0.2, imagen_con_cuadrantes, 0.8, 0, imagen_con_cuadrantes)
+            x1 = borde_x(col)
+            y1 = borde_y(row)
+            x2 = borde_x(col + 1)
+            y2 = borde_y(row + 1)
+            sombrear_rectangulo(imagen, x1, y1, x2, y2, (128, 128, 128), 0.2)
             
         # Para cuadrantes con pocos canales, marcarlos como no válidos
         if num_canales < min_canales:
-            x1 = col * cuad_width
-            y1 = row * cuad_height
-            x2 = (col + 1) * cuad_width
-            y2 = (row + 1) * cuad_height
+            x1 = borde_x(col)
+            y1 = borde_y(row)
+            x2 = borde_x(col + 1)
+            y2 = borde_y(row + 1)
             # Dibujar una X para indicar que no es válido
-            cv2.line(imagen_con_cuadrantes, (x1, y1), (x2, y2), (50, 50, 50), 1)
-            cv2.line(imagen_con_cuadrantes, (x1, y2), (x2, y1), (50, 50, 50), 1)
+            cv2.line(imagen, (x1, y1), (x2, y2), (50, 50, 50), 1)
+            cv2.line(imagen, (x1, y2), (x2, y1), (50, 50, 50), 1)
+    
+    # Dibujar el camino de propagación (AMARILLO) desde el cuadrante más frágil
+    camino = resultado['camino']
+    puntos_camino = np.column_stack(((camino['Centro X'] - origen_x) * escala_x,
+                                     (camino['Centro Y'] - origen_y) * escala_y)).round().astype(np.int32)
+    grosor_camino = max(2, round(min(ancho_dibujo, alto_dibujo) / 500))
+    cv2.polylines(imagen, [puntos_camino], False, (0, 255, 255), grosor_camino)
+    cv2.circle(imagen, tuple(puntos_camino[-1].tolist()), 3 * grosor_camino, (0, 255, 255), -1)
+    return imagen
+
+def analizar_cuadrantes(imagen, df, output_path, min_canales=MIN_CANALES, filas=FILAS_CUADRICULA,
+                        columnas=COLUMNAS_CUADRICULA, peso_tamano=PESO_TAMANO, dimensiones_originales=None,
+                        celdas_camino=CELDAS_CAMINO):
+    """
+    Divide la imagen en filas×columnas cuadrantes (6×6 por defecto) y analiza la distribución de canales.
+    Implementa el nuevo enfoque de fragilidad que considera áreas con canales grandes
+    como más propensas a fractura. El cuadrante azul es el de menor densidad entre los contiguos
+    y la línea amarilla, el camino de propagación de menor resistencia hasta el borde.
+    
+    Args:
+        imagen: Imagen reconstruida con detecciones
+        df: TablaCanales (o DataFrame) con coordenadas y áreas de canales
+        output_path: Ruta donde guardar la imagen final (None para no guardarla)
+        min_canales: Número mínimo de canales para considerar un cuadrante válido
+        filas, columnas: Dimensiones de la cuadrícula
+        peso_tamano: Peso del factor de tamaño en la puntuación de fragilidad
+        dimensiones_originales: (ancho, alto) a resolución completa si imagen es una vista
+            previa reducida; el análisis se hace siempre en coordenadas originales
+        celdas_camino: Celdas por lado de la cuadrícula del camino de propagación
+    
+    Returns:
+        imagen_con_cuadrantes: Imagen con cuadrantes marcados (ver dibujar_cuadrantes)
+        areas_por_cuadrante: Array con áreas por cuadrante
+        canales_por_cuadrante: Lista de canales agrupados por cuadrante
+        cuad_baja_densidad_idx: Índice del cuadrante contiguo con menor densidad
+        puntuacion_fragilidad: Puntuaciones calculadas para cada cuadrante
+        densidad_por_cuadrante: Densidades calculadas para cada cuadrante
+    
+    Raises:
+        ValueError: Si la cuadrícula no cabe en la imagen (ver validar_cuadricula)
+    """
+    # Obtener dimensiones originales de la imagen
+    height, width = imagen.shape[:2]
+    if dimensiones_originales is not None:
+        width, height = dimensiones_originales
+    validar_cuadricula(width, height, filas, columnas)
     
-    # Guardar imagen final
-    cv2.imwrite(output_path, imagen_con_cuadrantes)
+    # Puntuación a partir de los agregados por cuadrante (se calculan una vez por tabla de
+    # detecciones y cuadrícula; al cambiar min_canales o peso_tamano solo se repite la puntuación)
+    resultado = puntuar_cuadrantes(preparar_canales(df), width, height, filas, columnas,
+                                   min_canales, peso_tamano, celdas_camino)
+    
+    # Imagen para visualización (única copia completa; los sombreados se hacen en el sitio)
+    # con la cuadrícula a la escala de la imagen de dibujo (1 salvo en vista previa)
+    imagen_con_cuadrantes = imagen.copy()
+    alto_dibujo, ancho_dibujo = imagen.shape[:2]
+    dibujar_cuadrantes(imagen_con_cuadrantes, resultado, width, height, filas, columnas, min_canales,
+                       escala=(ancho_dibujo / width, alto_dibujo / height))
+    
+    # Guardar imagen final (la pirámide de mosaicos se genera aparte, solo cuando se pide)
+    if output_path:
+        cv2.imwrite(output_path, imagen_con_cuadrantes)
     
     # Retornar datos
-    return imagen_con_cuadrantes, areas_por_cuadrante, canales_por_cuadrante, cuad_baja_densidad_idx, puntuacion_fragilidad, densidad_por_cuadrante
+    return (imagen_con_cuadrantes, resultado['areas_totales'], resultado['canales_por_cuadrante'],
+            resultado['cuad_baja_densidad_idx'], resultado['puntuacion'], resultado['densidad'])
 
-def visualizar_resultados_cuadrantes(root, imagen_path, areas_por_cuadrante, canales_por_cuadrante, 
-                                    cuad_baja_densidad_idx=None, puntuacion_fragilidad=None, 
-                                    densidad_por_cuadrante=None, min_canales=6):
+def agregados_multirresolucion(canales, ancho, alto, tamanos):
+    """
+    Número de canales, área total y canal más grande por cuadrante para cada cuadrícula n×n.
+    
+    El número de canales y el área total de todas las resoluciones se obtienen de una
+    única tabla de sumas acumuladas (summed-area table) sobre una rejilla comprimida cuyas
+    líneas son la unión de los bordes de todas las cuadrículas: cada resolución solo
+    necesita leer las esquinas de sus cuadrantes en la tabla. El canal más grande, que no
+    se puede acumular, se calcula una vez por celda de la rejilla comprimida y cada
+    resolución lo reduce por bloques con np.maximum.reduceat. El resultado se guarda en
+    la TablaCanales.
+    
+    Returns:
+        Lista de tuplas (n, num_canales, areas_totales, area_maxima), una por tamaño
+    """
+    def calcular():
+        xs, ys, areas = canales.xs, canales.ys, canales.areas
+        
+        # Rejilla comprimida: bordes interiores de todas las cuadrículas
+        bordes_x = np.unique(np.concatenate([np.arange(1, n) * (ancho // n) for n in tamanos]))
+        bordes_y = np.unique(np.concatenate([np.arange(1, n) * (alto // n) for n in tamanos]))
+        forma = (len(bordes_y) + 1, len(bordes_x) + 1)
+        # Las coordenadas son enteras: la celda de cada fila y columna de píxeles se busca
+        # una vez y los canales solo la consultan (los que caen fuera, en la celda del borde)
+        celda_y = np.searchsorted(bordes_y, np.arange(alto + 1), side='right')
+        celda_x = np.searchsorted(bordes_x, np.arange(ancho + 1), side='right')
+        celda_de_canal = celda_y[np.clip(ys, 0, alto)] * forma[1] + celda_x[np.clip(xs, 0, ancho)]
+        
+        def tabla_acumulada(pesos):
+            """Tabla de sumas acumuladas, con una fila y una columna de ceros al inicio."""
+            histograma = np.bincount(celda_de_canal, weights=pesos, minlength=forma[0] * forma[1])
+            tabla = np.zeros((forma[0] + 1, forma[1] + 1))
+            tabla[1:, 1:] = histograma.reshape(forma).cumsum(axis=0).cumsum(axis=1)
+            return tabla
+        
+        tabla_canales = tabla_acumulada(None)
+        tabla_areas = tabla_acumulada(areas)
+        
+        # Canal más grande por celda de la rejilla comprimida (una sola pasada por los canales)
+        maximo_por_celda = np.zeros(forma[0] * forma[1])
+        np.maximum.at(maximo_por_celda, celda_de_canal, areas)
+        maximo_por_celda = maximo_por_celda.reshape(forma)
+        
+        agregados = []
+        for n in tamanos:
+            cuad_width = ancho // n
+            cuad_height = alto // n
+            
+            # Posición de los bordes de la cuadrícula n×n en la rejilla comprimida
+            limites_x = np.concatenate(([0], np.searchsorted(bordes_x, np.arange(1, n) * cuad_width, side='right'),
+                                        [forma[1]]))
+            limites_y = np.concatenate(([0], np.searchsorted(bordes_y, np.arange(1, n) * cuad_height, side='right'),
+                                        [forma[0]]))
+            
+            def suma_por_cuadrante(tabla):
+                esquinas = tabla[np.ix_(limites_y, limites_x)]
+                return np.diff(np.diff(esquinas, axis=0), axis=1).ravel()
+            
+            num_canales = np.rint(suma_por_cuadrante(tabla_canales)).astype(np.int64)
+            areas_totales = suma_por_cuadrante(tabla_areas)
+            
+            # Máximo de las celdas de cada cuadrante (los límites son estrictamente crecientes);
+            # primero por columnas, que es el eje contiguo y deja la matriz en filas×n
+            area_maxima = np.maximum.reduceat(
+                np.maximum.reduceat(maximo_por_celda, limites_x[:-1], axis=1), limites_y[:-1], axis=0
+            ).ravel()
+            agregados.append((n, num_canales, areas_totales, area_maxima))
+        return agregados
+    
+    return canales.calculado(('multirresolucion', ancho, alto, tuple(tamanos)), calcular)
+
+def analisis_multirresolucion(df, ancho, alto, tamanos=TAMANOS_MULTIRRESOLUCION, min_canales=MIN_CANALES,
+                              peso_tamano=PESO_TAMANO, tamano_referencia=FILAS_CUADRICULA):
+    """
+    Repite la selección del cuadrante más frágil con cuadrículas n×n de distintos tamaños
+    para comprobar si la zona más frágil se mantiene al cambiar la resolución.
+    
+    Los agregados por cuadrante de todas las resoluciones se calculan una vez por tabla
+    de detecciones (ver agregados_multirresolucion); al cambiar min_canales o peso_tamano
+    solo se repite la puntuación.
+    
+    Args:
+        df: TablaCanales (o DataFrame) con coordenadas y áreas de canales
+        ancho, alto: Dimensiones de la imagen analizada
+        tamanos: Tamaños n de las cuadrículas n×n a evaluar
+        min_canales: Número mínimo de canales para considerar un cuadrante válido
+        peso_tamano: Peso del factor de tamaño en la puntuación de fragilidad
+        tamano_referencia: Cuadrícula con la que se compara la posición del cuadrante más frágil
+    
+    Returns:
+        DataFrame con una fila por resolución (cuadrante más frágil, su centro en píxeles,
+        contiguo de menor densidad y desplazamiento respecto a la cuadrícula de referencia)
+    """
+    tamanos = [n for n in tamanos if n <= min(ancho, alto)]
+    if not tamanos:
+        return pd.DataFrame()
+    
+    resultados = []
+    for n, num_canales, areas_totales, area_maxima in agregados_multirresolucion(
+            preparar_canales(df), ancho, alto, tamanos):
+        cuad_width = ancho // n
+        cuad_height = alto // n
+        
+        densidad = num_canales / (cuad_width * cuad_height)
+        puntuacion = puntuar_fragilidad(num_canales, areas_totales, area_maxima, min_canales, peso_tamano)
+        cuad_max_fragil_idx, cuad_baja_densidad_idx = seleccionar_cuadrantes(
+            puntuacion, num_canales, densidad, n, n, min_canales
+        )
+        fila, columna = divmod(cuad_max_fragil_idx, n)
+        
+        resultados.append({
+            'Cuadrícula': f"{n}×{n}",
+            'Tamaño': n,
+            'Cuadrante Más Frágil': cuad_max_fragil_idx + 1,
+            'Fila': fila + 1,
+            'Columna': columna + 1,
+            'Centro X': (columna + 0.5) * cuad_width,
+            'Centro Y': (fila + 0.5) * cuad_height,
+            'Puntuacion Fragilidad': puntuacion[cuad_max_fragil_idx],
+            'Cuadrante Menor Densidad': cuad_baja_densidad_idx + 1 if cuad_baja_densidad_idx is not None else None,
+            'Cuadrantes Válidos': int(np.count_nonzero(num_canales >= min_canales)),
+        })
+    
+    resultados = pd.DataFrame(resultados)
+    
+    # Estabilidad: distancia al cuadrante más frágil de la cuadrícula de referencia y si
+    # el centro de cada resolución cae dentro de ese cuadrante
+    referencia = resultados[resultados['Tamaño'] == tamano_referencia]
+    if not referencia.empty:
+        ref = referencia.iloc[0]
+        ref_width, ref_height = ancho // tamano_referencia, alto // tamano_referencia
+        resultados['Desplazamiento (pixels)'] = np.hypot(resultados['Centro X'] - ref['Centro X'],
+                                                         resultados['Centro Y'] - ref['Centro Y'])
+        resultados['Dentro Cuadrante Referencia'] = (
+            (np.abs(resultados['Centro X'] - ref['Centro X']) < ref_width / 2)
+            & (np.abs(resultados['Centro Y'] - ref['Centro Y']) < ref_height / 2)
+        )
+    
+    return resultados
+
+def tabla_resultados_cuadrantes(num_canales, areas_totales, area_maxima, densidad, puntuacion,
+                                cuad_max_fragil_idx, cuad_baja_densidad_idx, min_canales=MIN_CANALES,
+                                filas=FILAS_CUADRICULA, columnas=COLUMNAS_CUADRICULA, vecino_medio=None):
+    """
+    Construye la tabla tipada de resultados por cuadrante (una fila por cuadrante).
+    
+    Se calcula una sola vez con operaciones vectorizadas a partir de los agregados por
+    cuadrante y alimenta tanto la pestaña de datos como la exportación a Excel y la
+    tabla consolidada del procesamiento por lotes.
+    
+    Returns:
+        DataFrame con área total, número de canales, área promedio, canal más grande,
+        factor de tamaño, densidad, distancia media al vecino más cercano, puntuación de
+        fragilidad y tipo de cada cuadrante
+    """
+    num_cuadrantes = filas * columnas
+    num_canales = np.asarray(num_canales, dtype=np.int64)
+    con_canales = num_canales > 0
+    validos = num_canales >= min_canales
+    
+    area_promedio = np.zeros(num_cuadrantes)
+    np.divide(areas_totales, num_canales, out=area_promedio, where=con_canales)
+    
+    # Factor de tamaño (1 si el área promedio es 0; 0 en cuadrantes sin canales)
+    factor_tamano = np.where(con_canales, 1.0, 0.0)
+    np.divide(area_maxima, area_promedio, out=factor_tamano, where=con_canales & (area_promedio > 0))
+    
+    # Tipo de cuadrante, de menor a mayor prioridad
+    tipo = np.full(num_cuadrantes, "Normal", dtype=object)
+    tipo[cuadrantes_centrales(filas, columnas)] = "Central"
+    if cuad_baja_densidad_idx is not None:
+        tipo[cuad_baja_densidad_idx] = "Contiguo menor densidad"
+    tipo[cuad_max_fragil_idx] = "Más frágil"
+    tipo[~validos] = "Ignorado (pocos canales)"
+    
+    filas_idx, columnas_idx = np.divmod(np.arange(num_cuadrantes), columnas)
+    return pd.DataFrame({
+        'Cuadrante': np.arange(1, num_cuadrantes + 1, dtype=np.int32),
+        'Fila': (filas_idx + 1).astype(np.int32),
+        'Columna': (columnas_idx + 1).astype(np.int32),
+        'Area Total': np.asarray(areas_totales, dtype=np.float64),
+        'Num Canales': num_canales,
+        'Area Promedio': area_promedio,
+        'Canal Más Grande': np.where(con_canales, area_maxima, 0.0),
+        'Factor Tamaño': factor_tamano,
+        'Densidad': np.where(con_canales, densidad, 0.0),
+        'Vecino Medio': (np.asarray(vecino_medio, dtype=np.float64) if vecino_medio is not None
+                         else np.full(num_cuadrantes, np.nan)),
+        'Puntuacion Fragilidad': np.where(con_canales, puntuacion, 0.0),
+        'Tipo': pd.Categorical(tipo, categories=TIPOS_CUADRANTE),
+        'Válido': pd.Categorical(np.where(validos, "Sí", "No"), categories=["Sí", "No"]),
+    })
+
+def resultados_cuadrantes(df, ancho, alto, min_canales=MIN_CANALES, filas=FILAS_CUADRICULA,
+                          columnas=COLUMNAS_CUADRICULA, peso_tamano=PESO_TAMANO, celdas_camino=CELDAS_CAMINO):
+    """
+    Resultados de una muestra: tabla por cuadrante (ver tabla_resultados_cuadrantes) y
+    camino de propagación (ver camino_propagacion).
+    
+    Usa los agregados y el camino en caché de la TablaCanales, así que tras
+    analizar_cuadrantes no vuelve a clasificar los canales ni a buscar el camino.
+    
+    Args:
+        df: TablaCanales (o DataFrame) con coordenadas y áreas de canales
+        ancho, alto: Dimensiones de la imagen a resolución completa
+    
+    Returns:
+        (tabla, camino)
+    """
+    resultado = puntuar_cuadrantes(preparar_canales(df), ancho, alto, filas, columnas,
+                                   min_canales, peso_tamano, celdas_camino)
+    tabla = tabla_resultados_cuadrantes(
+        resultado['num_canales'], resultado['areas_totales'], resultado['area_maxima'],
+        resultado['densidad'], resultado['puntuacion'], resultado['cuad_max_fragil_idx'],
+        resultado['cuad_baja_densidad_idx'], min_canales, filas, columnas, resultado['vecino_medio']
+    )
+    return tabla, resultado['camino']
+
+def texto_cuadrantes(tabla, min_canales=MIN_CANALES):
+    """
+    Texto de la pestaña "Datos por Cuadrante" para las filas de la tabla indicadas.
+    
+    Se devuelve como una única cadena para insertarla en el widget de una sola vez.
+    """
+    columnas_texto = ['Cuadrante', 'Fila', 'Columna', 'Area Total', 'Num Canales', 'Area Promedio',
+                      'Canal Más Grande', 'Factor Tamaño', 'Densidad', 'Puntuacion Fragilidad', 'Tipo']
+    lineas = []
+    for cuadrante, row, col, area_total, num_canales, area_promedio, canal_max, factor_tamano, \
+            densidad, puntuacion, tipo in tabla[columnas_texto].itertuples(index=False):
+        
+        if tipo == "Ignorado (pocos canales)":
+            lineas.append(f"CUADRANTE {cuadrante} (IGNORADO - POCOS CANALES) - Fila {row}, Columna {col}\n"
+                          f"  Número de canales: {num_canales} (mínimo requerido: {min_canales})\n\n")
+            continue
+        
+        etiqueta = ETIQUETAS_TIPO.get(tipo, "")
+        lineas.append(f"CUADRANTE {cuadrante}{etiqueta} - Fila {row}, Columna {col}\n"
+                      f"  Área total: {area_total:.2f} pixels²\n"
+                      f"  Número de canales: {num_canales}\n")
+        
+        if num_canales > 0:
+            lineas.append(f"  Área promedio por canal: {area_promedio:.2f} pixels²\n"
+                          f"  Densidad: {densidad:.6f} canales/pixel²\n"
+                          f"  Área del canal más grande: {canal_max:.2f} pixels²\n"
+                          f"  Factor de tamaño: {factor_tamano:.2f}\n"
+                          f"  Puntuación de fragilidad: {puntuacion:.2f}\n")
+            
+            # Motivo de selección de los cuadrantes destacados
+            if tipo == "Más frágil":
+                lineas.append("  MOTIVO DE SELECCIÓN: Este cuadrante tiene la mayor puntuación de fragilidad\n"
+                              "  combinando el tamaño de los canales y su distribución.\n")
+            elif tipo == "Contiguo menor densidad":
+                lineas.append("  MOTIVO DE SELECCIÓN: Este cuadrante tiene la menor densidad de canales\n"
+                              "  entre los contiguos al más frágil, sugiriendo un posible camino de propagación.\n")
+        
+        lineas.append("\n")
+    return "".join(lineas)
+
+class VisorImagen:
+    """
+    Visor con zoom para las imágenes de resultados.
+    
+    La imagen base (la reconstruida con las detecciones) se lee del disco, de la vista
+    previa y la pirámide de mosaicos guardadas junto a ella con write_pyramid: la vista
+    ajustada se compone con la vista previa y al ampliar (rueda del ratón) o desplazar
+    (arrastrar) solo se leen los mosaicos visibles del nivel adecuado (ver
+    ImagePyramid.render_view). La imagen completa nunca se carga en memoria. Los
+    resultados se dibujan después sobre la vista, a la resolución de la pantalla, con la
+    función superposicion(vista, x0, y0, escala) (x0, y0: esquina de la vista en píxeles de
+    la imagen base; escala: píxeles de vista por píxel de imagen). superponer() la
+    sustituye redibujando solo la superposición: los mosaicos en caché y la última vista
+    compuesta se conservan.
+    """
+    
+    def __init__(self, parent, imagen_path, ancho_maximo=ANCHO_VISOR, alto_maximo=ALTO_MAXIMO_VISOR,
+                 superposicion=None):
+        preview_path, pyramid_dir = pyramid_paths(imagen_path)
+        self.vista_previa = cv2.imread(preview_path)
+        self.piramide = ImagePyramid(pyramid_dir)
+        self.ancho, self.alto = self.piramide.width, self.piramide.height
+        self.superposicion = superposicion
+        
+        # Última vista compuesta de la imagen base: ((centro_x, centro_y, escala), vista)
+        self.vista_base = (None, None)
+        
+        # Escala que ajusta la imagen completa al visor
+        self.escala_ajuste = min(ancho_maximo / self.ancho, alto_maximo / self.alto)
+        self.ancho_vista = max(1, round(self.ancho * self.escala_ajuste))
+        self.alto_vista = max(1, round(self.alto * self.escala_ajuste))
+        
+        self.canvas = Canvas(parent, width=self.ancho_vista, height=self.alto_vista,
+                             bg='#000000', highlightthickness=0)
+        self.imagen_canvas = self.canvas.create_image(0, 0, anchor='nw')
+        self.foto = None
+        self.arrastre = None
+        
+        self.canvas.bind('<MouseWheel>', lambda e: self.zoom(e.x, e.y, 1 if e.delta > 0 else -1))
+        self.canvas.bind('<Button-4>', lambda e: self.zoom(e.x, e.y, 1))   # Rueda en Linux
+        self.canvas.bind('<Button-5>', lambda e: self.zoom(e.x, e.y, -1))
+        self.canvas.bind('<ButtonPress-1>', self.iniciar_arrastre)
+        self.canvas.bind('<B1-Motion>', self.arrastrar)
+        self.canvas.bind('<Double-Button-1>', lambda e: self.ajustar())
+        
+        self.ajustar()
+    
+    def superponer(self, superposicion):
+        """Sustituye los resultados dibujados sobre la imagen, manteniendo el zoom y el centro."""
+        self.superposicion = superposicion
+        self.dibujar()
+    
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+    
+    def ajustar(self):
+        """Muestra la imagen completa."""
+        self.escala = self.escala_ajuste
+        self.centro_x, self.centro_y = self.ancho / 2, self.alto / 2
+        self.dibujar()
+    
+    def zoom(self, x, y, pasos):
+        """Amplía (pasos > 0) o reduce manteniendo fijo el punto de la imagen bajo el cursor."""
+        escala = min(max(self.escala * 1.25 ** pasos, self.escala_ajuste), max(ZOOM_MAXIMO, self.escala_ajuste))
+        punto_x = self.centro_x + (x - self.ancho_vista / 2) / self.escala
+        punto_y = self.centro_y + (y - self.alto_vista / 2) / self.escala
+        self.centro_x = punto_x - (x - self.ancho_vista / 2) / escala
+        self.centro_y = punto_y - (y - self.alto_vista / 2) / escala
+        self.escala = escala
+        self.dibujar()
+    
+    def iniciar_arrastre(self, event):
+        self.arrastre = (event.x, event.y)
+    
+    def arrastrar(self, event):
+        if self.arrastre is None:
+            return
+        self.centro_x -= (event.x - self.arrastre[0]) / self.escala
+        self.centro_y -= (event.y - self.arrastre[1]) / self.escala
+        self.arrastre = (event.x, event.y)
+        self.dibujar()
+    
+    def componer(self):
+        """Vista actual de la imagen base en BGR; se reutiliza si el zoom y el centro no han cambiado."""
+        # Mantener el centro dentro de la imagen
+        self.centro_x = min(max(self.centro_x, 0), self.ancho)
+        self.centro_y = min(max(self.centro_y, 0), self.alto)
+        clave = (self.centro_x, self.centro_y, self.escala)
+        if self.vista_base[0] == clave:
+            return self.vista_base[1]
+        
+        # Mientras la vista previa tenga resolución suficiente se compone con ella; al
+        # ampliar más se leen los mosaicos del nivel adecuado de la pirámide
+        escala_previa = self.vista_previa.shape[1] / self.ancho
+        if self.escala <= escala_previa:
+            def leer_previa(start_x, start_y, end_x, end_y):
+                return self.vista_previa[max(0, start_y):max(0, end_y), max(0, start_x):max(0, end_x)]
+            
+            vista = compose_view(leer_previa, escala_previa, self.centro_x, self.centro_y, self.escala,
+                                 self.ancho_vista, self.alto_vista)
+        else:
+            vista = self.piramide.render_view(self.centro_x, self.centro_y, self.escala,
+                                              self.ancho_vista, self.alto_vista)
+        self.vista_base = (clave, vista)
+        return vista
+    
+    def dibujar(self):
+        vista = self.componer().copy()
+        if self.superposicion is not None:
+            self.superposicion(vista, self.centro_x - self.ancho_vista / (2 * self.escala),
+                               self.centro_y - self.alto_vista / (2 * self.escala), self.escala)
+        vista = cv2.cvtColor(vista, cv2.COLOR_BGR2RGB)
+        self.foto = ImageTk.PhotoImage(Image.fromarray(vista))
+        self.canvas.itemconfig(self.imagen_canvas, image=self.foto)
+
+def visualizar_resultados_cuadrantes(root, imagen_path, tabla, min_canales=MIN_CANALES,
+                                    filas=FILAS_CUADRICULA, columnas=COLUMNAS_CUADRICULA,
+                                    multirresolucion=None, peso_tamano=PESO_TAMANO, recalcular=None,
+                                    camino=None, superposicion=None, exportar_imagen=None):
     """
     Muestra los resultados del análisis por cuadrantes en una interfaz gráfica.
     
+    La ventana se construye una sola vez; al volver a puntuar con otros parámetros se
+    llama a la función devuelta, que sustituye los resultados dibujados en el visor, la
+    leyenda, el texto de la pestaña de datos y los datos que se exportan, sin reconstruir
+    los controles ni la imagen base del visor. Nada se escribe en disco hasta que se
+    guarda o exporta.
+    
     Args:
         root: Ventana raíz de Tkinter
-        imagen_path: Ruta a la imagen con cuadrantes analizados
-        areas_por_cuadrante: Array con áreas por cuadrante
-        canales_por_cuadrante: Lista de canales agrupados por cuadrante
-        cuad_baja_densidad_idx: Índice del cuadrante contiguo con menor densidad
-        puntuacion_fragilidad: Array con puntuaciones de fragilidad por cuadrante
-        densidad_por_cuadrante: Array con densidades por cuadrante
+        imagen_path: Imagen base del visor (la reconstruida con las detecciones), guardada
+            junto a su vista previa y su pirámide de mosaicos (ver write_pyramid)
+        tabla: Tabla de resultados por cuadrante (ver tabla_resultados_cuadrantes); se usa
+            tanto para la pestaña de datos como para la exportación a Excel
         min_canales: Número mínimo de canales para considerar un cuadrante válido
+        filas, columnas: Dimensiones de la cuadrícula analizada
+        multirresolucion: Resultados de analisis_multirresolucion (opcional)
+        peso_tamano: Peso del factor de tamaño usado en la puntuación
+        recalcular: Función (min_canales, peso_tamano) que vuelve a puntuar y actualizar los
+            resultados; si se indica, se muestran controles deslizantes para ambos parámetros
+        camino: Camino de propagación de camino_propagacion (opcional)
+        superposicion: Función que dibuja los resultados sobre la vista del visor
+            (ver VisorImagen)
+        exportar_imagen: Función (destino, min_canales, peso_tamano) que guarda la imagen
+            de cuadrantes; si se indica, se muestra el botón "Guardar Imagen"
+    
+    Returns:
+        Función actualizar(tabla, min_canales, peso_tamano, multirresolucion, camino, superposicion)
+        que muestra los resultados de una nueva puntuación en la misma ventana
     """
     for widget in root.winfo_children():
         widget.destroy()
     
     configure_window(root, "Análisis por Cuadrantes")
     
+    # Resultados mostrados y exportados; actualizar() los sustituye
+    estado = {
+        'tabla': tabla,
+        'min_canales': min_canales,
+        'peso_tamano': peso_tamano,
+        'multirresolucion': multirresolucion,
+        'camino': camino,
+    }
+    
     # Crear pestañas
     notebook = ttk.Notebook(root)
     notebook.pack(fill='both', expand=True)
@@ -405,85 +1224,126 @@ def visualizar_resultados_cuadrantes(root, imagen_path, areas_por_cuadrante, can
     notebook.add(frame1, text="Visualización")
     notebook.add(frame2, text="Datos por Cuadrante")
     
-    # Mostrar imagen
-    try:
-        img = Image.open(imagen_path)
-        
-        # Calcular dimensiones para mantener relación de aspecto
-        display_width = 800
-        display_height = int(display_width * img.height / img.width)
-        
-        img = img.resize((display_width, display_height), Image.LANCZOS)
-        img_tk = ImageTk.PhotoImage(img)
-        
-        img_label = Label(frame1, image=img_tk, bg='#000000')
-        img_label.image = img_tk
-        img_label.pack(pady=20)
-        
-        # Guardar referencias a nivel global para el cálculo de área
-        global img_width, img_height
-        img_width, img_height = img.size
-        
-        # Botón para guardar imagen
-        def guardar_imagen():
-            destino = filedialog.asksaveasfilename(
-                defaultextension=".png",
-                filetypes=[("PNG files", "*.png")],
-                initialfile="analisis_cuadrantes.png")
-            if destino:
-                import shutil
-                shutil.copy(imagen_path, destino)
-                messagebox.showinfo("Éxito", f"Imagen guardada en {destino}")
-                
+    # Visor con zoom; los resultados se dibujan sobre la vista
+    visor = VisorImagen(frame1, imagen_path, superposicion=superposicion)
+    visor.pack(pady=20)
+    
+    ayuda_label = Label(frame1, text="Rueda del ratón: ampliar · Arrastrar: desplazar · Doble clic: ajustar",
+                        fg="#AAAAAA", bg='#000000')
+    ayuda_label.pack()
+    
+    # Botón para guardar la imagen de cuadrantes con los parámetros actuales; es el único
+    # momento en que se dibuja completa y se escribe en disco
+    def guardar_imagen():
+        destino = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png")],
+            initialfile="analisis_cuadrantes.png")
+        if destino:
+            exportar_imagen(destino, estado['min_canales'], estado['peso_tamano'])
+            messagebox.showinfo("Éxito", f"Imagen guardada en {destino}")
+    
+    if exportar_imagen is not None:
         save_button = Button(frame1, text="Guardar Imagen", command=guardar_imagen)
         configure_button(save_button)
         save_button.pack(pady=10)
+    
+    # Añadir leyenda
+    leyenda_frame = Frame(frame1, bg='#000000')
+    leyenda_frame.pack(pady=10)
+    
+    # Leyenda para el cuadrante más frágil
+    mayor_frame = Frame(leyenda_frame, bg='#000000')
+    mayor_frame.pack(side='left', padx=15)
+    
+    mayor_color = Frame(mayor_frame, bg='#FF0000', width=20, height=20)
+    mayor_color.pack(side='left', padx=5)
+    
+    mayor_label = Label(mayor_frame, text="Cuadrante más frágil", fg="white", bg='#000000')
+    mayor_label.pack(side='left')
+    
+    # Leyenda para el cuadrante contiguo de MENOR DENSIDAD
+    menor_frame = Frame(leyenda_frame, bg='#000000')
+    menor_frame.pack(side='left', padx=15)
+    
+    menor_color = Frame(menor_frame, bg='#0000FF', width=20, height=20)
+    menor_color.pack(side='left', padx=5)
+    
+    menor_label = Label(menor_frame, text="Menor densidad", fg="white", bg='#000000')
+    menor_label.pack(side='left')
+    
+    # Leyenda para los cuadrantes centrales
+    central_frame = Frame(leyenda_frame, bg='#000000')
+    central_frame.pack(side='left', padx=15)
+    
+    central_color = Frame(central_frame, bg='#808080', width=20, height=20)
+    central_color.pack(side='left', padx=5)
+    
+    central_label = Label(central_frame, text="Centrales", fg="white", bg='#000000')
+    central_label.pack(side='left')
+    
+    # Leyenda para el camino de propagación
+    camino_frame = Frame(leyenda_frame, bg='#000000')
+    camino_frame.pack(side='left', padx=15)
+    
+    camino_color = Frame(camino_frame, bg='#FFFF00', width=20, height=4)
+    camino_color.pack(side='left', padx=5)
+    
+    camino_label = Label(camino_frame, text="Camino de propagación", fg="white", bg='#000000')
+    camino_label.pack(side='left')
+    
+    # Leyenda para cuadrantes no válidos (menos de min_canales)
+    invalid_frame = Frame(leyenda_frame, bg='#000000')
+    invalid_frame.pack(side='left', padx=15)
+    
+    invalid_label = Label(invalid_frame, text=f"X = < {min_canales} canales", fg="#666666", bg='#000000')
+    invalid_label.pack(side='left')
+    
+    # Controles para volver a puntuar con otros parámetros; los agregados por cuadrante
+    # están en caché, así que solo se repiten la puntuación y el dibujo sobre la vista
+    if recalcular is not None:
+        controles_frame = Frame(frame1, bg='#000000')
+        controles_frame.pack(pady=10)
         
-        # Añadir leyenda
-        leyenda_frame = Frame(frame1, bg='#000000')
-        leyenda_frame.pack(pady=10)
-        
-        # Leyenda para el cuadrante más frágil
-        mayor_frame = Frame(leyenda_frame, bg='#000000')
-        mayor_frame.pack(side='left', padx=15)
-        
-        mayor_color = Frame(mayor_frame, bg='#FF0000', width=20, height=20)
-        mayor_color.pack(side='left', padx=5)
-        
-        mayor_label = Label(mayor_frame, text="Cuadrante más frágil", fg="white", bg='#000000')
-        mayor_label.pack(side='left')
-        
-        # Leyenda para el cuadrante contiguo de MENOR DENSIDAD
-        menor_frame = Frame(leyenda_frame, bg='#000000')
-        menor_frame.pack(side='left', padx=15)
-        
-        menor_color = Frame(menor_frame, bg='#0000FF', width=20, height=20)
-        menor_color.pack(side='left', padx=5)
-        
-        menor_label = Label(menor_frame, text="Menor densidad", fg="white", bg='#000000')
-        menor_label.pack(side='left')
-        
-        # Leyenda para los cuadrantes centrales
-        central_frame = Frame(leyenda_frame, bg='#000000')
-        central_frame.pack(side='left', padx=15)
-        
-        central_color = Frame(central_frame, bg='#808080', width=20, height=20)
-        central_color.pack(side='left', padx=5)
-        
-        central_label = Label(central_frame, text="Centrales", fg="white", bg='#000000')
-        central_label.pack(side='left')
-        
-        # Leyenda para cuadrantes no válidos (menos de min_canales)
-        invalid_frame = Frame(leyenda_frame, bg='#000000')
-        invalid_frame.pack(side='left', padx=15)
+        min_canales_var = IntVar(value=min_canales)
+        peso_var = DoubleVar(value=peso_tamano)
         
-        invalid_label = Label(invalid_frame, text=f"X = < {min_canales} canales", fg="#666666", bg='#000000')
-        invalid_label.pack(side='left')
+        def aplicar_parametros(event=None):
+            if (min_canales_var.get(), peso_var.get()) != (estado['min_canales'], estado['peso_tamano']):
+                recalcular(min_canales_var.get(), peso_var.get())
         
-    except Exception as e:
-        error_label = Label(frame1, text=f"Error al cargar la imagen: {e}", 
-                           fg="white", bg='#000000')
-        error_label.pack(pady=20)
+        escalas = [
+            Scale(controles_frame, label="Mínimo de canales", variable=min_canales_var,
+                  from_=1, to=50, resolution=1),
+            Scale(controles_frame, label="Peso del factor de tamaño", variable=peso_var,
+                  from_=0, to=2, resolution=0.05),
+        ]
+        for escala in escalas:
+            escala.config(orient='horizontal', length=250, fg="white", bg='#000000',
+                          highlightthickness=0)
+            escala.pack(side='left', padx=15)
+            # Recalcular al soltar el control (no en cada paso del arrastre)
+            escala.bind('<ButtonRelease-1>', aplicar_parametros)
+            escala.bind('<KeyRelease>', aplicar_parametros)
+    
+    # Controles de paginación (solo visibles en cuadrículas mayores de 6×6)
+    num_paginas = max(1, -(-len(tabla) // CUADRANTES_POR_PAGINA))
+    pagina = IntVar(value=0)
+    
+    paginacion_frame = Frame(frame2, bg='#000000')
+    if num_paginas > 1:
+        paginacion_frame.pack(side='top', pady=5)
+    
+    anterior_button = Button(paginacion_frame, text="Anterior", command=lambda: mostrar_pagina(pagina.get() - 1))
+    configure_button(anterior_button)
+    anterior_button.pack(side='left', padx=10)
+    
+    pagina_label = Label(paginacion_frame, fg="white", bg='#000000')
+    pagina_label.pack(side='left', padx=10)
+    
+    siguiente_button = Button(paginacion_frame, text="Siguiente", command=lambda: mostrar_pagina(pagina.get() + 1))
+    configure_button(siguiente_button)
+    siguiente_button.pack(side='left', padx=10)
     
     # Crear un contenedor para el texto y la scrollbar
     text_container = Frame(frame2, bg='#000000')
@@ -499,89 +1359,43 @@ def visualizar_resultados_cuadrantes(root, imagen_path, areas_por_cuadrante, can
     text_area.pack(side='left', fill='both', expand=True)
     text_area.config(yscrollcommand=scrollbar.set)
     
-    text_area.insert('1.0', "ANÁLISIS POR CUADRANTES (MATRIZ 6×6)\n\n")
-    text_area.insert('end', "PUNTUACIÓN DE FRAGILIDAD: Área promedio × log(N° canales) × (1 + Factor tamaño)\n")
-    text_area.insert('end', "PROPAGACIÓN DE FRACTURA: Hacia el cuadrante contiguo con menor densidad de canales\n")
-    text_area.insert('end', f"Se ignoran cuadrantes con menos de {min_canales} canales\n\n")
-    
-    # Encontrar cuadrante con mayor puntuación de fragilidad
-    cuadrantes_centrales = [2*6 + 2, 2*6 + 3, 3*6 + 2, 3*6 + 3]
-    
-    # Crear copia de la puntuación excluyendo centrales y cuadrantes con pocos canales
-    if puntuacion_fragilidad is not None:
-        puntuacion_mascara = puntuacion_fragilidad.copy()
-        for i in range(36):
-            if i in cuadrantes_centrales or len(canales_por_cuadrante[i]) < min_canales:
-                puntuacion_mascara[i] = -1
-        cuad_max_fragil_idx = np.argmax(puntuacion_mascara)
-    else:
-        # Fallback por si no tenemos puntuación de fragilidad
-        cuad_max_fragil_idx = np.argmax(areas_por_cuadrante)
-    
-    # Mostrar información por cuadrante
-    for i in range(36):
-        row = i // 6
-        col = i % 6
-        
-        # Verificar si es un cuadrante central
-        is_central = i in cuadrantes_centrales
-        
-        # Verificar si tiene suficientes canales
-        has_min_canales = len(canales_por_cuadrante[i]) >= min_canales
-        
-        # Determinar tipo de cuadrante
-        if not has_min_canales:
-            text_area.insert('end', f"CUADRANTE {i+1} (IGNORADO - POCOS CANALES) - Fila {row+1}, Columna {col+1}\n")
-            text_area.insert('end', f"  Número de canales: {len(canales_por_cuadrante[i])} (mínimo requerido: {min_canales})\n\n")
-            continue
+    def cabecera():
+        """Cabecera de la pestaña de datos para los resultados actuales."""
+        min_canales, peso_tamano = estado['min_canales'], estado['peso_tamano']
+        multirresolucion, camino = estado['multirresolucion'], estado['camino']
+        texto = (f"ANÁLISIS POR CUADRANTES (MATRIZ {filas}×{columnas})\n\n"
+                 "PUNTUACIÓN DE FRAGILIDAD: Área promedio × log(N° canales) × (1 + Factor tamaño)\n"
+                 "PROPAGACIÓN DE FRACTURA: Hacia el cuadrante contiguo con menor densidad de canales\n"
+                 "En la imagen, V = distancia media al vecino más cercano dentro del cuadrante (píxeles)\n"
+                 f"Peso del factor de tamaño: {peso_tamano:g}\n"
+                 f"Se ignoran cuadrantes con menos de {min_canales} canales\n\n")
         
-        if i == cuad_max_fragil_idx:
-            text_area.insert('end', f"CUADRANTE {i+1} (MÁS FRÁGIL) - Fila {row+1}, Columna {col+1}\n")
-        elif i == cuad_baja_densidad_idx:
-            text_area.insert('end', f"CUADRANTE {i+1} (MENOR DENSIDAD CONTIGUO) - Fila {row+1}, Columna {col+1}\n")
-        elif is_central:
-            text_area.insert('end', f"CUADRANTE {i+1} (CENTRAL) - Fila {row+1}, Columna {col+1}\n")
-        else:
-            text_area.insert('end', f"CUADRANTE {i+1} - Fila {row+1}, Columna {col+1}\n")
-            
-        text_area.insert('end', f"  Área total: {areas_por_cuadrante[i]:.2f} pixels²\n")
-        text_area.insert('end', f"  Número de canales: {len(canales_por_cuadrante[i])}\n")
-        
-        # Mostrar métricas adicionales
-        num_canales = len(canales_por_cuadrante[i])
-        if num_canales > 0:
-            # Mostrar área promedio
-            area_promedio = areas_por_cuadrante[i] / num_canales
-            text_area.insert('end', f"  Área promedio por canal: {area_promedio:.2f} pixels²\n")
-            
-            # Mostrar densidad
-            if densidad_por_cuadrante is not None:
-                text_area.insert('end', f"  Densidad: {densidad_por_cuadrante[i]:.6f} canales/pixel²\n")
-            
-            # Calcular el canal más grande
-            areas_canales = [canal[2] for canal in canales_por_cuadrante[i]]
-            canal_max = max(areas_canales) if areas_canales else 0
-            text_area.insert('end', f"  Área del canal más grande: {canal_max:.2f} pixels²\n")
-            
-            # Factor de tamaño
-            factor_tamaño = canal_max / area_promedio if area_promedio > 0 else 1
-            text_area.insert('end', f"  Factor de tamaño: {factor_tamaño:.2f}\n")
-            
-            # Mostrar la puntuación de fragilidad si está disponible
-            if puntuacion_fragilidad is not None:
-                text_area.insert('end', f"  Puntuación de fragilidad: {puntuacion_fragilidad[i]:.2f}\n")
-                
-                # Si es el cuadrante más frágil, mostrar por qué fue seleccionado
-                if i == cuad_max_fragil_idx:
-                    text_area.insert('end', f"  MOTIVO DE SELECCIÓN: Este cuadrante tiene la mayor puntuación de fragilidad\n")
-                    text_area.insert('end', f"  combinando el tamaño de los canales y su distribución.\n")
-                    
-                # Si es el cuadrante de menor densidad, explicar motivo
-                elif i == cuad_baja_densidad_idx:
-                    text_area.insert('end', f"  MOTIVO DE SELECCIÓN: Este cuadrante tiene la menor densidad de canales\n")
-                    text_area.insert('end', f"  entre los contiguos al más frágil, sugiriendo un posible camino de propagación.\n")
+        # Resumen de estabilidad entre resoluciones
+        if multirresolucion is not None and 'Dentro Cuadrante Referencia' in multirresolucion:
+            estables = int(multirresolucion['Dentro Cuadrante Referencia'].sum())
+            texto += (f"MULTIRRESOLUCIÓN: en {estables} de {len(multirresolucion)} cuadrículas "
+                      f"({multirresolucion['Cuadrícula'].iloc[0]} a {multirresolucion['Cuadrícula'].iloc[-1]}) "
+                      f"el cuadrante más frágil cae dentro del de la matriz {filas}×{columnas}\n\n")
         
-        text_area.insert('end', "\n")
+        # Resumen del camino de propagación
+        if camino is not None and not camino.empty:
+            texto += (f"CAMINO DE PROPAGACIÓN: desde el cuadrante {camino['Cuadrante'].iloc[0]} hasta el "
+                      f"cuadrante {camino['Cuadrante'].iloc[-1]}, {len(camino)} celdas, "
+                      f"{longitud_camino(camino):.0f} píxeles (coste {camino['Coste Acumulado'].iloc[-1]:.2f})\n\n")
+        return texto
+    
+    def mostrar_pagina(nueva_pagina):
+        """Escribe la cabecera y los cuadrantes de una página con una sola inserción."""
+        nueva_pagina = min(max(nueva_pagina, 0), num_paginas - 1)
+        pagina.set(nueva_pagina)
+        inicio = nueva_pagina * CUADRANTES_POR_PAGINA
+        texto = texto_cuadrantes(estado['tabla'].iloc[inicio:inicio + CUADRANTES_POR_PAGINA],
+                                 estado['min_canales'])
+        text_area.delete('1.0', 'end')
+        text_area.insert('1.0', cabecera() + texto)
+        pagina_label.config(text=f"Página {nueva_pagina + 1} de {num_paginas}")
+    
+    mostrar_pagina(0)
     
     # Botón para exportar resultados a Excel
     def exportar_excel():
@@ -591,85 +1405,7 @@ def visualizar_resultados_cuadrantes(root, imagen_path, areas_por_cuadrante, can
             initialfile="resultados_fragilidad_cuadrantes.xlsx")
         
         if destino:
-            # Crear DataFrame con resultados
-            data = []
-            
-            # Usar las dimensiones de la imagen que tenemos en la UI
-            area_cuadrante = (img_height // 6) * (img_width // 6)
-            
-            for i in range(36):
-                row = i // 6
-                col = i % 6
-                
-                # Calcular métricas
-                num_canales = len(canales_por_cuadrante[i])
-                area_total = areas_por_cuadrante[i]
-                
-                # Determinar tipo de cuadrante
-                is_central = i in [2*6 + 2, 2*6 + 3, 3*6 + 2, 3*6 + 3]
-                has_min_canales = num_canales >= min_canales
-                
-                if num_canales > 0:
-                    area_promedio = area_total / num_canales
-                    
-                    # Calcular área del canal más grande
-                    areas_canales = [canal[2] for canal in canales_por_cuadrante[i]]
-                    canal_max = max(areas_canales) if areas_canales else 0
-                    
-                    # Factor de tamaño
-                    factor_tamaño = canal_max / area_promedio if area_promedio > 0 else 1
-                    
-                    # Usar valores calculados o los proporcionados
-                    if densidad_por_cuadrante is not None and i < len(densidad_por_cuadrante):
-                        densidad = densidad_por_cuadrante[i]
-                    else:
-                        densidad = num_canales / area_cuadrante
-                    
-                    if puntuacion_fragilidad is not None and i < len(puntuacion_fragilidad):
-                        fragilidad = puntuacion_fragilidad[i]
-                    else:
-                        # Solo calcular si tiene suficientes canales
-                        if has_min_canales:
-                            factor_num_canales = np.log10(1 + num_canales)
-                            fragilidad = area_promedio * factor_num_canales * (1 + 0.5 * (factor_tamaño - 1))
-                        else:
-                            fragilidad = 0
-                else:
-                    area_promedio = 0
-                    canal_max = 0
-                    factor_tamaño = 0
-                    densidad = 0
-                    fragilidad = 0
-                
-                # Determinar estado del cuadrante
-                if not has_min_canales:
-                    tipo = "Ignorado (pocos canales)"
-                elif i == cuad_max_fragil_idx:
-                    tipo = "Más frágil"
-                elif i == cuad_baja_densidad_idx:
-                    tipo = "Contiguo menor densidad"
-                elif is_central:
-                    tipo = "Central"
-                else:
-                    tipo = "Normal"
-                
-                data.append({
-                    'Cuadrante': i+1,
-                    'Fila': row+1,
-                    'Columna': col+1,
-                    'Area Total': area_total,
-                    'Num Canales': num_canales,
-                    'Area Promedio': area_promedio,
-                    'Canal Más Grande': canal_max,
-                    'Factor Tamaño': factor_tamaño,
-                    'Densidad': densidad,
-                    'Puntuacion Fragilidad': fragilidad,
-                    'Tipo': tipo,
-                    'Válido': "Sí" if has_min_canales else "No"
-                })
-                
-            df = pd.DataFrame(data)
-            df.to_excel(destino, index=False)
+            estado['tabla'].to_excel(destino, index=False)
             messagebox.showinfo("Éxito", f"Datos exportados a {destino}")
     
     # Botón de exportación
@@ -679,27 +1415,337 @@ def visualizar_resultados_cuadrantes(root, imagen_path, areas_por_cuadrante, can
     export_button = Button(export_frame, text="Exportar a Excel", command=exportar_excel)
     configure_button(export_button)
     export_button.pack(pady=10)
+    
+    # Botón para exportar el análisis multirresolución
+    def exportar_multirresolucion():
+        destino = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")],
+            initialfile="fragilidad_multirresolucion.xlsx")
+        
+        if destino:
+            estado['multirresolucion'].to_excel(destino, index=False)
+            messagebox.showinfo("Éxito", f"Datos exportados a {destino}")
+    
+    if multirresolucion is not None and not multirresolucion.empty:
+        multi_button = Button(export_frame, text="Exportar multirresolución", command=exportar_multirresolucion)
+        configure_button(multi_button)
+        multi_button.pack(pady=10)
+    
+    # Botón para exportar el camino de propagación
+    def exportar_camino():
+        destino = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")],
+            initialfile="camino_propagacion.xlsx")
+        
+        if destino:
+            estado['camino'].to_excel(destino, index=False)
+            messagebox.showinfo("Éxito", f"Datos exportados a {destino}")
+    
+    if camino is not None and not camino.empty:
+        camino_button = Button(export_frame, text="Exportar camino de propagación", command=exportar_camino)
+        configure_button(camino_button)
+        camino_button.pack(pady=10)
+    
+    def actualizar(tabla, min_canales, peso_tamano, multirresolucion=None, camino=None, superposicion=None):
+        """Muestra en la misma ventana los resultados de una nueva puntuación."""
+        estado.update(tabla=tabla, min_canales=min_canales, peso_tamano=peso_tamano,
+                      multirresolucion=multirresolucion, camino=camino)
+        visor.superponer(superposicion)
+        invalid_label.config(text=f"X = < {min_canales} canales")
+        mostrar_pagina(pagina.get())
+    
+    return actualizar
+
+def carpeta_muestra(output_root, imagen_path, usados):
+    """Carpeta de salida propia para cada muestra, derivada del nombre de la imagen."""
+    nombre = os.path.splitext(os.path.basename(imagen_path))[0]
+    candidato = nombre
+    sufijo = 2
+    while candidato in usados:
+        candidato = f"{nombre}_{sufijo}"
+        sufijo += 1
+    usados.add(candidato)
+    return os.path.join(output_root, candidato)
+
+def leer_pares(manifest_path):
+    """
+    Lee el manifiesto de pares (imagen, detecciones) del procesamiento por lotes.
+    
+    Es un CSV con las columnas 'slide' y 'detections_path', por lo que se puede usar
+    directamente el manifest.csv del comando detect de detection_app (las filas con
+    status distinto de 'ok' se omiten). Las rutas relativas que no existen desde el
+    directorio actual se buscan junto al manifiesto.
+    """
+    pares = pd.read_csv(manifest_path)
+    faltan = {COLUMNA_IMAGEN, COLUMNA_DETECCIONES} - set(pares.columns)
+    if faltan:
+        raise ValueError(f"Faltan columnas en {manifest_path}: {', '.join(sorted(faltan))}")
+    
+    if 'status' in pares.columns:
+        pares = pares[pares['status'] == 'ok']
+    pares = pares.dropna(subset=[COLUMNA_IMAGEN, COLUMNA_DETECCIONES])
+    
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    
+    def resolver(path):
+        path = str(path)
+        if os.path.isabs(path) or os.path.exists(path):
+            return path
+        return os.path.join(base, path)
+    
+    return [(resolver(imagen), resolver(detecciones))
+            for imagen, detecciones in zip(pares[COLUMNA_IMAGEN], pares[COLUMNA_DETECCIONES])]
+
+def init_worker(hilos):
+    """Inicializa un proceso trabajador limitando los hilos de OpenCV."""
+    cv2.setNumThreads(max(1, int(hilos)))
+
+def analizar_muestra(imagen_path, detecciones_path, output_dir, opciones):
+    """
+    Reconstruye, analiza y exporta una muestra; devuelve su fila del resumen y su tabla.
+    
+    Nunca lanza excepciones: un fallo queda registrado en la fila con status 'error',
+    de modo que una muestra defectuosa no interrumpe el lote.
+    
+    Returns:
+        (fila, tabla): resumen de la muestra y tabla de resultados por cuadrante
+        (None si el análisis falló)
+    """
+    start_time = time.perf_counter()
+    fila = {
+        'slide': imagen_path,
+        'detections_path': detecciones_path,
+        'output_dir': output_dir,
+        'status': 'error',
+        'count': 0,
+        'fragile_quadrant': None,
+        'fragility_score': None,
+        'low_density_quadrant': None,
+        'valid_quadrants': None,
+        'stable_grids': None,
+        'path_end_quadrant': None,
+        'path_length': None,
+        'error': None,
+    }
+    tabla = None
+    
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        filas = opciones['filas']
+        columnas = opciones['columnas']
+        min_canales = opciones['min_canales']
+        
+        df = cargar_detecciones(detecciones_path)
+        imagen, dimensiones_originales = reconstruir_imagen_con_detecciones(
+            imagen_path, df, os.path.join(output_dir, "imagen_reconstruida.png"), opciones['max_lado']
+        )
+        imagen_cuadrantes_path = os.path.join(output_dir, "imagen_cuadrantes.png")
+        imagen_cuadrantes, _, _, cuad_baja_densidad_idx, _, _ = analizar_cuadrantes(
+            imagen, df, imagen_cuadrantes_path, min_canales, filas, columnas,
+            opciones['peso_tamano'], dimensiones_originales=dimensiones_originales,
+            celdas_camino=opciones['celdas_camino']
+        )
+        if opciones['piramide']:
+            # Vista previa y pirámide de mosaicos para abrir la imagen con un visor con zoom
+            write_pyramid(imagen_cuadrantes, imagen_cuadrantes_path)
+        
+        ancho, alto = dimensiones_originales
+        tabla, camino = resultados_cuadrantes(df, ancho, alto, min_canales, filas, columnas,
+                                              opciones['peso_tamano'], opciones['celdas_camino'])
+        tabla.to_csv(os.path.join(output_dir, "fragilidad_cuadrantes.csv"), index=False)
+        camino.to_csv(os.path.join(output_dir, "camino_propagacion.csv"), index=False)
+        
+        multirresolucion = analisis_multirresolucion(df, ancho, alto, min_canales=min_canales,
+                                                     peso_tamano=opciones['peso_tamano'],
+                                                     tamano_referencia=filas)
+        if not multirresolucion.empty:
+            multirresolucion.to_csv(os.path.join(output_dir, "fragilidad_multirresolucion.csv"), index=False)
+            if 'Dentro Cuadrante Referencia' in multirresolucion:
+                fila['stable_grids'] = (f"{int(multirresolucion['Dentro Cuadrante Referencia'].sum())}"
+                                        f"/{len(multirresolucion)}")
+        
+        fragil = tabla[tabla['Tipo'] == "Más frágil"]
+        fila.update(status='ok', count=int(tabla['Num Canales'].sum()),
+                    valid_quadrants=int((tabla['Válido'] == "Sí").sum()),
+                    low_density_quadrant=(cuad_baja_densidad_idx + 1
+                                          if cuad_baja_densidad_idx is not None else None))
+        if not fragil.empty:
+            fila.update(fragile_quadrant=int(fragil['Cuadrante'].iloc[0]),
+                        fragility_score=float(fragil['Puntuacion Fragilidad'].iloc[0]))
+        fila.update(path_end_quadrant=int(camino['Cuadrante'].iloc[-1]),
+                    path_length=round(float(longitud_camino(camino)), 1))
+    except Exception as e:
+        fila['error'] = f"{type(e).__name__}: {e}"
+        tabla = None
+    
+    fila['seconds'] = round(time.perf_counter() - start_time, 2)
+    return fila, tabla
 
-def main():
+def ejecutar_lote(args):
+    """
+    Analiza sin interfaz gráfica todos los pares (imagen, detecciones) del manifiesto.
+    
+    Cada muestra se guarda en su propia subcarpeta de --output-dir. Al terminar se
+    escriben un resumen por muestra (manifest.csv) y una tabla de fragilidad consolidada
+    con todos los cuadrantes de todas las muestras (fragilidad_cuadrantes.csv).
+    """
+    pares = leer_pares(args.manifest)
+    if not pares:
+        print("No se encontraron pares de imagen y detecciones para procesar.")
+        return 1
+    
+    workers = max(1, args.workers)
+    hilos = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Se analizarán {len(pares)} muestras con {workers} proceso(s)")
+    
+    usados = set()
+    tareas = [(imagen, detecciones, carpeta_muestra(args.output_dir, imagen, usados))
+              for imagen, detecciones in pares]
+    opciones = {
+        'filas': args.rows,
+        'columnas': args.cols,
+        'min_canales': args.min_channels,
+        'peso_tamano': args.size_weight,
+        'max_lado': args.max_side,
+        'celdas_camino': args.path_cells,
+        'piramide': args.pyramid,
+    }
+    
+    resultados = {}
+    if workers == 1:
+        init_worker(hilos)
+        for index, (imagen, detecciones, output_dir) in enumerate(tareas, start=1):
+            print(f"\n[{index}/{len(tareas)}] {imagen}")
+            resultados[output_dir] = analizar_muestra(imagen, detecciones, output_dir, opciones)
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_worker, initargs=(hilos,)) as executor:
+            futures = {executor.submit(analizar_muestra, *tarea, opciones): tarea for tarea in tareas}
+            for index, future in enumerate(as_completed(futures), start=1):
+                imagen, detecciones, output_dir = futures[future]
+                try:
+                    resultados[output_dir] = future.result()
+                except Exception as e:
+                    # El proceso trabajador murió (p. ej. sin memoria); se registra y se sigue
+                    resultados[output_dir] = ({'slide': imagen, 'detections_path': detecciones,
+                                               'output_dir': output_dir, 'status': 'error',
+                                               'error': f"Fallo del proceso trabajador: {e}"}, None)
+                print(f"[{index}/{len(tareas)}] {imagen}: {resultados[output_dir][0]['status']}")
+    
+    # Resumen y tabla consolidada en el orden del manifiesto
+    filas_resumen = []
+    tablas = []
+    for _, _, output_dir in tareas:
+        fila, tabla = resultados[output_dir]
+        filas_resumen.append(fila)
+        if tabla is not None:
+            tabla.insert(0, 'Muestra', os.path.basename(output_dir))
+            tablas.append(tabla)
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    resumen_path = os.path.join(args.output_dir, "manifest.csv")
+    pd.DataFrame(filas_resumen).to_csv(resumen_path, index=False)
+    print(f"Resumen del lote guardado en {resumen_path}")
+    
+    if tablas:
+        consolidada = pd.concat(tablas, ignore_index=True)
+        consolidada_path = os.path.join(args.output_dir, "fragilidad_cuadrantes.csv")
+        consolidada.to_csv(consolidada_path, index=False)
+        print(f"Tabla de fragilidad consolidada guardada en {consolidada_path}")
+        if args.excel:
+            consolidada.to_excel(os.path.splitext(consolidada_path)[0] + ".xlsx", index=False)
+    
+    fallidas = [fila for fila in filas_resumen if fila['status'] != 'ok']
+    for fila in fallidas:
+        print(f"Error en {fila['slide']}: {fila['error']}")
+    print(f"\nAnalizadas {len(filas_resumen) - len(fallidas)}/{len(filas_resumen)} muestras correctamente")
+    return 1 if fallidas else 0
+
+def entero_positivo(valor):
+    """Tipo de argparse para opciones que deben ser un entero mayor o igual que 1."""
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{valor}' no es un número entero")
+    if numero < 1:
+        raise argparse.ArgumentTypeError(f"debe ser un entero mayor o igual que 1 (se recibió {numero})")
+    return numero
+
+def opciones_dibujo(suprimir_valores_por_defecto=False):
+    """
+    Opciones de dibujo compartidas por la interfaz y el comando analyze.
+    
+    La copia del subcomando se crea sin valores por defecto (argparse.SUPPRESS) para que
+    no sobrescriba los que se dieron antes de él (`--max-side 4096 analyze m.csv`).
+    """
+    opciones = argparse.ArgumentParser(add_help=False)
+    opciones.add_argument("--max-side", type=entero_positivo,
+                          default=argparse.SUPPRESS if suprimir_valores_por_defecto else None,
+                          help="Dibujar los resultados sobre una vista previa con este lado mayor "
+                               "(por defecto, resolución completa)")
+    return opciones
+
+def parse_args(argv=None):
+    """Lee los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Phygital Bone - Análisis de fragilidad por cuadrantes",
+                                     parents=[opciones_dibujo()])
+    parser.add_argument("--results-dir", default=RESULTS_DIR,
+                        help="Carpeta donde la interfaz gráfica guarda las imágenes de resultados")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    analyze = subparsers.add_parser("analyze", parents=[opciones_dibujo(suprimir_valores_por_defecto=True)],
+                                    help="Analiza sin interfaz gráfica los pares (imagen, detecciones) de un manifiesto")
+    analyze.add_argument("manifest",
+                         help=f"CSV con las columnas '{COLUMNA_IMAGEN}' y '{COLUMNA_DETECCIONES}' "
+                              "(sirve el manifest.csv de detection_app detect)")
+    analyze.add_argument("--output-dir", default="breaking_results",
+                         help="Carpeta raíz de resultados; cada muestra tiene su propia subcarpeta")
+    analyze.add_argument("--workers", type=int, default=1,
+                         help="Procesos en paralelo (por defecto 1)")
+    analyze.add_argument("--rows", type=entero_positivo, default=FILAS_CUADRICULA,
+                         help=f"Filas de la cuadrícula (por defecto {FILAS_CUADRICULA})")
+    analyze.add_argument("--cols", type=entero_positivo, default=COLUMNAS_CUADRICULA,
+                         help=f"Columnas de la cuadrícula (por defecto {COLUMNAS_CUADRICULA})")
+    analyze.add_argument("--min-channels", type=int, default=MIN_CANALES,
+                         help=f"Mínimo de canales para que un cuadrante sea válido (por defecto {MIN_CANALES})")
+    analyze.add_argument("--size-weight", type=float, default=PESO_TAMANO,
+                         help=f"Peso del factor de tamaño en la fragilidad (por defecto {PESO_TAMANO})")
+    analyze.add_argument("--path-cells", type=entero_positivo, default=CELDAS_CAMINO,
+                         help="Celdas por lado de la cuadrícula del camino de propagación "
+                              f"(por defecto {CELDAS_CAMINO})")
+    analyze.add_argument("--excel", action="store_true",
+                         help="Guardar también la tabla consolidada en Excel")
+    analyze.add_argument("--pyramid", action="store_true",
+                         help="Guardar también la vista previa y la pirámide de mosaicos de "
+                              "imagen_cuadrantes.png (a resolución completa)")
+    
+    args = parser.parse_args(argv)
+    if args.command == "analyze" and args.pyramid and args.max_side:
+        analyze.error("--pyramid genera la pirámide a resolución completa; no se puede combinar con --max-side")
+    return args
+
+def main(argv=None):
     """Función principal del programa"""
+    args = parse_args(argv)
+    
+    # Modo sin interfaz gráfica
+    if args.command == "analyze":
+        return ejecutar_lote(args)
+    
     # Crear ventana principal
     root = Tk()
     
-    # Variables globales para dimensiones de imagen
-    global img_width, img_height
-    img_width, img_height = 800, 800  # Valores predeterminados iniciales
-    
-    # Definir rutas base para almacenar resultados
-    results_dir = r"C:\Users\joanb\OneDrive\Escritorio\TFG\Workspace_tfg\histology_bone_analyzer\data\sample_results\breaking_app"
+    # Carpeta para almacenar resultados
+    results_dir = args.results_dir
     
     # Crear la carpeta si no existe
     os.makedirs(results_dir, exist_ok=True)
     
-    # Ignorar advertencias de PIL sobre imágenes grandes
-    Image.MAX_IMAGE_PIXELS = None
-    
     # Mínimo de canales para considerar un cuadrante válido
-    min_canales = 6
+    min_canales = MIN_CANALES
     
     # Título de la ventana
     configure_window(root, "Análisis de Canales por Cuadrantes")
@@ -709,19 +1755,20 @@ def main():
         # Seleccionar imagen original
         imagen_original = filedialog.askopenfilename(
             title="Seleccione la imagen original",
-            filetypes=[("Image files", "*.jpg;*.jpeg;*.png")]
+            filetypes=[("Image files", "*.jpg;*.jpeg;*.png;*.tif;*.tiff;*.svs")]
         )
         
         if not imagen_original:
             return
             
-        # Seleccionar archivo Excel con detecciones
-        excel_path = filedialog.askopenfilename(
-            title="Seleccione el archivo Excel con las detecciones",
-            filetypes=[("Excel files", "*.xlsx")]
+        # Seleccionar archivo de detecciones (Parquet o Excel de versiones anteriores)
+        detecciones_path = filedialog.askopenfilename(
+            title="Seleccione el archivo con las detecciones",
+            filetypes=[("Detecciones", "*.parquet;*.xlsx"), ("Parquet files", "*.parquet"),
+                       ("Excel files", "*.xlsx")]
         )
         
-        if not excel_path:
+        if not detecciones_path:
             return
             
         # Mostrar ventana de progreso
@@ -732,30 +1779,82 @@ def main():
         progreso.update()
         
         try:
-            # Definir rutas para los archivos de resultados
+            # Ruta de la imagen reconstruida; la de cuadrantes solo se guarda con "Guardar Imagen"
             imagen_reconstruida_path = os.path.join(results_dir, "imagen_reconstruida.png")
-            imagen_cuadrantes_path = os.path.join(results_dir, "imagen_cuadrantes.png")
             
-            # Reconstruir imagen con detecciones
-            imagen = reconstruir_imagen_con_detecciones(
-                imagen_original, excel_path, imagen_reconstruida_path
+            # Detecciones interpretadas una sola vez y compartidas por todas las etapas
+            # (si el archivo no ha cambiado desde el último análisis no se vuelve a leer)
+            df = cargar_detecciones(detecciones_path)
+            
+            # Reconstruir imagen con detecciones (a resolución completa salvo con --max-side)
+            imagen, dimensiones_originales = reconstruir_imagen_con_detecciones(
+                imagen_original, df, imagen_reconstruida_path, args.max_side
             )
             
-            # Cargar datos de detecciones
-            df = pd.read_excel(excel_path)
+            # Vista previa y pirámide de mosaicos junto a la imagen reconstruida; el visor
+            # las lee del disco, así que la imagen no se conserva en memoria
+            write_pyramid(imagen, imagen_reconstruida_path)
+            alto_base, ancho_base = imagen.shape[:2]
+            del imagen
             
-            # Analizar por cuadrantes (ahora devuelve 6 valores)
-            imagen_final, areas, canales, cuad_baja_densidad_idx, puntuacion_fragilidad, densidad_por_cuadrante = analizar_cuadrantes(
-                imagen, df, imagen_cuadrantes_path, min_canales
-            )
+            ancho, alto = dimensiones_originales
+            resolucion_completa = (ancho_base, alto_base) == dimensiones_originales
+            
+            # Píxeles de la imagen reconstruida por píxel original (1 salvo con --max-side)
+            escala_base_x = ancho_base / ancho
+            escala_base_y = alto_base / alto
+            
+            # Función de actualización de la ventana de resultados, una vez construida
+            vista = {}
+            
+            def exportar_imagen(destino, min_canales, peso_tamano):
+                """Dibuja la imagen de cuadrantes completa y la guarda (con su pirámide a resolución completa)."""
+                imagen_base = cv2.imread(imagen_reconstruida_path)
+                imagen_cuadrantes = analizar_cuadrantes(imagen_base, df, destino, min_canales,
+                                                        peso_tamano=peso_tamano,
+                                                        dimensiones_originales=dimensiones_originales)[0]
+                if resolucion_completa:
+                    write_pyramid(imagen_cuadrantes, destino)
+            
+            def analizar_y_mostrar(min_canales, peso_tamano):
+                """Puntúa y muestra los resultados; se repite al mover los controles."""
+                try:
+                    # Puntuación a partir de los agregados por cuadrante en caché (solo se
+                    # calculan en el primer análisis)
+                    resultado = puntuar_cuadrantes(preparar_canales(df), ancho, alto, FILAS_CUADRICULA,
+                                                   COLUMNAS_CUADRICULA, min_canales, peso_tamano)
+                    
+                    # Tabla por cuadrante (reutiliza los mismos agregados y el camino en caché)
+                    tabla, camino = resultados_cuadrantes(df, ancho, alto, min_canales, peso_tamano=peso_tamano)
+                    
+                    # Estabilidad de la zona más frágil con cuadrículas de 4×4 a 64×64
+                    multirresolucion = analisis_multirresolucion(df, ancho, alto, min_canales=min_canales,
+                                                                 peso_tamano=peso_tamano)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Error durante el análisis: {e}")
+                    return
+                
+                def superposicion(vista_visor, x0, y0, escala):
+                    """Dibuja los cuadrantes sobre la vista del visor (coordenadas de la imagen reconstruida)."""
+                    dibujar_cuadrantes(vista_visor, resultado, ancho, alto, min_canales=min_canales,
+                                       origen=(x0 / escala_base_x, y0 / escala_base_y),
+                                       escala=(escala * escala_base_x, escala * escala_base_y))
+                
+                # Mostrar resultados: la ventana se construye la primera vez y después solo
+                # se actualizan los cuadrantes dibujados en el visor, la leyenda y los datos
+                if 'actualizar' in vista:
+                    vista['actualizar'](tabla, min_canales, peso_tamano, multirresolucion, camino, superposicion)
+                else:
+                    vista['actualizar'] = visualizar_resultados_cuadrantes(
+                        root, imagen_reconstruida_path, tabla, min_canales, multirresolucion=multirresolucion,
+                        camino=camino, peso_tamano=peso_tamano, recalcular=analizar_y_mostrar,
+                        superposicion=superposicion, exportar_imagen=exportar_imagen
+                    )
             
             # Cerrar ventana de progreso
             progreso.destroy()
             
-            # Mostrar resultados
-            visualizar_resultados_cuadrantes(root, imagen_cuadrantes_path, areas, canales, 
-                                           cuad_baja_densidad_idx, puntuacion_fragilidad, 
-                                           densidad_por_cuadrante, min_canales)
+            analizar_y_mostrar(min_canales, PESO_TAMANO)
             
         except Exception as e:
             progreso.destroy()
@@ -784,4 +1883,4 @@ def main():
     root.mainloop()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
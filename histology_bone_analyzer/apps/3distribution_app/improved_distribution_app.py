@@ -1,3 +1,6 @@
+import argparse
+import sys
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import numpy as np
@@ -6,10 +9,703 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
 import os
 import json
+import re
 from PIL import Image, ImageTk
-import random
 from datetime import datetime
 import math
+import multiprocessing
+import struct
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Secciones del fémur en orden proximal a distal: (clave de los parámetros, nombre)
+SECTIONS = [
+    ("epiphysis_proximal", "Epífisis Proximal"),
+    ("metaphysis_proximal", "Metáfisis Proximal"),
+    ("diaphysis", "Diáfisis"),
+    ("metaphysis_distal", "Metáfisis Distal"),
+    ("epiphysis_distal", "Epífisis Distal"),
+]
+
+# Parámetros del modelo y valores por defecto (nombres de las variables de la interfaz y
+# columnas de la tabla de variantes de la CLI)
+DEFAULT_PARAMETERS = {
+    # Longitud (cm) y proporciones (% de la longitud)
+    "femur_length": 45.0,
+    "epiphysis_proximal_percent": 15.0,
+    "metaphysis_proximal_percent": 10.0,
+    "diaphysis_percent": 50.0,
+    "metaphysis_distal_percent": 10.0,
+    "epiphysis_distal_percent": 15.0,
+    
+    # Radios anatómicos por sección (en cm)
+    "radius_epiphysis_proximal": 2.5,
+    "radius_metaphysis_proximal": 1.5,
+    "radius_diaphysis": 1.0,
+    "radius_metaphysis_distal": 1.8,
+    "radius_epiphysis_distal": 3.0,
+    
+    # Grosor cortical por sección (en cm)
+    "cortical_thickness_epiphysis_proximal": 0.25,  # 2.5mm
+    "cortical_thickness_metaphysis_proximal": 0.35,  # 3.5mm
+    "cortical_thickness_diaphysis": 0.45,  # 4.5mm
+    "cortical_thickness_metaphysis_distal": 0.35,  # 3.5mm
+    "cortical_thickness_epiphysis_distal": 0.25,  # 2.5mm
+    
+    # Densidades basadas en literatura científica (osteonas/cm²)
+    "density_epiphysis_proximal": 1500.0,
+    "density_metaphysis_proximal": 1800.0,
+    "density_diaphysis": 2000.0,
+    "density_metaphysis_distal": 1800.0,
+    "density_epiphysis_distal": 1500.0,
+    
+    # Dimensiones de las osteonas por sección (diámetro en micrómetros)
+    "osteona_size_epiphysis_proximal": 200.0,
+    "osteona_size_metaphysis_proximal": 180.0,
+    "osteona_size_diaphysis": 150.0,
+    "osteona_size_metaphysis_distal": 180.0,
+    "osteona_size_epiphysis_distal": 200.0,
+    
+    # Factor de variabilidad en la distribución
+    "variability_epiphysis_proximal": 0.05,
+    "variability_metaphysis_proximal": 0.05,
+    "variability_diaphysis": 0.05,
+    "variability_metaphysis_distal": 0.05,
+    "variability_epiphysis_distal": 0.05,
+}
+
+# Columnas opcionales de la tabla de variantes además de los parámetros
+VARIANT_NAME_COLUMN = "name"
+VARIANT_SEED_COLUMN = "seed"
+
+# Caracteres no permitidos en el nombre de la carpeta de una variante
+UNSAFE_NAME_CHARACTERS = re.compile(r'[^\w.-]+')
+
+# Formatos de exportación de la distribución: (extensión, descripción)
+EXPORT_FORMATS = {
+    "csv": (".csv", "CSV"),
+    "json": (".json", "JSON"),
+    "parquet": (".parquet", "Parquet"),
+    "npz": (".npz", "NumPy NPZ"),
+    "bin": (".bin", "Nube de puntos binaria"),
+}
+
+# Osteonas que se convierten a texto de una vez al escribir el JSON
+JSON_CHUNK_ROWS = 50000
+
+# Nube de puntos binaria (little-endian): cabecera fija (identificador, versión, número de
+# osteonas, bytes de los nombres de sección), nombres de sección en UTF-8 separados por
+# saltos de línea y un registro POINT_CLOUD_DTYPE por osteona
+POINT_CLOUD_MAGIC = b"OSTN"
+POINT_CLOUD_VERSION = 1
+POINT_CLOUD_HEADER = struct.Struct("<4sIQI")
+POINT_CLOUD_DTYPE = np.dtype([
+    ("x_cm", "<f4"),
+    ("y_cm", "<f4"),
+    ("z_cm", "<f4"),
+    ("size_um", "<f4"),
+    ("section_code", "u1"),
+])
+
+# Registros de la nube de puntos que se escriben de una vez
+POINT_CLOUD_CHUNK_ROWS = 1 << 20
+
+# Columnas de la distribución de osteonas (una fila por osteona)
+OSTEONA_COLUMNS = ["section_name", "position_x_cm", "position_y_cm", "position_z_cm", "size_um"]
+
+# Variación relativa del tamaño de las osteonas (±) en las secciones y en las transiciones
+SIZE_VARIATION = 0.2
+TRANSITION_SIZE_VARIATION = 0.1
+
+# Zona de transición: cm antes y después del límite entre secciones, fracción de la
+# densidad normal y variabilidad radial de sus osteonas
+TRANSITION_ZONE_CM = 0.5
+TRANSITION_DENSITY_FACTOR = 0.3
+TRANSITION_VARIABILITY = 0.2
+
+TRANSITION_SUFFIX = " (transición)"
+
+# Milisegundos entre comprobaciones del progreso de la generación en segundo plano
+POLL_INTERVAL_MS = 100
+
+
+def cortical_area_cm2(radius_cm, cortical_thickness):
+    """Área de la zona cortical (anillo exterior) de una sección, en cm²"""
+    radio_interno = max(0, radius_cm - cortical_thickness)
+    return math.pi * (radius_cm**2 - radio_interno**2)
+
+
+def sample_xy_positions(n, radius_cm, cortical_thickness, variability, rng):
+    """
+    Genera n coordenadas X,Y SOLO en la zona cortical (anillo exterior)
+    
+    Args:
+        n: Número de osteonas
+        radius_cm: Radio total de la sección en cm
+        cortical_thickness: Grosor de la zona cortical en cm
+        variability: Factor de variabilidad para la distribución
+        rng: np.random.Generator del que se extraen las muestras
+        
+    Returns:
+        Tupla (x, y) de arrays en cm dentro de la zona cortical
+    """
+    radio_interno = max(0, radius_cm - cortical_thickness)
+    radio_externo = radius_cm
+    
+    # Ángulos aleatorios
+    angle = rng.uniform(0, 2 * math.pi, n)
+    
+    # Radios SOLO en la zona cortical
+    if variability < 0.3:
+        # Distribución uniforme en la zona cortical
+        r = rng.uniform(radio_interno, radio_externo, n)
+    elif variability < 0.7:
+        # Distribución con tendencia hacia el centro de la zona cortical
+        centro_cortical = (radio_interno + radio_externo) / 2
+        desviacion = (radio_externo - radio_interno) / 4
+        r = np.clip(rng.normal(centro_cortical, desviacion, n), radio_interno, radio_externo)
+    else:
+        # Variabilidad alta: 70% cerca del borde exterior, 30% uniforme en zona cortical
+        cerca_borde = rng.random(n) < 0.7
+        r = np.where(cerca_borde,
+                     rng.uniform(radio_externo * 0.9, radio_externo, n),
+                     rng.uniform(radio_interno, radio_externo, n))
+    
+    # Convertir coordenadas polares a cartesianas
+    return r * np.cos(angle), r * np.sin(angle)
+
+
+def sample_positions(n, min_val, max_val, variability, rng):
+    """
+    Genera n posiciones aleatorias con distribución más uniforme
+    y menos concentración extrema en los bordes
+    """
+    # Para variabilidad muy baja, distribución completamente uniforme
+    if variability < 0.2:
+        return rng.uniform(min_val, max_val, n)
+    
+    mean = (max_val + min_val) / 2
+    
+    # Para variabilidad baja-media, distribución normal centrada
+    if variability < 0.4:
+        std_dev = (max_val - min_val) / 8  # Más concentración hacia el centro
+        return np.clip(rng.normal(mean, std_dev, n), min_val, max_val)
+    
+    # Para variabilidad media-alta: 60% distribución normal centrada, 40% uniforme
+    std_dev = (max_val - min_val) / 6
+    return np.where(rng.random(n) < 0.6,
+                    np.clip(rng.normal(mean, std_dev, n), min_val, max_val),
+                    rng.uniform(min_val, max_val, n))
+
+
+def section_categories(sections):
+    """Nombres de sección de la distribución: cada sección seguida de su transición"""
+    return [name for section in sections for name in (section["name"], section["name"] + TRANSITION_SUFFIX)]
+
+
+def osteona_frame(section_names, x, y, z, size, categories):
+    """DataFrame de osteonas con las columnas de OSTEONA_COLUMNS"""
+    return pd.DataFrame({
+        "section_name": pd.Categorical(section_names, categories=categories),
+        "position_x_cm": x,
+        "position_y_cm": y,
+        "position_z_cm": z,
+        "size_um": size,
+    })
+
+
+def generate_section_osteonas(section, categories, rng):
+    """
+    Genera todas las osteonas de una sección con operaciones vectorizadas
+    
+    Args:
+        section: Diccionario de la sección (ver FemurOsteonaDistributor.calculate)
+        categories: Nombres de sección de la distribución (ver section_categories)
+        rng: np.random.Generator del que se extraen las muestras
+        
+    Returns:
+        DataFrame con una fila por osteona
+    """
+    # Número de osteonas usando densidad real aplicada solo al área cortical
+    cortical_area = cortical_area_cm2(section["radius_cm"], section["cortical_thickness"])
+    num_osteonas = int(cortical_area * section["density_per_cm2"])
+    
+    # Coordenadas X,Y SOLO dentro de la zona cortical
+    x, y = sample_xy_positions(num_osteonas, section["radius_cm"], section["cortical_thickness"],
+                               section["variability"], rng)
+    
+    # Posición longitudinal Z absoluta en el hueso
+    z = section["start_cm"] + sample_positions(num_osteonas, 0, section["length_cm"], section["variability"], rng)
+    
+    # Tamaño aleatorio de cada osteona
+    size = section["osteona_size_um"] * (1 + rng.uniform(-SIZE_VARIATION, SIZE_VARIATION, num_osteonas))
+    
+    return osteona_frame(np.full(num_osteonas, section["name"]), x, y, z, size, categories)
+
+
+def generate_transition_osteonas(section1, section2, total_length_cm, categories, rng):
+    """
+    Genera osteonas en la zona de transición entre dos secciones
+    SOLO en la zona cortical
+    """
+    transition_start = max(0, section1["end_cm"] - TRANSITION_ZONE_CM)
+    transition_end = min(total_length_cm, section2["start_cm"] + TRANSITION_ZONE_CM)
+    transition_length = transition_end - transition_start
+    
+    if transition_length <= 0:
+        return osteona_frame([], [], [], [], [], categories)
+    
+    # Calcular parámetros de transición
+    avg_radius = (section1["radius_cm"] + section2["radius_cm"]) / 2
+    avg_cortical_thickness = (section1["cortical_thickness"] + section2["cortical_thickness"]) / 2
+    avg_density = (section1["density_per_cm2"] + section2["density_per_cm2"]) / 2
+    avg_size = (section1["osteona_size_um"] + section2["osteona_size_um"]) / 2
+    
+    # Número de osteonas de transición (fracción de la densidad normal)
+    transition_cortical_area = cortical_area_cm2(avg_radius, avg_cortical_thickness)
+    num_transition = int(transition_cortical_area * avg_density * TRANSITION_DENSITY_FACTOR
+                         * (transition_length / section1["length_cm"]))
+    
+    # Coordenadas X,Y SOLO en zona cortical de transición y Z en la zona de transición
+    x, y = sample_xy_positions(num_transition, avg_radius, avg_cortical_thickness, TRANSITION_VARIABILITY, rng)
+    z = rng.uniform(transition_start, transition_end, num_transition)
+    
+    # Tamaño promedio con menor variación
+    size = avg_size * (1 + rng.uniform(-TRANSITION_SIZE_VARIATION, TRANSITION_SIZE_VARIATION, num_transition))
+    
+    # Sección más cercana
+    section_names = np.where(z < section1["end_cm"], section1["name"] + TRANSITION_SUFFIX,
+                             section2["name"] + TRANSITION_SUFFIX)
+    return osteona_frame(section_names, x, y, z, size, categories)
+
+
+def new_seed():
+    """Semilla aleatoria (entropía del sistema) para una distribución sin semilla fijada"""
+    return np.random.SeedSequence().entropy
+
+
+def section_seeds(seed, num_sections):
+    """
+    Secuencias de semillas independientes, una por sección, derivadas de la semilla del usuario
+    
+    Con la misma semilla y el mismo número de secciones se obtienen siempre las mismas
+    secuencias, de modo que cada sección se puede generar por separado (en cualquier orden
+    o proceso) y reproducirse exactamente.
+    """
+    return np.random.SeedSequence(seed).spawn(num_sections)
+
+
+def generate_section_block(sections_data, index, seed_sequence):
+    """
+    Genera las osteonas de una sección y las de su transición con la siguiente
+    
+    Todas se extraen de un único np.random.Generator creado a partir de seed_sequence
+    (ver section_seeds).
+    """
+    sections = sections_data["sections"]
+    categories = section_categories(sections)
+    rng = np.random.default_rng(seed_sequence)
+    
+    section = sections[index]
+    frames = [generate_section_osteonas(section, categories, rng)]
+    
+    # Añadir osteonas de transición entre secciones
+    if index < len(sections) - 1:  # Si no es la última sección
+        frames.append(generate_transition_osteonas(section, sections[index + 1],
+                                                   sections_data["total_length_cm"], categories, rng))
+    
+    return pd.concat(frames, ignore_index=True)
+
+
+def generate_distribution(sections_data, seed=None):
+    """
+    Genera la distribución de osteonas de todo el fémur, solo en la zona cortical
+    
+    Cada sección va seguida de las osteonas de su transición con la siguiente y usa su
+    propio flujo de números aleatorios derivado de seed (ver section_seeds).
+    
+    Args:
+        sections_data: Diccionario con total_length_cm y la lista de secciones
+        seed: Semilla entera; con la misma semilla y parámetros el resultado es idéntico
+            (None = semilla aleatoria)
+        
+    Returns:
+        DataFrame con las columnas de OSTEONA_COLUMNS (section_name categórica)
+    """
+    seeds = section_seeds(seed, len(sections_data["sections"]))
+    return merge_sections([generate_section_block(sections_data, i, seed_sequence)
+                           for i, seed_sequence in enumerate(seeds)])
+
+
+def submit_distribution(executor, sections_data, seed=None):
+    """
+    Envía al executor una tarea generate_section_block por sección
+    
+    Cada tarea usa su propia semilla de section_seeds, así que el resultado es idéntico
+    al de generate_distribution independientemente del proceso que ejecute cada sección.
+    
+    Returns:
+        Lista de futuros en el orden de las secciones
+    """
+    seeds = section_seeds(seed, len(sections_data["sections"]))
+    return [executor.submit(generate_section_block, sections_data, i, seed_sequence)
+            for i, seed_sequence in enumerate(seeds)]
+
+
+def merge_sections(blocks):
+    """Une las osteonas generadas por sección, en el orden de las secciones"""
+    return pd.concat(blocks, ignore_index=True)
+
+
+def section_counts(distribution):
+    """Número de osteonas por nombre de sección, en el orden de la distribución"""
+    counts = distribution["section_name"].value_counts(sort=False)
+    return counts[counts > 0]
+
+
+def write_json_distribution(distribution, sections_data, path):
+    """
+    Guarda la distribución en JSON ({"femur_info": ..., "osteonas": [...]}, indentado)
+    
+    Las osteonas se convierten a texto por bloques de JSON_CHUNK_ROWS y se escriben
+    directamente en el archivo, sin construir en memoria la lista completa ni el texto.
+    """
+    header = json.dumps({"femur_info": sections_data}, indent=4)
+    with open(path, 'w') as f:
+        # Cabecera sin la llave de cierre
+        f.write(header[:-2])
+        f.write(',\n    "osteonas": [')
+        
+        separator = "\n"
+        for start in range(0, len(distribution), JSON_CHUNK_ROWS):
+            chunk = distribution.iloc[start:start + JSON_CHUNK_ROWS].astype({"section_name": str})
+            for record in chunk.to_dict('records'):
+                f.write(separator)
+                f.write("        " + json.dumps(record, indent=4).replace("\n", "\n        "))
+                separator = ",\n"
+        
+        f.write("\n    ]\n}" if len(distribution) else "]\n}")
+
+
+def section_codes(distribution):
+    """
+    Código numérico (uint8) de la sección de cada osteona y nombres de las secciones
+    
+    Los códigos son las posiciones en las categorías de section_name (ver section_categories).
+    """
+    names = distribution["section_name"].cat.categories
+    return distribution["section_name"].cat.codes.to_numpy(dtype=np.uint8), [str(name) for name in names]
+
+
+def write_point_cloud(distribution, path):
+    """Guarda la distribución como nube de puntos binaria (ver POINT_CLOUD_DTYPE)"""
+    codes, names = section_codes(distribution)
+    names_bytes = "\n".join(names).encode("utf-8")
+    
+    with open(path, 'wb') as f:
+        f.write(POINT_CLOUD_HEADER.pack(POINT_CLOUD_MAGIC, POINT_CLOUD_VERSION, len(distribution), len(names_bytes)))
+        f.write(names_bytes)
+        
+        # Registros por bloques para no duplicar en memoria la distribución completa
+        for start in range(0, len(distribution), POINT_CLOUD_CHUNK_ROWS):
+            chunk = distribution.iloc[start:start + POINT_CLOUD_CHUNK_ROWS]
+            records = np.empty(len(chunk), dtype=POINT_CLOUD_DTYPE)
+            records["x_cm"] = chunk["position_x_cm"].to_numpy()
+            records["y_cm"] = chunk["position_y_cm"].to_numpy()
+            records["z_cm"] = chunk["position_z_cm"].to_numpy()
+            records["size_um"] = chunk["size_um"].to_numpy()
+            records["section_code"] = codes[start:start + POINT_CLOUD_CHUNK_ROWS]
+            f.write(records.tobytes())
+
+
+def write_distribution(distribution, sections_data, path, format_type):
+    """
+    Guarda la distribución ordenada por posición longitudinal (formato para Grasshopper)
+    
+    CSV y JSON conservan los valores en float64 y el nombre de la sección en cada fila.
+    Parquet, NPZ y la nube de puntos binaria guardan las columnas numéricas en float32 y
+    la sección como código (categoría de Parquet; section_code + section_names en NPZ).
+    
+    Args:
+        distribution: DataFrame de generate_distribution
+        sections_data: Parámetros de las secciones (se incluyen en JSON y NPZ)
+        format_type: Uno de EXPORT_FORMATS
+    """
+    distribution = distribution.sort_values(by='position_z_cm', ascending=True, kind='stable')
+    numeric_columns = {column: np.float32 for column in OSTEONA_COLUMNS if column != "section_name"}
+    
+    if format_type == "csv":
+        distribution.to_csv(path, index=False)
+    elif format_type == "json":
+        write_json_distribution(distribution, sections_data, path)
+    elif format_type == "parquet":
+        distribution.astype(numeric_columns).to_parquet(path, index=False)
+    elif format_type == "npz":
+        codes, names = section_codes(distribution)
+        arrays = {column: distribution[column].to_numpy(dtype=dtype) for column, dtype in numeric_columns.items()}
+        np.savez(path, section_code=codes, section_names=np.array(names),
+                 femur_info=np.array(json.dumps(sections_data)), **arrays)
+    elif format_type == "bin":
+        write_point_cloud(distribution, path)
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {format_type}")
+
+
+class FemurModel:
+    """
+    Modelo del fémur con parámetros simples, sin interfaz gráfica
+    
+    Los parámetros son los de DEFAULT_PARAMETERS (los que no se indiquen toman su valor
+    por defecto). La interfaz construye un FemurModel con los valores de sus campos y la
+    CLI uno por cada fila de la tabla de variantes.
+    
+    Args:
+        seed: Semilla de la distribución (None = aleatoria; la elegida queda en self.seed)
+        **parameters: Valores de DEFAULT_PARAMETERS
+    """
+    
+    def __init__(self, seed=None, **parameters):
+        unknown = sorted(set(parameters) - set(DEFAULT_PARAMETERS))
+        if unknown:
+            raise ValueError(f"Parámetros desconocidos: {', '.join(unknown)}")
+        
+        self.parameters = {name: float(parameters.get(name, default))
+                           for name, default in DEFAULT_PARAMETERS.items()}
+        self.seed = new_seed() if seed is None else int(seed)
+        if self.seed < 0:
+            raise ValueError(f"La semilla debe ser un número entero no negativo: {self.seed}")
+    
+    def section_parameter(self, key, name):
+        """Valor del parámetro name (percent, radius, density...) de la sección key"""
+        if name == "percent":
+            return self.parameters[f"{key}_percent"]
+        return self.parameters[f"{name}_{key}"]
+    
+    def sections_data(self):
+        """
+        Longitudes, límites y propiedades de cada sección
+        
+        Raises:
+            ValueError: Si los porcentajes de las secciones no suman 100%
+        """
+        total_length = self.parameters["femur_length"]
+        
+        # Verificar que los porcentajes suman 100%
+        total_percent = sum(self.section_parameter(key, "percent") for key, _ in SECTIONS)
+        if abs(total_percent - 100.0) > 0.01:
+            raise ValueError(f"Los porcentajes de las secciones suman {total_percent}%, no 100%")
+        
+        # Calcular longitudes absolutas y puntos de inicio y fin de cada sección; la
+        # última termina exactamente en la longitud total
+        sections = []
+        start = 0
+        for i, (key, name) in enumerate(SECTIONS):
+            length = total_length * (self.section_parameter(key, "percent") / 100)
+            end = total_length if i == len(SECTIONS) - 1 else start + length
+            sections.append({
+                "name": name,
+                "start_cm": start,
+                "end_cm": end,
+                "length_cm": length,
+                "percent": self.section_parameter(key, "percent"),
+                "radius_cm": self.section_parameter(key, "radius"),
+                "cortical_thickness": self.section_parameter(key, "cortical_thickness"),
+                "density_per_cm2": self.section_parameter(key, "density"),
+                "osteona_size_um": self.section_parameter(key, "osteona_size"),
+                "variability": self.section_parameter(key, "variability")
+            })
+            start = end
+        
+        return {
+            "total_length_cm": total_length,
+            "seed": self.seed,
+            "sections": sections
+        }
+    
+    def generate(self):
+        """Genera la distribución de osteonas (ver generate_distribution)"""
+        return generate_distribution(self.sections_data(), self.seed)
+
+
+def variant_folder_name(name, index, used_names):
+    """
+    Nombre de carpeta seguro y único para una variante, derivado del de la tabla
+    
+    Los caracteres que no son letras, dígitos, '.', '-' o '_' (incluidos los separadores
+    de ruta) se sustituyen por '_' y se quitan los puntos iniciales, de modo que ningún
+    nombre ('..', '../x', '/tmp/x') sale de --output-dir. Si el nombre queda vacío se usa
+    variant_<índice> y, si ya está en uso (sin distinguir mayúsculas), se añade _2, _3...
+    """
+    base = UNSAFE_NAME_CHARACTERS.sub('_', str(name)).lstrip('.') if name is not None else ''
+    if not base.strip('_'):
+        base = f"variant_{index:04d}"
+    
+    candidate = base
+    suffix = 2
+    while candidate.casefold() in used_names:
+        candidate = f"{base}_{suffix}"
+        suffix += 1
+    used_names.add(candidate.casefold())
+    return candidate
+
+
+def parse_seed(value):
+    """
+    Semilla de la tabla de variantes (texto, entero o None) como entero no negativo
+    
+    La columna se lee como texto para no pasar por float, que redondea las semillas
+    mayores que 2**53. Se interpreta en generate_variant, de modo que una semilla no
+    válida solo hace fallar su variante.
+    """
+    if value is None or isinstance(value, int):
+        text = str(value)
+    else:
+        text = str(value).strip()
+        if text.endswith('.0'):
+            text = text[:-2]  # Celdas numéricas de Excel guardadas como número con decimales
+    if not (text.isascii() and text.isdigit()):
+        raise ValueError(f"Semilla no válida: '{value}' (debe ser un entero no negativo)")
+    return int(text)
+
+
+def read_variants(table_path):
+    """
+    Lee la tabla de variantes (CSV o Excel): una fila por fémur, una columna por parámetro
+    
+    Las columnas opcionales name y seed dan el nombre de la variante (por defecto
+    variant_0001, ...) y su semilla. Los nombres se convierten en nombres de carpeta
+    seguros y únicos (ver variant_folder_name).
+    
+    Returns:
+        Lista de (nombre, seed, parámetros); seed es el texto de la celda (se interpreta
+        con parse_seed al generar la variante) o None si está vacía
+    """
+    # La semilla se lee como texto para conservar enteros de más de 53 bits
+    if table_path.lower().endswith(('.xlsx', '.xls')):
+        table = pd.read_excel(table_path, dtype={VARIANT_SEED_COLUMN: str})
+    else:
+        table = pd.read_csv(table_path, dtype={VARIANT_SEED_COLUMN: str})
+    
+    unknown = sorted(set(table.columns) - set(DEFAULT_PARAMETERS) - {VARIANT_NAME_COLUMN, VARIANT_SEED_COLUMN})
+    if unknown:
+        raise ValueError(f"Columnas desconocidas en {table_path}: {', '.join(unknown)}")
+    
+    variants = []
+    used_names = set()
+    for index, row in enumerate(table.to_dict('records'), start=1):
+        name = row.pop(VARIANT_NAME_COLUMN, None)
+        seed = row.pop(VARIANT_SEED_COLUMN, None)
+        variants.append((
+            variant_folder_name(name if not pd.isna(name) else None, index, used_names),
+            str(seed).strip() if not pd.isna(seed) and str(seed).strip() else None,
+            {column: value for column, value in row.items() if not pd.isna(value)},
+        ))
+    return variants
+
+
+def generate_variant(name, seed, parameters, output_dir, format_type):
+    """
+    Genera y guarda una variante; devuelve su fila del resumen
+    
+    Nunca lanza excepciones: un fallo queda registrado en la fila con status 'error',
+    de modo que una variante defectuosa no interrumpe el lote.
+    """
+    start_time = time.perf_counter()
+    fila = {'name': name, 'seed': seed, 'status': 'error', 'num_osteonas': 0, 'path': None, 'error': None}
+    try:
+        model = FemurModel(parse_seed(seed) if seed is not None else None, **parameters)
+        fila['seed'] = model.seed
+        sections_data = model.sections_data()
+        distribution = generate_distribution(sections_data, model.seed)
+        
+        variant_dir = os.path.join(output_dir, name)
+        os.makedirs(variant_dir, exist_ok=True)
+        path = os.path.join(variant_dir, "osteonas" + EXPORT_FORMATS[format_type][0])
+        write_distribution(distribution, sections_data, path, format_type)
+        with open(os.path.join(variant_dir, "configuracion.json"), 'w') as f:
+            json.dump(sections_data, f, indent=4)
+        
+        fila.update(status='ok', num_osteonas=len(distribution), path=path)
+    except Exception as e:
+        fila['error'] = str(e)
+    
+    fila['seconds'] = round(time.perf_counter() - start_time, 2)
+    return fila
+
+
+def run_batch(args):
+    """
+    Genera todas las variantes de la tabla de parámetros y escribe un resumen
+    (manifest.csv) con la semilla, el número de osteonas y el archivo de cada una.
+    """
+    variants = read_variants(args.table)
+    if not variants:
+        print("La tabla de variantes está vacía.")
+        return 1
+    
+    # Sin semilla en la tabla: semilla base + número de fila (reproducible) o aleatoria
+    variants = [(name, seed if seed is not None else None if args.seed is None else args.seed + index, parameters)
+                for index, (name, seed, parameters) in enumerate(variants)]
+    
+    workers = max(1, args.workers)
+    print(f"Se generarán {len(variants)} variantes con {workers} proceso(s)")
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    filas = {}
+    if workers == 1:
+        for index, (name, seed, parameters) in enumerate(variants, start=1):
+            filas[name] = generate_variant(name, seed, parameters, args.output_dir, args.format)
+            print(f"[{index}/{len(variants)}] {name}: {filas[name]['status']}")
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(generate_variant, name, seed, parameters, args.output_dir, args.format):
+                       (name, seed) for name, seed, parameters in variants}
+            for index, future in enumerate(as_completed(futures), start=1):
+                name, seed = futures[future]
+                try:
+                    filas[name] = future.result()
+                except Exception as e:
+                    # El proceso trabajador murió (p. ej. sin memoria); se registra y se sigue
+                    filas[name] = {'name': name, 'seed': seed, 'status': 'error',
+                                   'error': f"Fallo del proceso trabajador: {e}"}
+                print(f"[{index}/{len(variants)}] {name}: {filas[name]['status']}")
+    
+    # Resumen en el orden de la tabla
+    resumen = pd.DataFrame([filas[name] for name, _, _ in variants])
+    resumen_path = os.path.join(args.output_dir, "manifest.csv")
+    resumen.to_csv(resumen_path, index=False)
+    print(f"Resumen del lote guardado en {resumen_path}")
+    
+    fallidas = resumen[resumen['status'] != 'ok']
+    for fila in fallidas.itertuples(index=False):
+        print(f"Error en {fila.name}: {fila.error}")
+    print(f"\nGeneradas {len(resumen) - len(fallidas)}/{len(resumen)} variantes correctamente")
+    return 1 if len(fallidas) else 0
+
+
+def parse_args(argv=None):
+    """Lee los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Phygital Bone - Distribución de osteonas en el fémur")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    generate = subparsers.add_parser("generate",
+                                     help="Genera sin interfaz gráfica las variantes de una tabla de parámetros")
+    generate.add_argument("table",
+                          help="CSV o Excel con una fila por variante; columnas opcionales "
+                               f"'{VARIANT_NAME_COLUMN}', '{VARIANT_SEED_COLUMN}' y cualquier parámetro de "
+                               "DEFAULT_PARAMETERS (los que falten toman su valor por defecto)")
+    generate.add_argument("--output-dir", default="distribution_results",
+                          help="Carpeta raíz de resultados; cada variante tiene su propia subcarpeta")
+    generate.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv",
+                          help="Formato de las osteonas exportadas (por defecto csv)")
+    generate.add_argument("--seed", type=int, default=None,
+                          help="Semilla base para las variantes sin semilla en la tabla "
+                               "(fila i: semilla + i; por defecto, aleatoria)")
+    generate.add_argument("--workers", type=int, default=1,
+                          help="Procesos en paralelo (por defecto 1)")
+    
+    return parser.parse_args(argv)
+
 
 class FemurOsteonaDistributor:
     def __init__(self, root):
@@ -24,48 +720,13 @@ class FemurOsteonaDistributor:
         # Configurar estilo
         self.configure_style()
         
-        # Variables de longitud y proporciones
-        self.femur_length = tk.DoubleVar(value=45.0)  # Valor por defecto en cm
-        self.epiphysis_proximal_percent = tk.DoubleVar(value=15.0)
-        self.metaphysis_proximal_percent = tk.DoubleVar(value=10.0)
-        self.diaphysis_percent = tk.DoubleVar(value=50.0)
-        self.metaphysis_distal_percent = tk.DoubleVar(value=10.0)
-        self.epiphysis_distal_percent = tk.DoubleVar(value=15.0)
-        
-        # Variables de radios anatómicos por sección (en cm)
-        self.radius_epiphysis_proximal = tk.DoubleVar(value=2.5)
-        self.radius_metaphysis_proximal = tk.DoubleVar(value=1.5)
-        self.radius_diaphysis = tk.DoubleVar(value=1.0)
-        self.radius_metaphysis_distal = tk.DoubleVar(value=1.8)
-        self.radius_epiphysis_distal = tk.DoubleVar(value=3.0)
-        
-        # NUEVAS VARIABLES: Grosor cortical por sección (en cm)
-        self.cortical_thickness_epiphysis_proximal = tk.DoubleVar(value=0.25)  # 2.5mm
-        self.cortical_thickness_metaphysis_proximal = tk.DoubleVar(value=0.35)  # 3.5mm
-        self.cortical_thickness_diaphysis = tk.DoubleVar(value=0.45)  # 4.5mm
-        self.cortical_thickness_metaphysis_distal = tk.DoubleVar(value=0.35)  # 3.5mm
-        self.cortical_thickness_epiphysis_distal = tk.DoubleVar(value=0.25)  # 2.5mm
-        
-        # DENSIDADES CORREGIDAS: Basadas en literatura científica (osteonas/cm²)
-        self.density_epiphysis_proximal = tk.DoubleVar(value=1500.0)
-        self.density_metaphysis_proximal = tk.DoubleVar(value=1800.0)
-        self.density_diaphysis = tk.DoubleVar(value=2000.0)
-        self.density_metaphysis_distal = tk.DoubleVar(value=1800.0)
-        self.density_epiphysis_distal = tk.DoubleVar(value=1500.0)
-        
-        # Dimensiones de las osteonas por sección (diámetro en micrómetros)
-        self.osteona_size_epiphysis_proximal = tk.DoubleVar(value=200.0)
-        self.osteona_size_metaphysis_proximal = tk.DoubleVar(value=180.0)
-        self.osteona_size_diaphysis = tk.DoubleVar(value=150.0)
-        self.osteona_size_metaphysis_distal = tk.DoubleVar(value=180.0)
-        self.osteona_size_epiphysis_distal = tk.DoubleVar(value=200.0)
-        
-        # Factor de variabilidad en la distribución
-        self.variability_epiphysis_proximal = tk.DoubleVar(value=0.05)
-        self.variability_metaphysis_proximal = tk.DoubleVar(value=0.05)
-        self.variability_diaphysis = tk.DoubleVar(value=0.05)
-        self.variability_metaphysis_distal = tk.DoubleVar(value=0.05)
-        self.variability_epiphysis_distal = tk.DoubleVar(value=0.05)
+        # Variables de longitud, proporciones y propiedades anatómicas por sección
+        # (mismos nombres y valores por defecto que los parámetros de FemurModel)
+        for name, value in DEFAULT_PARAMETERS.items():
+            setattr(self, name, tk.DoubleVar(value=value))
+        
+        # Semilla de la distribución (vacía = aleatoria; la usada se muestra en los resultados)
+        self.seed = tk.StringVar(value="")
         
         # Crear la interfaz de usuario
         self.create_ui()
@@ -74,6 +735,10 @@ class FemurOsteonaDistributor:
         self.sections_data = None
         self.distribution_data = None
         
+        # Generación en segundo plano: procesos trabajadores y futuros de la generación en curso
+        self.executor = None
+        self.generation_futures = None
+        
         # Calcular inicialmente
         self.calculate()
     
@@ -124,6 +789,10 @@ class FemurOsteonaDistributor:
         ttk.Label(input_frame, text="Longitud del Fémur (cm):").grid(row=0, column=0, padx=5, pady=5, sticky="w")
         ttk.Entry(input_frame, textvariable=self.femur_length, width=10).grid(row=0, column=1, padx=5, pady=5, sticky="w")
         
+        # Semilla para reproducir exactamente una distribución
+        ttk.Label(input_frame, text="Semilla (vacío = aleatoria):").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        ttk.Entry(input_frame, textvariable=self.seed, width=24).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+        
         # Marco para porcentajes de secciones
         sections_frame = ttk.LabelFrame(self.tab_params, text="Proporciones y Propiedades Anatómicas (Solo Zona Cortical)")
         sections_frame.pack(fill="both", expand=False, padx=10, pady=10)
@@ -183,12 +852,30 @@ class FemurOsteonaDistributor:
         ttk.Entry(sections_frame, textvariable=self.variability_epiphysis_distal, width=8).grid(row=5, column=6, padx=5, pady=5, sticky="w")
         
         # Botón de cálculo
-        calculate_button = ttk.Button(
+        self.calculate_button = ttk.Button(
             self.tab_params, 
             text="Calcular Distribución", 
             command=self.calculate
         )
-        calculate_button.pack(pady=10)
+        self.calculate_button.pack(pady=10)
+        
+        # Progreso de la generación (una tarea por sección) y botón para cancelarla
+        progress_frame = ttk.Frame(self.tab_params)
+        progress_frame.pack(fill="x", padx=10)
+        
+        self.progress = ttk.Progressbar(progress_frame, mode="determinate", length=300)
+        self.progress.pack(side="left", padx=5)
+        
+        self.progress_label = ttk.Label(progress_frame, text="")
+        self.progress_label.pack(side="left", padx=5)
+        
+        self.cancel_button = ttk.Button(
+            progress_frame, 
+            text="Cancelar", 
+            command=self.cancel_generation,
+            state="disabled"
+        )
+        self.cancel_button.pack(side="left", padx=5)
         
         # Marco para resultados
         self.results_frame = ttk.LabelFrame(self.tab_params, text="Resultados del Cálculo")
@@ -245,6 +932,24 @@ class FemurOsteonaDistributor:
             command=lambda: self.export_data("json")
         ).pack(fill="x", padx=10, pady=5)
         
+        ttk.Button(
+            export_frame, 
+            text="Exportar a Parquet (float32)", 
+            command=lambda: self.export_data("parquet")
+        ).pack(fill="x", padx=10, pady=5)
+        
+        ttk.Button(
+            export_frame, 
+            text="Exportar a NPZ (float32)", 
+            command=lambda: self.export_data("npz")
+        ).pack(fill="x", padx=10, pady=5)
+        
+        ttk.Button(
+            export_frame, 
+            text="Exportar Nube de Puntos Binaria", 
+            command=lambda: self.export_data("bin")
+        ).pack(fill="x", padx=10, pady=5)
+        
         ttk.Button(
             export_frame, 
             text="Exportar Informe Completo", 
@@ -265,130 +970,34 @@ class FemurOsteonaDistributor:
     
     def calculate(self):
         try:
-            # Obtener la longitud total
-            total_length = self.femur_length.get()
-            
-            # Verificar que los porcentajes suman 100%
-            total_percent = (
-                self.epiphysis_proximal_percent.get() +
-                self.metaphysis_proximal_percent.get() +
-                self.diaphysis_percent.get() +
-                self.metaphysis_distal_percent.get() +
-                self.epiphysis_distal_percent.get()
-            )
-            
-            if abs(total_percent - 100.0) > 0.01:
-                messagebox.showwarning("Advertencia", 
-                                      f"Los porcentajes de las secciones suman {total_percent}%, no 100%")
+            # Semilla de la distribución: la indicada o una nueva aleatoria
+            seed_text = str(self.seed.get()).strip()
+            if seed_text and not seed_text.isdigit():
+                messagebox.showwarning("Advertencia", f"La semilla debe ser un número entero no negativo: {seed_text}")
                 return
             
-            # Calcular longitudes absolutas de cada sección
-            ep_prox_length = total_length * (self.epiphysis_proximal_percent.get() / 100)
-            met_prox_length = total_length * (self.metaphysis_proximal_percent.get() / 100)
-            dia_length = total_length * (self.diaphysis_percent.get() / 100)
-            met_dist_length = total_length * (self.metaphysis_distal_percent.get() / 100)
-            ep_dist_length = total_length * (self.epiphysis_distal_percent.get() / 100)
-            
-            # Calcular puntos de inicio y fin de cada sección
-            ep_prox_start = 0
-            ep_prox_end = ep_prox_length
-            
-            met_prox_start = ep_prox_end
-            met_prox_end = met_prox_start + met_prox_length
-            
-            dia_start = met_prox_end
-            dia_end = dia_start + dia_length
-            
-            met_dist_start = dia_end
-            met_dist_end = met_dist_start + met_dist_length
-            
-            ep_dist_start = met_dist_end
-            ep_dist_end = total_length
-            
-            # ALMACENAR DATOS DE SECCIONES CON RADIOS Y GROSOR CORTICAL
-            self.sections_data = {
-                "total_length_cm": total_length,
-                "sections": [
-                    {
-                        "name": "Epífisis Proximal",
-                        "start_cm": ep_prox_start,
-                        "end_cm": ep_prox_end,
-                        "length_cm": ep_prox_length,
-                        "percent": self.epiphysis_proximal_percent.get(),
-                        "radius_cm": self.radius_epiphysis_proximal.get(),
-                        "cortical_thickness": self.cortical_thickness_epiphysis_proximal.get(),
-                        "density_per_cm2": self.density_epiphysis_proximal.get(),
-                        "osteona_size_um": self.osteona_size_epiphysis_proximal.get(),
-                        "variability": self.variability_epiphysis_proximal.get()
-                    },
-                    {
-                        "name": "Metáfisis Proximal",
-                        "start_cm": met_prox_start,
-                        "end_cm": met_prox_end,
-                        "length_cm": met_prox_length,
-                        "percent": self.metaphysis_proximal_percent.get(),
-                        "radius_cm": self.radius_metaphysis_proximal.get(),
-                        "cortical_thickness": self.cortical_thickness_metaphysis_proximal.get(),
-                        "density_per_cm2": self.density_metaphysis_proximal.get(),
-                        "osteona_size_um": self.osteona_size_metaphysis_proximal.get(),
-                        "variability": self.variability_metaphysis_proximal.get()
-                    },
-                    {
-                        "name": "Diáfisis",
-                        "start_cm": dia_start,
-                        "end_cm": dia_end,
-                        "length_cm": dia_length,
-                        "percent": self.diaphysis_percent.get(),
-                        "radius_cm": self.radius_diaphysis.get(),
-                        "cortical_thickness": self.cortical_thickness_diaphysis.get(),
-                        "density_per_cm2": self.density_diaphysis.get(),
-                        "osteona_size_um": self.osteona_size_diaphysis.get(),
-                        "variability": self.variability_diaphysis.get()
-                    },
-                    {
-                        "name": "Metáfisis Distal",
-                        "start_cm": met_dist_start,
-                        "end_cm": met_dist_end,
-                        "length_cm": met_dist_length,
-                        "percent": self.metaphysis_distal_percent.get(),
-                        "radius_cm": self.radius_metaphysis_distal.get(),
-                        "cortical_thickness": self.cortical_thickness_metaphysis_distal.get(),
-                        "density_per_cm2": self.density_metaphysis_distal.get(),
-                        "osteona_size_um": self.osteona_size_metaphysis_distal.get(),
-                        "variability": self.variability_metaphysis_distal.get()
-                    },
-                    {
-                        "name": "Epífisis Distal",
-                        "start_cm": ep_dist_start,
-                        "end_cm": ep_dist_end,
-                        "length_cm": ep_dist_length,
-                        "percent": self.epiphysis_distal_percent.get(),
-                        "radius_cm": self.radius_epiphysis_distal.get(),
-                        "cortical_thickness": self.cortical_thickness_epiphysis_distal.get(),
-                        "density_per_cm2": self.density_epiphysis_distal.get(),
-                        "osteona_size_um": self.osteona_size_epiphysis_distal.get(),
-                        "variability": self.variability_epiphysis_distal.get()
-                    }
-                ]
-            }
+            # Modelo con los valores de los campos y datos de las secciones
+            model = FemurModel(int(seed_text) if seed_text else None,
+                               **{name: getattr(self, name).get() for name in DEFAULT_PARAMETERS})
+            try:
+                self.sections_data = model.sections_data()
+            except ValueError as e:
+                messagebox.showwarning("Advertencia", str(e))
+                return
             
-            # Generar distribución de osteonas
+            # Generar distribución de osteonas en segundo plano; los resultados se muestran
+            # al terminar (ver poll_generation)
             self.generate_osteona_distribution()
             
-            # Mostrar resultados
-            self.display_results()
-            
-            # Actualizar visualización y previsualización
-            self.update_visualization()
-            self.update_preview()
-            
         except Exception as e:
             messagebox.showerror("Error", f"Error en el cálculo: {str(e)}")
             raise e
         
     def close_app(self):
-        import sys
         try:
+            self.cancel_generation()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
             plt.close('all')
             self.root.quit()
             self.root.destroy()
@@ -397,195 +1006,102 @@ class FemurOsteonaDistributor:
         sys.exit()
         
     def generate_osteona_distribution(self):
-        """Genera distribución anatómicamente correcta solo en zona cortical"""
-        distribution_data = []
+        """
+        Genera distribución anatómicamente correcta solo en zona cortical
         
-        # Para cada sección, generar las osteonas principales
-        for i, section in enumerate(self.sections_data["sections"]):
-            # Calcular área SOLO de la zona cortical (anillo exterior)
-            radio_externo = section["radius_cm"]
-            radio_interno = max(0, radio_externo - section["cortical_thickness"])
-            cortical_area = math.pi * (radio_externo**2 - radio_interno**2)
-            
-            # Calcular número de osteonas usando densidad real aplicada solo al área cortical
-            num_osteonas = int(cortical_area * section["density_per_cm2"])
-            
-            section_osteonas = []
-            
-            # Generar osteonas principales con distribución mejorada
-            for j in range(num_osteonas):
-                # Coordenadas X,Y SOLO dentro de la zona cortical
-                x, y = self.generate_xy_position(
-                    section["radius_cm"], 
-                    section["cortical_thickness"], 
-                    section["variability"]
-                )
-                
-                # Posición longitudinal Z con distribución mejorada
-                pos_z = self.generate_position_improved(
-                    0, 
-                    section["length_cm"], 
-                    section["variability"]
-                )
-                
-                # Posición absoluta en el hueso
-                abs_pos_z = section["start_cm"] + pos_z
-                
-                # Calcular tamaño aleatorio de la osteona
-                size_variation = 0.2
-                size = section["osteona_size_um"] * (1 + random.uniform(-size_variation, size_variation))
-                
-                # Agregar osteona
-                section_osteonas.append({
-                    "section_name": section["name"],
-                    "position_x_cm": x,
-                    "position_y_cm": y,
-                    "position_z_cm": abs_pos_z,
-                    "size_um": size
-                })
-            
-            distribution_data.extend(section_osteonas)
-            
-            # Añadir osteonas de transición entre secciones
-            if i < len(self.sections_data["sections"]) - 1:  # Si no es la última sección
-                next_section = self.sections_data["sections"][i + 1]
-                transition_osteonas = self.generate_transition_osteonas(section, next_section)
-                distribution_data.extend(transition_osteonas)
+        Las secciones se generan en paralelo en procesos trabajadores, fuera del hilo de la
+        interfaz; poll_generation informa del progreso y muestra el resultado al terminar.
+        """
+        self.cancel_generation()
         
-        # Guardar los datos
-        self.distribution_data = distribution_data
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=min(len(self.sections_data["sections"]), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        
+        futures = submit_distribution(self.executor, self.sections_data, self.sections_data["seed"])
+        self.generation_futures = futures
+        self.set_generating(True, len(futures))
+        self.root.after(POLL_INTERVAL_MS, self.poll_generation, futures)
     
-    def generate_xy_position(self, radius_cm, cortical_thickness, variability):
-        """
-        Genera coordenadas X,Y SOLO en la zona cortical (anillo exterior)
+    def poll_generation(self, futures):
+        """Actualiza el progreso de la generación y, al terminar, une y muestra los resultados"""
+        if futures is not self.generation_futures:
+            return  # Generación cancelada o sustituida por otra
+        
+        done = sum(future.done() for future in futures)
+        self.progress.configure(value=done)
+        self.progress_label.configure(text=f"Generando secciones: {done}/{len(futures)}")
+        if done < len(futures):
+            self.root.after(POLL_INTERVAL_MS, self.poll_generation, futures)
+            return
         
-        Args:
-            radius_cm: Radio total de la sección en cm
-            cortical_thickness: Grosor de la zona cortical en cm
-            variability: Factor de variabilidad para la distribución
-            
-        Returns:
-            Tupla (x, y) en cm dentro de la zona cortical
-        """
-        radio_interno = max(0, radius_cm - cortical_thickness)
-        radio_externo = radius_cm
-        
-        # Generar ángulo aleatorio
-        angle = random.uniform(0, 2 * math.pi)
-        
-        # Generar radio SOLO en la zona cortical
-        if variability < 0.3:
-            # Distribución uniforme en la zona cortical
-            r = random.uniform(radio_interno, radio_externo)
-        elif variability < 0.7:
-            # Distribución con tendencia hacia el centro de la zona cortical
-            centro_cortical = (radio_interno + radio_externo) / 2
-            desviacion = (radio_externo - radio_interno) / 4
-            r = np.random.normal(centro_cortical, desviacion)
-            r = max(radio_interno, min(radio_externo, r))  # Asegurar que esté en rango
-        else:
-            # Variabilidad alta: más concentración en el borde exterior
-            if random.random() < 0.7:  # 70% cerca del borde exterior
-                r = random.uniform(radio_externo * 0.9, radio_externo)
-            else:  # 30% distribuido uniformemente en zona cortical
-                r = random.uniform(radio_interno, radio_externo)
-        
-        # Convertir coordenadas polares a cartesianas
-        x = r * math.cos(angle)
-        y = r * math.sin(angle)
-        
-        return x, y
-    
-    def generate_transition_osteonas(self, section1, section2):
-        """
-        Genera osteonas en la zona de transición entre dos secciones
-        SOLO en la zona cortical
-        """
-        transition_osteonas = []
-        
-        # Zona de transición: 0.5 cm antes y después del límite entre secciones
-        transition_zone = 0.5  # cm
-        transition_start = max(0, section1["end_cm"] - transition_zone)
-        transition_end = min(self.sections_data["total_length_cm"], section2["start_cm"] + transition_zone)
-        transition_length = transition_end - transition_start
-        
-        if transition_length <= 0:
-            return transition_osteonas
-        
-        # Calcular parámetros de transición
-        avg_radius = (section1["radius_cm"] + section2["radius_cm"]) / 2
-        avg_cortical_thickness = (section1["cortical_thickness"] + section2["cortical_thickness"]) / 2
-        avg_density = (section1["density_per_cm2"] + section2["density_per_cm2"]) / 2
-        avg_size = (section1["osteona_size_um"] + section2["osteona_size_um"]) / 2
-        
-        # Área cortical de transición
-        radio_externo = avg_radius
-        radio_interno = max(0, radio_externo - avg_cortical_thickness)
-        transition_cortical_area = math.pi * (radio_externo**2 - radio_interno**2)
-        
-        # Número de osteonas de transición (30% de la densidad normal)
-        num_transition = int(transition_cortical_area * avg_density * 0.3 * (transition_length / section1["length_cm"]))
-        
-        # Generar osteonas de transición
-        for i in range(num_transition):
-            # Coordenadas X,Y SOLO en zona cortical de transición
-            x, y = self.generate_xy_position(avg_radius, avg_cortical_thickness, 0.2)
-            
-            # Coordenada Z en la zona de transición
-            pos_z = random.uniform(transition_start, transition_end)
-            
-            # Tamaño promedio
-            size = avg_size * (1 + random.uniform(-0.1, 0.1))  # Menor variación
-            
-            # Determinar nombre de sección (más cercana)
-            if pos_z < section1["end_cm"]:
-                section_name = section1["name"]
-            else:
-                section_name = section2["name"]
-            
-            transition_osteonas.append({
-                "section_name": f"{section_name} (transición)",
-                "position_x_cm": x,
-                "position_y_cm": y,
-                "position_z_cm": pos_z,
-                "size_um": size
-            })
+        self.generation_futures = None
+        self.set_generating(False)
+        try:
+            self.distribution_data = merge_sections([future.result() for future in futures])
+        except Exception as e:
+            # El grupo de procesos puede haber quedado inservible (p. ej. BrokenProcessPool
+            # si un trabajador murió): se cierra y la siguiente generación crea uno nuevo
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            self.progress.configure(value=0)
+            self.progress_label.configure(text="")
+            messagebox.showerror("Error", f"Error en el cálculo: {str(e)}")
+            return
+        
+        self.progress_label.configure(text=f"Distribución generada: {len(self.distribution_data):,} osteonas")
+        
+        # Mostrar resultados
+        self.display_results()
         
-        return transition_osteonas
+        # Actualizar visualización y previsualización
+        self.update_visualization()
+        self.update_preview()
     
-    def generate_position_improved(self, min_val, max_val, variability):
+    def cancel_generation(self):
         """
-        Genera una posición aleatoria con distribución más uniforme
-        y menos concentración extrema en los bordes
+        Cancela la generación en curso, si la hay
+        
+        Las secciones pendientes no llegan a ejecutarse. Las que ya se están generando no se
+        pueden interrumpir: su grupo de procesos se cierra sin esperarlas y la siguiente
+        generación usa uno nuevo, de modo que no queda en cola detrás de ellas.
         """
-        # Para variabilidad muy baja, distribución completamente uniforme
-        if variability < 0.2:
-            return random.uniform(min_val, max_val)
-        
-        # Para variabilidad baja-media, distribución normal centrada
-        elif variability < 0.4:
-            mean = (max_val + min_val) / 2
-            std_dev = (max_val - min_val) / 8  # Más concentración hacia el centro
-            val = np.random.normal(mean, std_dev)
-            # Asegurar que el valor está dentro del rango
-            return max(min_val, min(max_val, val))
-        
-        # Para variabilidad media-alta, distribución mixta más suave
-        else:
-            # 60% distribución normal centrada, 40% uniforme
-            if random.random() < 0.6:
-                mean = (max_val + min_val) / 2
-                std_dev = (max_val - min_val) / 6
-                val = np.random.normal(mean, std_dev)
-                return max(min_val, min(max_val, val))
-            else:
-                return random.uniform(min_val, max_val)
+        if self.generation_futures is None:
+            return
+        
+        futures = self.generation_futures
+        self.generation_futures = None
+        for future in futures:
+            future.cancel()
+        if any(future.running() for future in futures):
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        
+        self.set_generating(False)
+        self.progress.configure(value=0)
+        self.progress_label.configure(text="Generación cancelada")
+    
+    def set_generating(self, active, num_tasks=0):
+        """Activa o desactiva los controles mientras se genera una distribución"""
+        if active:
+            self.progress.configure(maximum=num_tasks, value=0)
+            self.progress_label.configure(text=f"Generando secciones: 0/{num_tasks}")
+        self.calculate_button.configure(state="disabled" if active else "normal")
+        self.cancel_button.configure(state="normal" if active else "disabled")
     
     def generate_position(self, min_val, max_val, variability):
         """
         Función original mantenida para compatibilidad
         """
-        return self.generate_position_improved(min_val, max_val, variability)
+        return float(sample_positions(1, min_val, max_val, variability, np.random.default_rng())[0])
+    
+    @property
+    def has_distribution(self):
+        """True si hay una distribución generada con al menos una osteona"""
+        return self.distribution_data is not None and not self.distribution_data.empty
     
     def display_results(self):
         """Muestra los resultados incluyendo información de zona cortical"""
@@ -598,7 +1114,8 @@ class FemurOsteonaDistributor:
         # Mostrar información general
         self.results_text.insert(tk.END, f"FÉMUR CON ZONA CORTICAL REALISTA\n")
         self.results_text.insert(tk.END, f"{'='*50}\n\n")
-        self.results_text.insert(tk.END, f"Longitud total del fémur: {self.sections_data['total_length_cm']:.2f} cm\n\n")
+        self.results_text.insert(tk.END, f"Longitud total del fémur: {self.sections_data['total_length_cm']:.2f} cm\n")
+        self.results_text.insert(tk.END, f"Semilla: {self.sections_data['seed']}\n\n")
         
         # Mostrar información de cada sección con áreas corticales
         total_cortical_area = 0
@@ -633,26 +1150,19 @@ class FemurOsteonaDistributor:
         self.results_text.insert(tk.END, f"Área cortical total: {total_cortical_area:.2f} cm²\n")
         self.results_text.insert(tk.END, f"Osteonas calculadas: {total_osteonas_calculated:,}\n")
         
-        if self.distribution_data:
+        if self.has_distribution:
             num_osteonas = len(self.distribution_data)
             self.results_text.insert(tk.END, f"Osteonas generadas: {num_osteonas:,}\n")
             self.results_text.insert(tk.END, f"Densidad promedio: {num_osteonas/total_cortical_area:.0f} ost/cm²\n\n")
             
             # Contar osteonas por sección
-            section_counts = {}
-            for osteona in self.distribution_data:
-                section = osteona["section_name"]
-                if section not in section_counts:
-                    section_counts[section] = 0
-                section_counts[section] += 1
-            
             self.results_text.insert(tk.END, "DISTRIBUCIÓN POR SECCIÓN:\n")
-            for section, count in section_counts.items():
+            for section, count in section_counts(self.distribution_data).items():
                 self.results_text.insert(tk.END, f"  - {section}: {count:,} osteonas ({count/num_osteonas*100:.1f}%)\n")
     
     def update_visualization(self):
         """Visualización mejorada con forma anatómica"""
-        if not self.sections_data or not self.distribution_data:
+        if not self.sections_data or not self.has_distribution:
             return
             
         # Limpiar los ejes
@@ -716,17 +1226,17 @@ class FemurOsteonaDistributor:
         self.ax1.set_aspect('equal', adjustable='box')
         
         # GRÁFICO 2: Distribución de osteonas a lo largo del fémur (VUELTA AL FORMATO ORIGINAL)
-        z_positions = [osteona["position_z_cm"] for osteona in self.distribution_data]
-        sizes = [osteona["size_um"] for osteona in self.distribution_data]
-        colors_scatter = []
-        
-        # Asignar colores según la sección
-        for osteona in self.distribution_data:
-            section_name = osteona["section_name"]
-            # Buscar color de la sección base (sin "(transición)")
-            base_section_name = section_name.replace(" (transición)", "")
-            idx = next((i for i, s in enumerate(self.sections_data["sections"]) if s["name"] == base_section_name), 0)
-            colors_scatter.append(colors[idx])
+        z_positions = self.distribution_data["position_z_cm"].to_numpy()
+        sizes = self.distribution_data["size_um"].to_numpy()
+        
+        # Asignar colores según la sección base (sin "(transición)") de cada categoría
+        section_names = [s["name"] for s in self.sections_data["sections"]]
+        category_colors = np.array([
+            colors[section_names.index(name.replace(TRANSITION_SUFFIX, ""))]
+            if name.replace(TRANSITION_SUFFIX, "") in section_names else colors[0]
+            for name in self.distribution_data["section_name"].cat.categories
+        ])
+        colors_scatter = category_colors[self.distribution_data["section_name"].cat.codes.to_numpy()]
         
         # Crear scatter plot de distribución longitudinal
         self.ax2.scatter(z_positions, sizes, c=colors_scatter, s=8, alpha=0.7)
@@ -743,9 +1253,9 @@ class FemurOsteonaDistributor:
         self.ax2.grid(True, linestyle='--', alpha=0.3)
         
         # Establecer límites del eje Y para mostrar el rango completo de tamaños
-        if sizes:
-            min_size = min(sizes)
-            max_size = max(sizes)
+        if len(sizes):
+            min_size = sizes.min()
+            max_size = sizes.max()
             padding = (max_size - min_size) * 0.1
             self.ax2.set_ylim(min_size - padding, max_size + padding)
         
@@ -753,8 +1263,8 @@ class FemurOsteonaDistributor:
         self.ax2.set_xlim(0, self.sections_data["total_length_cm"])
         
         # Añadir información estadística
-        if self.distribution_data:
-            stats_text = f'Rango: {min(sizes):.0f}-{max(sizes):.0f} μm\n'
+        if self.has_distribution:
+            stats_text = f'Rango: {sizes.min():.0f}-{sizes.max():.0f} μm\n'
             stats_text += f'Promedio: {np.mean(sizes):.1f} μm\n'
             stats_text += f'Total osteonas: {len(self.distribution_data):,}'
             
@@ -787,7 +1297,7 @@ class FemurOsteonaDistributor:
     
     def update_preview(self):
         """Previsualización con coordenadas X,Y,Z"""
-        if not self.distribution_data:
+        if not self.has_distribution:
             return
             
         # Limpiar el área de previsualización
@@ -800,12 +1310,11 @@ class FemurOsteonaDistributor:
         self.preview_text.insert(tk.END, "section_name, position_x_cm, position_y_cm, position_z_cm, size_um\n")
         self.preview_text.insert(tk.END, "-" * 70 + "\n")
         
-        for i in range(num_preview):
-            osteona = self.distribution_data[i]
+        for osteona in self.distribution_data.head(num_preview).itertuples(index=False):
             self.preview_text.insert(
                 tk.END, 
-                f"{osteona['section_name']}, {osteona['position_x_cm']:.3f}, {osteona['position_y_cm']:.3f}, "
-                f"{osteona['position_z_cm']:.3f}, {osteona['size_um']:.2f}\n"
+                f"{osteona.section_name}, {osteona.position_x_cm:.3f}, {osteona.position_y_cm:.3f}, "
+                f"{osteona.position_z_cm:.3f}, {osteona.size_um:.2f}\n"
             )
         
         self.preview_text.insert(tk.END, f"\n... (Total: {len(self.distribution_data):,} registros)\n\n")
@@ -817,42 +1326,23 @@ class FemurOsteonaDistributor:
     
     def export_data(self, format_type):
         """Exporta los datos de zona cortical"""
-        if not self.distribution_data:
+        if not self.has_distribution:
             messagebox.showwarning("Advertencia", "No hay datos para exportar.")
             return
             
         # Determinar la ruta del archivo
-        if format_type == "csv":
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV", "*.csv")],
-                title="Exportar a CSV"
-            )
-        else:  # JSON
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                filetypes=[("JSON", "*.json")],
-                title="Exportar a JSON"
-            )
+        extension, description = EXPORT_FORMATS[format_type]
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=extension,
+            filetypes=[(description, f"*{extension}")],
+            title=f"Exportar a {description}"
+        )
         
         if not file_path:
             return
             
         try:
-            if format_type == "csv":
-                # Convertir a DataFrame y guardar como CSV
-                df = pd.DataFrame(self.distribution_data)
-                df = df.sort_values(by='position_z_cm', ascending=True)
-                df.to_csv(file_path, index=False)
-            else:  # JSON
-                sorted_data = sorted(self.distribution_data, key=lambda x: x['position_z_cm'])
-                data = {
-                    "femur_info": self.sections_data,
-                    "osteonas": sorted_data
-                }
-                
-                with open(file_path, 'w') as f:
-                    json.dump(data, f, indent=4)
+            write_distribution(self.distribution_data, self.sections_data, file_path, format_type)
             
             messagebox.showinfo("Éxito", f"Datos de zona cortical exportados a {file_path}")
         except Exception as e:
@@ -860,7 +1350,7 @@ class FemurOsteonaDistributor:
     
     def export_report(self):
         """Exporta un informe completo de zona cortical"""
-        if not self.sections_data or not self.distribution_data:
+        if not self.sections_data or not self.has_distribution:
             messagebox.showwarning("Advertencia", "No hay datos para generar un informe.")
             return
             
@@ -878,8 +1368,7 @@ class FemurOsteonaDistributor:
             
             # Guardar los datos en CSV
             csv_path = os.path.join(project_folder, "osteonas_zona_cortical.csv")
-            df = pd.DataFrame(self.distribution_data)
-            df.to_csv(csv_path, index=False)
+            self.distribution_data.to_csv(csv_path, index=False)
             
             # Guardar la configuración en JSON
             config_path = os.path.join(project_folder, "configuracion_cortical.json")
@@ -900,16 +1389,11 @@ class FemurOsteonaDistributor:
     
     def generate_html_report(self, html_path):
         """Genera un informe HTML de zona cortical"""
-        section_counts = {}
-        for osteona in self.distribution_data:
-            section = osteona["section_name"]
-            if section not in section_counts:
-                section_counts[section] = 0
-            section_counts[section] += 1
+        counts = section_counts(self.distribution_data)
         
         # Calcular área cortical total
         total_cortical_area = sum(
-            math.pi * (section['radius_cm']**2 - max(0, section['radius_cm'] - section['cortical_thickness'])**2)
+            cortical_area_cm2(section['radius_cm'], section['cortical_thickness'])
             for section in self.sections_data["sections"]
         )
         
@@ -937,6 +1421,7 @@ class FemurOsteonaDistributor:
             <div>
                 <h2>Parámetros Anatómicos del Fémur - Zona Cortical</h2>
                 <p>Longitud total: {self.sections_data['total_length_cm']:.2f} cm</p>
+                <p>Semilla: {self.sections_data['seed']}</p>
                 <p class="cortical">Área cortical total: {total_cortical_area:.2f} cm²</p>
                 <p>Las osteonas se generan ÚNICAMENTE en la zona cortical (anillo exterior)</p>
                 
@@ -957,7 +1442,7 @@ class FemurOsteonaDistributor:
             radio_externo = section['radius_cm']
             radio_interno = max(0, radio_externo - section['cortical_thickness'])
             cortical_area = math.pi * (radio_externo**2 - radio_interno**2)
-            osteonas_count = section_counts.get(section['name'], 0)
+            osteonas_count = counts.get(section['name'], 0)
             
             html_content += f"""
                     <tr>
@@ -995,7 +1480,18 @@ class FemurOsteonaDistributor:
         with open(html_path, 'w', encoding='utf-8') as f:
             f.write(html_content)
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Función principal del programa"""
+    args = parse_args(argv)
+    
+    # Modo sin interfaz gráfica
+    if args.command == "generate":
+        return run_batch(args)
+    
     root = tk.Tk()
     app = FemurOsteonaDistributor(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Módulos compartidos entre las aplicaciones de Histology Bone Analyzer."""
@@ -0,0 +1,279 @@
+"""
+Tabla de detecciones de canales de Havers compartida por detection_app y breaking_app.
+
+Define los nombres y tipos de columna del archivo de detecciones, su lectura y
+escritura en Parquet (formato de intercambio entre aplicaciones), utilidades para
+leerlas como valores numéricos, la supresión de duplicados entre segmentos solapados
+y una caché de archivos ya leídos.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Columnas del archivo de detecciones generado por detection_app
+CENTER_X = 'Center X'
+CENTER_Y = 'Center Y'
+SEGMENT_ID = 'Segment ID'
+ELLIPSE_AREA = 'Ellipse Area (pixels^2)'
+CONFIDENCE = 'Confidence'
+BOX_WIDTH = 'Box Width (pixels)'
+BOX_HEIGHT = 'Box Height (pixels)'
+SLIDE_ID = 'Slide ID'
+
+DETECTION_COLUMNS = [CENTER_X, CENTER_Y, SEGMENT_ID, ELLIPSE_AREA, CONFIDENCE, BOX_WIDTH, BOX_HEIGHT]
+
+# Esquema del archivo de detecciones: columnas y tipo de cada una
+DETECTION_SCHEMA = {
+    CENTER_X: 'float64',
+    CENTER_Y: 'float64',
+    SEGMENT_ID: 'int32',
+    ELLIPSE_AREA: 'float64',
+    CONFIDENCE: 'float32',
+    BOX_WIDTH: 'float32',
+    BOX_HEIGHT: 'float32',
+    SLIDE_ID: 'string',
+}
+
+# Nombres de archivo estándar dentro de la carpeta de resultados
+DETECTIONS_FILENAME = 'detections.parquet'
+EXCEL_FILENAME = 'bounding_box_centers.xlsx'
+
+# Extensiones que se leen como Excel (archivos generados por versiones anteriores)
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+# Fracción de la caja más pequeña que debe solaparse para considerar dos detecciones duplicadas
+DEFAULT_DUPLICATE_THRESHOLD = 0.5
+
+# Tamaño de bloque (en bytes) al calcular el hash de un archivo de detecciones
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def empty_detections():
+    """DataFrame de detecciones vacío con las columnas y tipos de DETECTION_SCHEMA (sin Slide ID)."""
+    return pd.DataFrame({column: np.zeros(0, dtype=DETECTION_SCHEMA[column]) for column in DETECTION_COLUMNS})
+
+
+def numeric_column(values):
+    """
+    Convierte una columna de detecciones a un array float64.
+    
+    Los archivos antiguos guardaban tensores de torch como texto ("tensor(123.4)");
+    en ese caso el número se extrae de toda la columna de una vez. Los valores que no
+    se pueden interpretar quedan como NaN.
+    """
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float64)
+    
+    text = series.astype(str)
+    is_tensor = text.str.contains('tensor', regex=False)
+    text = text.where(~is_tensor, text.str.extract(r'\(([^)]*)\)', expand=False))
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def detection_boxes(df):
+    """Reconstruye las cajas [x1, y1, x2, y2] (n, 4) a partir de centros, ancho y alto."""
+    cx = numeric_column(df[CENTER_X])
+    cy = numeric_column(df[CENTER_Y])
+    half_w = numeric_column(df[BOX_WIDTH]) / 2
+    half_h = numeric_column(df[BOX_HEIGHT]) / 2
+    return np.column_stack([cx - half_w, cy - half_h, cx + half_w, cy + half_h])
+
+
+def detection_points(df):
+    """Devuelve un array (n, 2) float64 con las columnas Center X / Center Y."""
+    return np.column_stack([numeric_column(df[CENTER_X]), numeric_column(df[CENTER_Y])])
+
+
+def suppress_duplicate_detections(boxes, scores, segment_ids, threshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """
+    Supresión de no máximos (NMS) voraz entre detecciones de segmentos distintos.
+    
+    Dos cajas se consideran la misma detección cuando su intersección supera `threshold`
+    veces el área de la caja más pequeña; así se fusionan también las cajas parciales
+    que un segmento recorta en su borde. Solo se comparan cajas de segmentos distintos:
+    YOLO ya suprime los duplicados dentro de cada segmento, y como cada caja está dentro
+    de la ventana de su segmento, dos cajas de segmentos distintos solo pueden solaparse
+    en la zona de solapamiento entre ambas ventanas. Los canales anidados o contiguos de
+    un mismo segmento se conservan siempre.
+    
+    Las cajas se recorren de mayor a menor confianza y solo las que se conservan
+    suprimen a otras (una caja ya suprimida no elimina a sus vecinas). Los pares
+    candidatos se obtienen con un barrido ordenado en X, sin construir ninguna matriz n×n.
+    
+    Args:
+        boxes: Array (n, 4) con cajas [x1, y1, x2, y2] en coordenadas globales
+        scores: Array (n,) con la confianza de cada caja
+        segment_ids: Array (n,) con el segmento del que procede cada caja
+        threshold: Solapamiento mínimo (0-1) para considerar dos cajas duplicadas
+    
+    Returns:
+        Índices (ordenados) de las cajas que se conservan
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    segment_ids = np.asarray(segment_ids).ravel()
+    n = len(boxes)
+    if n < 2:
+        return np.arange(n)
+    
+    # Rango de cada caja por confianza (0 = la más confiable); desempata por orden original
+    rank = np.empty(n, dtype=np.intp)
+    rank[np.argsort(-scores, kind='stable')] = np.arange(n)
+    
+    # Ordenar por x1: solo pueden solaparse las cajas j > i con x1[j] < x2[i]
+    order = np.argsort(boxes[:, 0], kind='stable')
+    x1, y1, x2, y2 = boxes[order].T
+    ends = np.searchsorted(x1, x2, side='left')
+    counts = np.maximum(ends - np.arange(n) - 1, 0)
+    if counts.sum() == 0:
+        return np.arange(n)
+    
+    pair_i = np.repeat(np.arange(n), counts)
+    pair_j = pair_i + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Solo pares de segmentos distintos
+    sorted_segments = segment_ids[order]
+    different = sorted_segments[pair_i] != sorted_segments[pair_j]
+    pair_i, pair_j = pair_i[different], pair_j[different]
+    
+    # Intersección relativa al área de la caja más pequeña de cada par
+    inter_w = np.clip(np.minimum(x2[pair_i], x2[pair_j]) - np.maximum(x1[pair_i], x1[pair_j]), 0, None)
+    inter_h = np.clip(np.minimum(y2[pair_i], y2[pair_j]) - np.maximum(y1[pair_i], y1[pair_j]), 0, None)
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    smaller_area = np.maximum(np.minimum(areas[pair_i], areas[pair_j]), 1e-12)
+    duplicated = inter_w * inter_h / smaller_area > threshold
+    
+    keep = np.ones(n, dtype=bool)
+    if not duplicated.any():
+        return np.arange(n)
+    
+    # Cada par duplicado como (caja de mayor confianza, caja de menor confianza), agrupado
+    # por la de mayor confianza y en orden de confianza decreciente
+    pair_i = order[pair_i[duplicated]]
+    pair_j = order[pair_j[duplicated]]
+    first_wins = rank[pair_i] < rank[pair_j]
+    winners = np.where(first_wins, pair_i, pair_j)
+    losers = np.where(first_wins, pair_j, pair_i)
+    by_rank = np.argsort(rank[winners], kind='stable')
+    winners, losers = winners[by_rank], losers[by_rank]
+    starts = np.flatnonzero(np.r_[True, winners[1:] != winners[:-1]])
+    
+    # NMS voraz: cuando se llega a una caja ya se ha decidido si la suprime otra más
+    # confiable; solo si se conserva suprime a sus duplicados de menor confianza
+    for start, end in zip(starts, np.r_[starts[1:], len(winners)]):
+        if keep[winners[start]]:
+            keep[losers[start:end]] = False
+    return np.flatnonzero(keep)
+
+
+def typed_detections(df, slide_id=None):
+    """
+    Devuelve una copia de las detecciones con las columnas y tipos de DETECTION_SCHEMA.
+    
+    Las columnas que falten (p. ej. en archivos Excel antiguos) se rellenan con NaN;
+    si no hay columna Slide ID se usa slide_id para todas las filas.
+    """
+    typed = {}
+    for column, dtype in DETECTION_SCHEMA.items():
+        if column == SLIDE_ID:
+            values = df[column].to_numpy() if column in df else [slide_id] * len(df)
+            typed[column] = pd.array(values, dtype='string')
+        elif column not in df:
+            typed[column] = np.full(len(df), -1 if column == SEGMENT_ID else np.nan).astype(dtype)
+        elif column == SEGMENT_ID:
+            typed[column] = np.nan_to_num(numeric_column(df[column]), nan=-1).astype(dtype)
+        else:
+            typed[column] = numeric_column(df[column]).astype(dtype)
+    return pd.DataFrame(typed)
+
+
+def write_detections(df, path, slide_id=None):
+    """Guarda las detecciones en Parquet con el esquema tipado y devuelve la tabla escrita."""
+    typed = typed_detections(df, slide_id)
+    typed.to_parquet(path, index=False)
+    return typed
+
+
+def read_detections(path, columns=None):
+    """
+    Lee un archivo de detecciones y devuelve la tabla con el esquema tipado.
+    
+    Acepta el formato Parquet actual y, por compatibilidad, archivos Excel (.xlsx)
+    generados por versiones anteriores de detection_app.
+    """
+    if path.lower().endswith(EXCEL_EXTENSIONS):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_parquet(path, columns=columns)
+    
+    typed = typed_detections(df)
+    return typed[columns] if columns is not None else typed
+
+
+def export_detections_excel(df, path):
+    """Exporta las detecciones a Excel (solo para consulta; el formato de intercambio es Parquet)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df.to_excel(path, index=False)
+    return path
+
+
+def file_digest(path):
+    """Hash SHA-1 del contenido de un archivo, leído por bloques."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    Caché en memoria de archivos de detecciones ya leídos e interpretados.
+    
+    Cada archivo se identifica por su fecha de modificación y tamaño; si cambian, se
+    calcula el hash del contenido y solo se vuelve a leer si el contenido es distinto
+    (un archivo copiado o guardado de nuevo sin cambios se sigue sirviendo de la caché).
+    Se conservan las max_entries tablas usadas más recientemente.
+    
+    Args:
+        loader: Función ruta -> tabla que se guarda en la caché (por defecto read_detections)
+        max_entries: Número máximo de archivos en memoria
+    """
+    
+    def __init__(self, loader=read_detections, max_entries=4):
+        self.loader = loader
+        self.max_entries = max_entries
+        self._tables = OrderedDict()  # hash del contenido -> tabla
+        self._files = {}              # ruta -> (mtime_ns, tamaño, hash)
+    
+    def load(self, path):
+        """Devuelve la tabla del archivo, leyéndolo solo si no está en la caché."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        
+        known = self._files.get(path)
+        if known is not None and known[:2] == signature and known[2] in self._tables:
+            digest = known[2]
+        else:
+            digest = file_digest(path)
+            self._files[path] = signature + (digest,)
+        
+        if digest in self._tables:
+            self._tables.move_to_end(digest)
+            return self._tables[digest]
+        
+        table = self.loader(path)
+        self._tables[digest] = table
+        while len(self._tables) > self.max_entries:
+            self._tables.popitem(last=False)
+        return table
+    
+    def clear(self):
+        """Vacía la caché."""
+        self._tables.clear()
+        self._files.clear()
@@ -0,0 +1,215 @@
+"""
+Pirámide de mosaicos para visualizar imágenes de resultados de gran tamaño.
+
+Junto a una imagen de resultados (la reconstruida de cada análisis en la interfaz, la
+que se guarda desde ella a resolución completa o las del modo por lotes con --pyramid)
+se guardan una vista previa pequeña y una pirámide de niveles reducidos a la mitad
+sucesivamente, cortados en mosaicos PNG. El visor muestra primero la vista previa y,
+al ampliar, lee solo los mosaicos del nivel adecuado que caen dentro de la vista, sin
+decodificar nunca la imagen completa.
+
+Estructura en disco:
+    <nombre>_preview.png
+    <nombre>_pyramid/pyramid.json
+    <nombre>_pyramid/<nivel>/<fila>_<columna>.png
+"""
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Lado (en píxeles) de los mosaicos de la pirámide
+PYRAMID_TILE_SIZE = 512
+
+# Lado mayor (en píxeles) de la vista previa
+PREVIEW_MAX_SIZE = 1024
+
+# Compresión PNG de los mosaicos (baja: prima la velocidad de escritura sobre el tamaño)
+TILE_PNG_COMPRESSION = 1
+
+# Mosaicos decodificados que se mantienen en memoria en cada ImagePyramid
+TILE_CACHE_SIZE = 64
+
+PYRAMID_INDEX = 'pyramid.json'
+
+
+def pyramid_paths(image_path):
+    """Rutas (vista previa, carpeta de la pirámide) asociadas a una imagen de resultados."""
+    stem = os.path.splitext(image_path)[0]
+    return f"{stem}_preview.png", f"{stem}_pyramid"
+
+
+def write_pyramid(image, image_path, tile_size=PYRAMID_TILE_SIZE, preview_max_size=PREVIEW_MAX_SIZE):
+    """
+    Guarda la vista previa y la pirámide de mosaicos de una imagen BGR.
+    
+    El nivel 0 es la imagen a resolución completa y cada nivel siguiente mide la mitad,
+    hasta que el nivel completo cabe en un único mosaico.
+    
+    Returns:
+        (preview_path, pyramid_dir)
+    """
+    preview_path, pyramid_dir = pyramid_paths(image_path)
+    height, width = image.shape[:2]
+    
+    # Vista previa
+    scale = min(1.0, preview_max_size / max(width, height))
+    preview_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    cv2.imwrite(preview_path, cv2.resize(image, preview_size, interpolation=cv2.INTER_AREA)
+                if scale < 1 else image)
+    
+    # Niveles de la pirámide; se reescriben completos para no mezclar mosaicos antiguos.
+    # Los mosaicos se codifican en varios hilos (cv2.imwrite libera el GIL)
+    levels = []
+    level_image = image
+    with ThreadPoolExecutor() as executor:
+        while True:
+            level = len(levels)
+            level_height, level_width = level_image.shape[:2]
+            levels.append([level_width, level_height])
+            
+            level_dir = os.path.join(pyramid_dir, str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            for name in os.listdir(level_dir):
+                os.remove(os.path.join(level_dir, name))
+            
+            writes = [
+                executor.submit(cv2.imwrite, os.path.join(level_dir, f"{row}_{col}.png"),
+                                level_image[start_y:start_y + tile_size, start_x:start_x + tile_size],
+                                [cv2.IMWRITE_PNG_COMPRESSION, TILE_PNG_COMPRESSION])
+                for row, start_y in enumerate(range(0, level_height, tile_size))
+                for col, start_x in enumerate(range(0, level_width, tile_size))
+            ]
+            for write in writes:
+                write.result()
+            
+            if max(level_width, level_height) <= tile_size:
+                break
+            level_image = cv2.resize(level_image, ((level_width + 1) // 2, (level_height + 1) // 2),
+                                     interpolation=cv2.INTER_AREA)
+    
+    with open(os.path.join(pyramid_dir, PYRAMID_INDEX), 'w') as f:
+        json.dump({'width': width, 'height': height, 'tile_size': tile_size, 'levels': levels}, f)
+    
+    return preview_path, pyramid_dir
+
+
+def compose_view(read_region, source_scale, center_x, center_y, scale, view_width, view_height):
+    """
+    Compone una vista de view_width×view_height píxeles a partir de una imagen fuente.
+    
+    Args:
+        read_region: Función (start_x, start_y, end_x, end_y) -> región BGR de la fuente,
+            recortada a sus bordes
+        source_scale: Píxeles de la fuente por píxel de la imagen a resolución completa
+        center_x, center_y: Centro de la vista en coordenadas a resolución completa
+        scale: Píxeles de vista por píxel de la imagen a resolución completa
+    """
+    # Ventana visible en coordenadas de la fuente
+    half_width = view_width / (2 * scale)
+    half_height = view_height / (2 * scale)
+    x0 = (center_x - half_width) * source_scale
+    y0 = (center_y - half_height) * source_scale
+    x1 = (center_x + half_width) * source_scale
+    y1 = (center_y + half_height) * source_scale
+    
+    start_x, start_y = int(np.floor(x0)), int(np.floor(y0))
+    region = read_region(start_x, start_y, int(np.ceil(x1)), int(np.ceil(y1)))
+    
+    view = np.zeros((view_height, view_width, 3), dtype=np.uint8)
+    if region.size == 0:
+        return view
+    
+    # Posición de la región leída (recortada a los bordes de la fuente) dentro de la vista
+    factor = scale / source_scale
+    dst_x0 = int(round((max(0, start_x) - x0) * factor))
+    dst_y0 = int(round((max(0, start_y) - y0) * factor))
+    dst_width = max(1, int(round(region.shape[1] * factor)))
+    dst_height = max(1, int(round(region.shape[0] * factor)))
+    interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(region, (dst_width, dst_height), interpolation=interpolation)
+    
+    # Pegar recortando lo que quede fuera de la vista
+    vx0, vy0 = max(0, dst_x0), max(0, dst_y0)
+    vx1 = min(view_width, dst_x0 + dst_width)
+    vy1 = min(view_height, dst_y0 + dst_height)
+    if vx1 > vx0 and vy1 > vy0:
+        view[vy0:vy1, vx0:vx1] = resized[vy0 - dst_y0:vy1 - dst_y0, vx0 - dst_x0:vx1 - dst_x0]
+    return view
+
+
+class ImagePyramid:
+    """
+    Lector de una pirámide guardada con write_pyramid.
+    
+    Los mosaicos se leen bajo demanda y los últimos TILE_CACHE_SIZE se mantienen en
+    memoria, de modo que desplazarse o ampliar sobre la misma zona no vuelve a leerlos.
+    """
+    
+    def __init__(self, pyramid_dir):
+        with open(os.path.join(pyramid_dir, PYRAMID_INDEX)) as f:
+            index = json.load(f)
+        self.pyramid_dir = pyramid_dir
+        self.width = index['width']
+        self.height = index['height']
+        self.tile_size = index['tile_size']
+        self.levels = [tuple(level) for level in index['levels']]
+        self._tiles = OrderedDict()
+    
+    def level_for_scale(self, scale):
+        """Nivel más reducido cuya resolución sigue siendo >= scale (píxeles de vista por píxel)."""
+        level = 0
+        for candidate, (level_width, _) in enumerate(self.levels):
+            if level_width / self.width >= scale:
+                level = candidate
+        return level
+    
+    def read_tile(self, level, row, col):
+        """Mosaico (fila, columna) de un nivel, en BGR."""
+        key = (level, row, col)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        
+        tile = cv2.imread(os.path.join(self.pyramid_dir, str(level), f"{row}_{col}.png"))
+        self._tiles[key] = tile
+        while len(self._tiles) > TILE_CACHE_SIZE:
+            self._tiles.popitem(last=False)
+        return tile
+    
+    def read_region(self, level, start_x, start_y, end_x, end_y):
+        """Región [start_y:end_y, start_x:end_x] de un nivel, compuesta con sus mosaicos."""
+        level_width, level_height = self.levels[level]
+        start_x, end_x = max(0, start_x), min(level_width, end_x)
+        start_y, end_y = max(0, start_y), min(level_height, end_y)
+        region = np.zeros((max(0, end_y - start_y), max(0, end_x - start_x), 3), dtype=np.uint8)
+        if region.size == 0:
+            return region
+        
+        size = self.tile_size
+        for row in range(start_y // size, (end_y - 1) // size + 1):
+            for col in range(start_x // size, (end_x - 1) // size + 1):
+                tile = self.read_tile(level, row, col)
+                if tile is None:
+                    continue
+                tile_x, tile_y = col * size, row * size
+                x0, y0 = max(start_x, tile_x), max(start_y, tile_y)
+                x1 = min(end_x, tile_x + tile.shape[1])
+                y1 = min(end_y, tile_y + tile.shape[0])
+                region[y0 - start_y:y1 - start_y, x0 - start_x:x1 - start_x] = \
+                    tile[y0 - tile_y:y1 - tile_y, x0 - tile_x:x1 - tile_x]
+        return region
+    
+    def render_view(self, center_x, center_y, scale, view_width, view_height):
+        """
+        Compone la vista de view_width×view_height píxeles centrada en (center_x, center_y)
+        (coordenadas a resolución completa) con scale píxeles de vista por píxel de imagen.
+        Solo se leen los mosaicos del nivel adecuado que caen dentro de la vista.
+        """
+        level = self.level_for_scale(scale)
+        level_width, _ = self.levels[level]
+        return compose_view(lambda *window: self.read_region(level, *window), level_width / self.width,
+                            center_x, center_y, scale, view_width, view_height)
@@ -0,0 +1,254 @@
+"""
+Lectura por ventanas de imágenes histológicas de gran tamaño.
+
+Los TIFF en mosaico (incluidos BigTIFF y pirámides multirresolución como SVS) se leen
+con tifffile + zarr decodificando solo los mosaicos que cubren cada región, sin cargar
+la imagen completa en memoria. El resto de imágenes (JPG, PNG y TIFF por tiras, en los
+que cada ventana obligaría a decodificar de nuevo la tira completa) se decodifican una
+vez y las regiones son vistas NumPy sobre esa imagen.
+
+Todas las regiones se devuelven en BGR uint8, igual que cv2.imread.
+"""
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import tifffile
+    import zarr
+except ImportError:  # Opcionales: sin ellos los TIFF se leen completos con OpenCV
+    tifffile = None
+    zarr = None
+
+# Formatos que se leen por ventanas cuando tifffile y zarr están instalados
+TIFF_EXTENSIONS = ('.tif', '.tiff', '.svs')
+
+# Filas que se leen de una vez al generar la miniatura de un TIFF
+THUMBNAIL_BAND_ROWS = 2048
+
+
+def to_bgr(region):
+    """Convierte una región (gris, RGB o RGBA, 8 o 16 bits) a BGR uint8 de 3 canales."""
+    if region.dtype == np.uint16:
+        region = (region >> 8).astype(np.uint8)
+    elif region.dtype != np.uint8:
+        region = np.clip(region, 0, 255).astype(np.uint8)
+    
+    if region.ndim == 2:
+        return cv2.cvtColor(region, cv2.COLOR_GRAY2BGR)
+    if region.shape[2] == 4:
+        return cv2.cvtColor(region, cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(region, cv2.COLOR_RGB2BGR)
+
+
+def thumbnail_size(width, height, max_size):
+    """Dimensiones (ancho, alto) que caben en max_size manteniendo la proporción."""
+    scale = min(1.0, max_size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class SlideReader:
+    """
+    Interfaz común de lectura de imágenes.
+    
+    Atributos:
+        width, height: Dimensiones a resolución completa
+        windowed: True si las regiones se decodifican bajo demanda (sin cargar la imagen)
+    """
+    windowed = False
+    
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+    
+    @property
+    def shape(self):
+        """Forma (alto, ancho, canales) de la imagen, como la de un array de cv2.imread."""
+        return self.height, self.width, 3
+    
+    def read_region(self, start_x, start_y, end_x, end_y):
+        """Devuelve la región [start_y:end_y, start_x:end_x] en BGR uint8."""
+        raise NotImplementedError
+    
+    def thumbnail(self, max_size):
+        """Versión reducida (BGR) cuyo lado mayor no supera max_size píxeles."""
+        raise NotImplementedError
+    
+    def close(self):
+        """Libera los recursos asociados al archivo."""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ImageSlide(SlideReader):
+    """
+    Imagen decodificada completa; las regiones son vistas sin copia.
+    
+    Por defecto se decodifica con OpenCV; image permite pasar la imagen BGR ya leída.
+    """
+    
+    def __init__(self, path, image=None):
+        if image is not None:
+            super().__init__(path, image.shape[1], image.shape[0])
+            self.image = image
+            return
+        
+        image = cv2.imread(path)
+        if image is None:
+            # Alternativa para rutas con caracteres no ASCII en Windows
+            with open(path, 'rb') as f:
+                image = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"No se pudo cargar la imagen {path}")
+        
+        super().__init__(path, image.shape[1], image.shape[0])
+        self.image = image
+    
+    def read_region(self, start_x, start_y, end_x, end_y):
+        return self.image[start_y:end_y, start_x:end_x]
+    
+    def thumbnail(self, max_size):
+        size = thumbnail_size(self.width, self.height, max_size)
+        if size == (self.width, self.height):
+            return self.image
+        return cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+
+
+class TiffSlide(SlideReader):
+    """
+    TIFF leído por ventanas con tifffile + zarr.
+    
+    Solo se decodifican los mosaicos que cubren cada región. En las pirámides la
+    miniatura se obtiene del nivel de menor resolución suficiente.
+    
+    Atributos:
+        tiled: True si el TIFF está en mosaico o tiene varios niveles; si no (TIFF por
+            tiras), leer por ventanas decodifica de nuevo la tira completa en cada región
+            y open_slide lo carga entero
+    """
+    windowed = True
+    
+    def __init__(self, path):
+        self._tiff = tifffile.TiffFile(path)
+        series = self._tiff.series[0]
+        self.tiled = bool(series.keyframe.is_tiled) or len(series.levels) > 1
+        self._axes = series.axes
+        self._levels = [zarr.open(series.aszarr(level=level), mode='r')
+                        for level in range(len(series.levels))]
+        
+        shape = self._levels[0].shape
+        super().__init__(path, shape[self._axes.index('X')], shape[self._axes.index('Y')])
+    
+    def _read(self, level, start_x, start_y, end_x, end_y):
+        """Lee una región de un nivel de la pirámide y la devuelve en BGR."""
+        index = tuple(
+            slice(start_y, end_y) if axis == 'Y' else
+            slice(start_x, end_x) if axis == 'X' else
+            slice(None) if axis == 'S' else 0  # Otros ejes (páginas, tiempo...): primer plano
+            for axis in self._axes
+        )
+        region = np.asarray(self._levels[level][index])
+        
+        # Muestras en planos separados (SYX) -> YXS
+        if [axis for axis in self._axes if axis in 'YXS'][0] == 'S':
+            region = np.moveaxis(region, 0, -1)
+        return to_bgr(region)
+    
+    def read_region(self, start_x, start_y, end_x, end_y):
+        return self._read(0, start_x, start_y, end_x, end_y)
+    
+    def thumbnail(self, max_size):
+        # Nivel más pequeño cuyo lado mayor sigue siendo >= max_size
+        level = 0
+        for candidate, array in enumerate(self._levels):
+            level_shape = (array.shape[self._axes.index('Y')], array.shape[self._axes.index('X')])
+            if max(level_shape) >= max_size:
+                level = candidate
+        
+        level_shape = self._levels[level].shape
+        level_height = level_shape[self._axes.index('Y')]
+        level_width = level_shape[self._axes.index('X')]
+        target_width, target_height = thumbnail_size(level_width, level_height, max_size)
+        scale = target_height / level_height
+        
+        # Reducir por bandas de filas para no cargar el nivel completo
+        bands = []
+        for start_y in range(0, level_height, THUMBNAIL_BAND_ROWS):
+            end_y = min(level_height, start_y + THUMBNAIL_BAND_ROWS)
+            band = self._read(level, 0, start_y, level_width, end_y)
+            band_height = max(1, round((end_y - start_y) * scale))
+            bands.append(cv2.resize(band, (target_width, band_height), interpolation=cv2.INTER_AREA))
+        
+        thumbnail = np.vstack(bands)
+        if thumbnail.shape[0] != target_height:
+            thumbnail = cv2.resize(thumbnail, (target_width, target_height), interpolation=cv2.INTER_AREA)
+        return thumbnail
+    
+    def close(self):
+        self._tiff.close()
+
+
+def slide_dimensions(path):
+    """
+    Dimensiones (ancho, alto) de una imagen leyendo solo su cabecera, sin decodificarla.
+    
+    Devuelve None si el formato no se reconoce; en ese caso hay que abrir la imagen con
+    open_slide para conocer su tamaño.
+    """
+    if path.lower().endswith(TIFF_EXTENSIONS) and tifffile is not None:
+        try:
+            with tifffile.TiffFile(path) as tiff:
+                series = tiff.series[0]
+                return series.shape[series.axes.index('X')], series.shape[series.axes.index('Y')]
+        except Exception:
+            pass
+    
+    # PIL solo lee la cabecera al abrir; se desactiva su límite de píxeles porque aquí
+    # precisamente se quiere conocer el tamaño de las imágenes más grandes
+    max_image_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+
+def open_slide(path):
+    """
+    Abre una imagen con el lector adecuado.
+    
+    Los TIFF en mosaico o piramidales se leen por ventanas si tifffile y zarr están
+    disponibles y el archivo se puede decodificar. Los TIFF por tiras se cargan completos
+    una sola vez (con OpenCV o, si OpenCV no puede, con tifffile) y en cualquier otro
+    caso se carga la imagen completa con OpenCV.
+    """
+    if path.lower().endswith(TIFF_EXTENSIONS) and tifffile is not None:
+        slide = None
+        try:
+            slide = TiffSlide(path)
+            slide.read_region(0, 0, 1, 1)  # Comprobar que el códec del TIFF está soportado
+            if slide.tiled:
+                return slide
+        except Exception as e:
+            if slide is not None:
+                slide.close()
+            print(f"No se pudo leer {os.path.basename(path)} por ventanas ({e}); se carga completa")
+            return ImageSlide(path)
+        
+        # TIFF por tiras: decodificar la imagen completa una sola vez
+        with slide:
+            try:
+                return ImageSlide(path)
+            except ValueError:
+                return ImageSlide(path, slide.read_region(0, 0, slide.width, slide.height))
+    return ImageSlide(path)
@@ -0,0 +1,83 @@
+"""
+Índice espacial (KD-tree) sobre los centros de los canales de Havers.
+
+Permite calcular estadísticas de vecindad (distancia al vecino más cercano, densidad
+local, consultas por radio) en O(n log n), en lugar de recorrer todos los pares de
+canales. Lo usan tanto detection_app (generate_visualizations) como breaking_app
+(analizar_cuadrantes).
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+from common.detections import detection_points
+
+
+class DetectionSpatialIndex:
+    """KD-tree construido sobre las coordenadas (Center X, Center Y) de las detecciones."""
+    
+    def __init__(self, points):
+        """
+        Args:
+            points: Array (n, 2) con las coordenadas x, y de cada canal en píxeles
+        """
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.tree = cKDTree(self.points)
+    
+    @classmethod
+    def from_dataframe(cls, df):
+        """Construye el índice a partir de un DataFrame de detecciones (filas no numéricas se ignoran)."""
+        points = detection_points(df)
+        return cls(points[np.isfinite(points).all(axis=1)])
+    
+    def __len__(self):
+        return len(self.points)
+    
+    def nearest_neighbor_distances(self, k=1):
+        """
+        Distancia de cada canal a su k-ésimo vecino más cercano (excluido él mismo).
+        
+        Devuelve NaN para todos los canales si hay k canales o menos.
+        """
+        if len(self.points) <= k:
+            return np.full(len(self.points), np.nan)
+        distances, _ = self.tree.query(self.points, k=k + 1)
+        return distances[:, k]
+    
+    def nearest_neighbor_indices(self):
+        """Índice del vecino más cercano de cada canal (-1 si no hay otro canal)."""
+        if len(self.points) < 2:
+            return np.full(len(self.points), -1)
+        _, indices = self.tree.query(self.points, k=2)
+        return indices[:, 1]
+    
+    def neighbor_counts(self, radius):
+        """Número de otros canales a una distancia <= radius de cada canal."""
+        if len(self.points) == 0:
+            return np.zeros(0, dtype=np.intp)
+        return self.tree.query_ball_point(self.points, radius, return_length=True) - 1
+    
+    def local_density(self, radius):
+        """Densidad local de cada canal: vecinos dentro de radius por píxel² del círculo."""
+        return self.neighbor_counts(radius) / (np.pi * radius ** 2)
+    
+    def query_radius(self, x, y, radius):
+        """Índices (ordenados) de los canales a una distancia <= radius del punto (x, y)."""
+        return np.sort(np.asarray(self.tree.query_ball_point([x, y], radius), dtype=np.intp))
+    
+    def query_nearest(self, x, y, k=1):
+        """Distancias e índices de los k canales más cercanos al punto (x, y)."""
+        k = min(k, len(self.points))
+        distances, indices = self.tree.query([x, y], k=k)
+        return np.atleast_1d(distances), np.atleast_1d(indices)
+    
+    def clark_evans_ratio(self, area):
+        """
+        Índice de Clark-Evans: distancia media al vecino más cercano observada / esperada
+        para una distribución aleatoria con la misma densidad en `area` píxeles².
+        
+        R < 1 indica agrupamiento, R ≈ 1 aleatoriedad y R > 1 regularidad.
+        """
+        if len(self.points) < 2 or area <= 0:
+            return np.nan
+        expected = 0.5 / np.sqrt(len(self.points) / area)
+        return np.nanmean(self.nearest_neighbor_distances()) / expected
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos compartidos se importan como en las aplicaciones (paquete common de apps/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "apps"))
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# La aplicación de distribución no está en un paquete: se importa desde su carpeta
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "apps", "3distribution_app"))
+distribution_app = pytest.importorskip("improved_distribution_app")
+
+
+@pytest.fixture(scope="module")
+def generated():
+    model = distribution_app.FemurModel(7, femur_length=5.0, density_diaphysis=300.0)
+    sections_data = model.sections_data()
+    distribution = distribution_app.generate_distribution(sections_data, model.seed)
+    return distribution, sections_data, distribution.sort_values(by='position_z_cm', kind='stable')
+
+
+def test_point_cloud_round_trip(tmp_path, generated):
+    distribution, sections_data, ordered = generated
+    path = tmp_path / "osteonas.bin"
+    distribution_app.write_distribution(distribution, sections_data, str(path), "bin")
+    
+    data = path.read_bytes()
+    header = distribution_app.POINT_CLOUD_HEADER
+    magic, version, count, names_size = header.unpack_from(data)
+    assert (magic, version, count) == (distribution_app.POINT_CLOUD_MAGIC, distribution_app.POINT_CLOUD_VERSION,
+                                       len(distribution))
+    
+    names = data[header.size:header.size + names_size].decode("utf-8").split("\n")
+    records = np.frombuffer(data, dtype=distribution_app.POINT_CLOUD_DTYPE, offset=header.size + names_size)
+    assert len(records) == count
+    
+    np.testing.assert_array_equal(records["z_cm"], ordered["position_z_cm"].to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(records["size_um"], ordered["size_um"].to_numpy(dtype=np.float32))
+    assert [names[code] for code in records["section_code"]] == ordered["section_name"].astype(str).tolist()
+
+
+def test_npz_section_codes(tmp_path, generated):
+    distribution, sections_data, ordered = generated
+    path = tmp_path / "osteonas.npz"
+    distribution_app.write_distribution(distribution, sections_data, str(path), "npz")
+    
+    with np.load(path) as arrays:
+        names = arrays["section_names"].tolist()
+        assert [names[code] for code in arrays["section_code"]] == ordered["section_name"].astype(str).tolist()
+        np.testing.assert_array_equal(arrays["position_x_cm"], ordered["position_x_cm"].to_numpy(dtype=np.float32))
+        assert json.loads(arrays["femur_info"].item()) == sections_data
+
+
+def test_json_round_trip(tmp_path, generated):
+    distribution, sections_data, ordered = generated
+    path = tmp_path / "osteonas.json"
+    distribution_app.write_distribution(distribution.iloc[:100], sections_data, str(path), "json")
+    
+    with open(path) as f:
+        data = json.load(f)
+    assert data["femur_info"] == sections_data
+    assert len(data["osteonas"]) == 100
+    
+    path = tmp_path / "vacia.json"
+    distribution_app.write_distribution(distribution.iloc[:0], sections_data, str(path), "json")
+    with open(path) as f:
+        assert json.load(f) == {"femur_info": sections_data, "osteonas": []}
@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+# La aplicación de distribución no está en un paquete: se importa desde su carpeta
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "apps", "3distribution_app"))
+distribution_app = pytest.importorskip("improved_distribution_app")
+
+# Fémur corto y poco denso para que la generación sea rápida
+SMALL_FEMUR = {"femur_length": 5.0, "density_diaphysis": 300.0}
+
+
+@pytest.fixture
+def sections_data():
+    return distribution_app.FemurModel(1234, **SMALL_FEMUR).sections_data()
+
+
+def test_same_seed_gives_identical_distribution(sections_data):
+    first = distribution_app.generate_distribution(sections_data, 1234)
+    second = distribution_app.generate_distribution(sections_data, 1234)
+    
+    assert len(first) > 0
+    pd.testing.assert_frame_equal(first, second)
+    assert not first.equals(distribution_app.generate_distribution(sections_data, 4321))
+
+
+def test_pool_generation_matches_serial(sections_data):
+    serial = distribution_app.generate_distribution(sections_data, 1234)
+    
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = distribution_app.submit_distribution(executor, sections_data, 1234)
+        pooled = distribution_app.merge_sections([future.result() for future in futures])
+    
+    pd.testing.assert_frame_equal(serial, pooled)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from common.detections import suppress_duplicate_detections
+
+
+def test_suppressed_box_does_not_suppress_others():
+    # 0 suprime a 1 (solapamiento 0.5); 1 solaparía a 2 (0.45), pero ya está suprimida
+    boxes = [[0, 0, 10, 10], [5, 0, 15, 10], [10.5, 0, 20, 10]]
+    keep = suppress_duplicate_detections(boxes, [0.9, 0.8, 0.7], [1, 2, 3], threshold=0.4)
+    np.testing.assert_array_equal(keep, [0, 2])
+
+
+def test_duplicate_across_segments_keeps_most_confident():
+    boxes = [[0, 0, 10, 10], [1, 1, 10, 10]]
+    keep = suppress_duplicate_detections(boxes, [0.6, 0.9], [1, 2])
+    np.testing.assert_array_equal(keep, [1])
+
+
+def test_boxes_of_the_same_segment_are_kept():
+    # Canal anidado y canal contiguo dentro del mismo segmento
+    boxes = [[0, 0, 20, 20], [5, 5, 10, 10], [15, 0, 25, 20]]
+    keep = suppress_duplicate_detections(boxes, [0.9, 0.8, 0.7], [4, 4, 4])
+    np.testing.assert_array_equal(keep, [0, 1, 2])
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+import pytest
+
+from common.image_pyramid import ImagePyramid, compose_view, write_pyramid
+
+
+@pytest.fixture
+def image():
+    return np.random.default_rng(0).integers(0, 256, (1500, 1100, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def pyramid(tmp_path, image):
+    preview_path, pyramid_dir = write_pyramid(image, str(tmp_path / "resultado.png"), tile_size=256,
+                                              preview_max_size=400)
+    assert cv2.imread(preview_path).shape == (400, 293, 3)
+    return ImagePyramid(pyramid_dir)
+
+
+def test_full_resolution_view_is_read_from_tiles(pyramid, image):
+    # Vista centrada en (500, 700) a escala 1: región [600:800, 350:650] de la imagen
+    np.testing.assert_array_equal(pyramid.render_view(500, 700, 1.0, 300, 200), image[600:800, 350:650])
+
+
+@pytest.mark.parametrize("scale, level", [(0.5, 1), (0.3, 1), (0.1, 3), (0.02, 3)])
+def test_reduced_view_uses_halved_level(pyramid, image, scale, level):
+    assert pyramid.level_for_scale(scale) == level
+    
+    level_image = image
+    for _ in range(level):
+        height, width = level_image.shape[:2]
+        level_image = cv2.resize(level_image, ((width + 1) // 2, (height + 1) // 2), interpolation=cv2.INTER_AREA)
+    
+    def read_region(start_x, start_y, end_x, end_y):
+        return level_image[max(0, start_y):max(0, end_y), max(0, start_x):max(0, end_x)]
+    
+    expected = compose_view(read_region, level_image.shape[1] / image.shape[1], 550, 750, scale, 300, 200)
+    np.testing.assert_array_equal(pyramid.render_view(550, 750, scale, 300, 200), expected)
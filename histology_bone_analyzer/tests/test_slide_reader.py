@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from common.slide_reader import ImageSlide, TiffSlide, open_slide
+
+tifffile = pytest.importorskip("tifffile")
+pytest.importorskip("zarr")
+
+
+@pytest.fixture
+def rgb():
+    return np.random.default_rng(0).integers(0, 256, (96, 128, 3), dtype=np.uint8)
+
+
+def test_strip_tiff_is_decoded_once(tmp_path, rgb):
+    path = str(tmp_path / "tiras.tif")
+    tifffile.imwrite(path, rgb, photometric='rgb', rowsperstrip=8)
+    
+    with open_slide(path) as slide:
+        assert isinstance(slide, ImageSlide)
+        assert not slide.windowed
+        np.testing.assert_array_equal(slide.read_region(10, 20, 50, 70), rgb[20:70, 10:50, ::-1])
+
+
+def test_tiled_tiff_is_read_by_windows(tmp_path, rgb):
+    path = str(tmp_path / "mosaico.tif")
+    tifffile.imwrite(path, rgb, photometric='rgb', tile=(32, 32))
+    
+    with open_slide(path) as slide:
+        assert isinstance(slide, TiffSlide)
+        assert slide.windowed
+        np.testing.assert_array_equal(slide.read_region(10, 20, 50, 70), rgb[20:70, 10:50, ::-1])